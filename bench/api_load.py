@@ -0,0 +1,150 @@
+"""
+Requests per second of the payment API: Flask (payment-api.py, as start.sh runs it)
+against the ASGI server (payment_asgi.py under uvicorn).
+
+Each server runs in its own process on a copy of the same database; the load is
+GET /api/payment/<id> on random payments over keep-alive connections.
+
+    python bench/api_load.py --payments 10000 --concurrency 64 --duration 10 --workers 4 [--json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import aiohttp
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from payment_store import PaymentStore
+from api_payment_latency import make_payment
+
+# payment-api.py has no importable name and fixes its port: load it and run it like its __main__ does
+FLASK_LAUNCHER = '''
+import importlib.util, sys
+spec = importlib.util.spec_from_file_location('payment_api', sys.argv[1])
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+module.app.run(debug=True, use_reloader=False, port=int(sys.argv[2]), host='127.0.0.1')
+'''
+
+
+def start_server(kind, workdir, port, workers):
+    webapp_dir = os.path.join(workdir, 'webapp')  # The API resolves ../pending_payments.db
+    if kind == 'flask':
+        command = [sys.executable, '-c', FLASK_LAUNCHER, os.path.join(ROOT, 'webapp', 'payment-api.py'), str(port)]
+    else:
+        command = [sys.executable, os.path.join(ROOT, 'webapp', 'payment_asgi.py')]
+    env = dict(os.environ, PAYBOT_API_PORT=str(port), PAYBOT_API_WORKERS=str(workers),
+               PAYBOT_EVENTS_URL='http://127.0.0.1:9/payment-events')
+    process = subprocess.Popen(command, cwd=webapp_dir, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/health', timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f'{kind} server did not start')
+
+
+def stop_server(process):
+    process.terminate()  # SIGTERM: graceful shutdown
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+async def load(port, ids, concurrency, duration):
+    latencies, errors = [], 0
+    deadline = time.monotonic() + duration
+
+    async def worker(session):
+        nonlocal errors
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                async with session.get(f'http://127.0.0.1:{port}/api/payment/{random.choice(ids)}') as response:
+                    await response.read()
+                    if response.status != 200:
+                        errors += 1
+                        continue
+            except aiohttp.ClientError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)  # Keep-alive pool
+    async with aiohttp.ClientSession(connector=connector) as session:
+        started = time.monotonic()
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+        elapsed = time.monotonic() - started
+
+    latencies.sort()
+    return {
+        'requests_per_second': len(latencies) / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000 if latencies else None,
+        'p99_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000 if latencies else None,
+        'errors': errors
+    }
+
+
+def run(payments, concurrency, duration, workers, port):
+    results = {}
+    with tempfile.TemporaryDirectory() as seed_dir:
+        seed_db = os.path.join(seed_dir, 'pending_payments.db')
+        store = PaymentStore(seed_db)
+        records = [make_payment(i) for i in range(payments)]
+        store.create_many(records)
+        store.close()
+        ids = [record['id'] for record in records]
+
+        for kind in ('flask', 'asgi'):
+            with tempfile.TemporaryDirectory() as workdir:
+                os.makedirs(os.path.join(workdir, 'webapp'))
+                shutil.copy(seed_db, os.path.join(workdir, 'pending_payments.db'))
+                process = start_server(kind, workdir, port, workers)
+                try:
+                    results[kind] = asyncio.run(load(port, ids, concurrency, duration))
+                finally:
+                    stop_server(process)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--payments', type=int, default=10000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='uvicorn workers')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--json', action='store_true', help='Print machine-readable results')
+    args = parser.parse_args()
+
+    results = run(args.payments, args.concurrency, args.duration, args.workers, args.port)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'server':>8} | {'req/s':>9} {'p50':>10} {'p99':>10} {'errors':>7}")
+    for kind, result in results.items():
+        print(f"{kind:>8} | {result['requests_per_second']:>9.0f} {result['p50_ms'] or 0:>8.2f}ms "
+              f"{result['p99_ms'] or 0:>8.2f}ms {result['errors']:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""
+Latency of GET /api/payment/<id> against payment history size.
+
+Compares the SQLite-backed payment API with the previous implementation, which
+parsed the whole pending_payments.json file on every request.
+
+    python bench/api_payment_latency.py --sizes 100,1000,10000,50000 --requests 200 [--json]
+"""
+import argparse
+import importlib.util
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+from flask import Flask, jsonify
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def make_payment(i):
+    return {
+        'id': str(uuid.uuid4()),
+        'sender_id': 100000 + i % 500,
+        'sender_name': f'sender#{i % 500}',
+        'recipient_id': 200000 + i % 700,
+        'recipient_name': f'recipient#{i % 700}',
+        'amount': 0.01,
+        'currency': 'ETH',
+        'sender_wallet': '0x' + 'ab' * 20,
+        'recipient_wallet': '0x' + 'cd' * 20,
+        'sender_chain': 'Sepolia Testnet',
+        'recipient_chain': 'Sepolia Testnet',
+        'timestamp': f'2025-01-01T00:00:{i % 60:02d}.{i:06d}',
+        'status': 'pending',
+        'guild_id': 1,
+        'channel_id': 2,
+        'transaction_hash': None
+    }
+
+
+def legacy_app(json_path):
+    """The payment API route as it was before the SQLite store"""
+    app = Flask('legacy')
+
+    @app.route('/api/payment/<payment_id>')
+    def get_payment(payment_id):
+        with open(json_path, 'r') as f:
+            payments = json.load(f)
+        if payment_id not in payments:
+            return jsonify({'error': 'Paiement non trouvé'}), 404
+        return jsonify(payments[payment_id])
+
+    return app
+
+
+def store_app(workdir):
+    """The current payment API, pointed at a database in workdir"""
+    webapp_dir = os.path.join(workdir, 'webapp')
+    os.makedirs(webapp_dir, exist_ok=True)
+    os.chdir(webapp_dir)  # The API resolves ../pending_payments.db from its working directory
+    spec = importlib.util.spec_from_file_location(f'payment_api_{uuid.uuid4().hex}',
+                                                  os.path.join(ROOT, 'webapp', 'payment-api.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def measure(client, ids, requests):
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = client.get(f'/api/payment/{random.choice(ids)}')
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200
+    latencies.sort()
+    return {
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p99_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    }
+
+
+def run(sizes, requests):
+    results = []
+    cwd = os.getcwd()
+    for size in sizes:
+        payments = [make_payment(i) for i in range(size)]
+        ids = [payment['id'] for payment in payments]
+
+        with tempfile.TemporaryDirectory() as workdir:
+            json_path = os.path.join(workdir, 'legacy.json')
+            with open(json_path, 'w') as f:
+                json.dump({payment['id']: payment for payment in payments}, f, indent=2, default=str)
+            legacy = measure(legacy_app(json_path).test_client(), ids, requests)
+
+            api = store_app(workdir)
+            api.payment_store.create_many(payments)
+            api.app.logger.disabled = True
+            sys.stdout = open(os.devnull, 'w')  # The API prints a line per request
+            try:
+                current = measure(api.app.test_client(), ids, requests)
+            finally:
+                sys.stdout.close()
+                sys.stdout = sys.__stdout__
+                api.payment_store.close()
+                os.chdir(cwd)
+
+        results.append({'history_size': size, 'legacy_json': legacy, 'sqlite_store': current})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='100,1000,10000,50000')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--json', action='store_true', help='Print machine-readable results')
+    args = parser.parse_args()
+
+    results = run([int(size) for size in args.sizes.split(',')], args.requests)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'history':>10} | {'legacy p50':>11} {'legacy p99':>11} | {'sqlite p50':>11} {'sqlite p99':>11}")
+    for result in results:
+        legacy, current = result['legacy_json'], result['sqlite_store']
+        print(f"{result['history_size']:>10} | {legacy['p50_ms']:>9.2f}ms {legacy['p99_ms']:>9.2f}ms | "
+              f"{current['p50_ms']:>9.2f}ms {current['p99_ms']:>9.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
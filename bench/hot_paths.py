@@ -0,0 +1,420 @@
+"""
+Throughput and latency of the bot's command hot paths and of the payment API routes.
+
+wallet, balance and pay run through a fake Discord context against local stub Privy
+and JSON-RPC servers (in a separate process, with configurable latency). The JSON-RPC
+stub stands in for an EVM node with Multicall3 and --tokens ERC-20 tokens. The API
+routes run in-process through Flask's test client. Everything stays on localhost,
+in a temporary directory: no network access or Discord token needed.
+
+    python bench/hot_paths.py --users 1000 --tokens 5 --requests 500 --concurrency 50 --latency 20 [--json]
+
+Reports requests/s, p50/p95/p99 and event loop blocking per scenario. --json prints
+the results for regression tracking.
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+from tokens import BALANCE_OF, DECIMALS, SYMBOL, encode_uint
+
+
+def user_address(i):
+    return '0x' + f'{i + 1:040x}'
+
+
+def make_privy_user(i):
+    created_at = 1700000000 + i
+    return {
+        'id': f'did:privy:bench{i}',
+        'created_at': created_at,
+        'linked_accounts': [
+            {'type': 'discord_oauth', 'subject': str(100000 + i), 'username': f'user{i}',
+             'email': f'user{i}@example.com', 'verified_at': created_at},
+            {'type': 'wallet', 'address': user_address(i), 'chain_type': 'ethereum',
+             'chain_id': 'eip155:11155111', 'wallet_client_type': 'privy', 'verified_at': created_at}
+        ]
+    }
+
+
+def token_address(i):
+    return '0x' + f'{0xe20 + i:040x}'
+
+
+def multicall_answer(data):
+    """Return value of aggregate3 for balanceOf/decimals/symbol calls on any contract"""
+    data = bytes.fromhex(data[10:])  # Without 0x and the selector
+
+    def word(offset):
+        return int.from_bytes(data[offset:offset + 32], 'big')
+
+    base = word(0) + 32
+    tuples = []
+    for i in range(word(base - 32)):
+        start = base + word(base + 32 * i)
+        call_start = start + word(start + 64)
+        call = data[call_start + 32:call_start + 32 + word(call_start)]
+        selector, target = call[:4].hex(), data[start + 12:start + 32].hex()
+        if selector == DECIMALS:
+            answer = encode_uint(18)
+        elif selector == SYMBOL:
+            symbol = f'TK{int(target, 16) - 0xe20}'.encode()
+            answer = encode_uint(32) + encode_uint(len(symbol)) + symbol.ljust(32, b'\0').hex()
+        elif selector == BALANCE_OF:
+            answer = encode_uint(int.from_bytes(call[4:36], 'big') * 10 ** 15)
+        else:
+            tuples.append(encode_uint(0) + encode_uint(0x40) + encode_uint(0))  # Reverted
+            continue
+        tuples.append(encode_uint(1) + encode_uint(0x40) + encode_uint(len(answer) // 2) + answer)
+
+    offsets, position = [], 32 * len(tuples)
+    for encoded in tuples:
+        offsets.append(encode_uint(position))
+        position += len(encoded) // 2
+    return '0x' + encode_uint(0x20) + encode_uint(len(tuples)) + ''.join(offsets) + ''.join(tuples)
+
+
+def run_stubs(port, users, latency, block_time, ready):
+    """Stub Privy user list and JSON-RPC node on one port (runs in a child process)"""
+    from aiohttp import web
+
+    privy_users = [make_privy_user(i) for i in reversed(range(users))]  # Newest first, like Privy
+    started = time.monotonic()
+
+    def block_number():
+        return 5000000 + int((time.monotonic() - started) / block_time)
+
+    def rpc_answer(call):
+        method, params = call.get('method'), call.get('params', [])
+        if method == 'eth_blockNumber':
+            result = hex(block_number())
+        elif method == 'eth_gasPrice':
+            result = hex(2 * 10 ** 9)
+        elif method == 'eth_chainId':
+            result = hex(11155111)
+        elif method == 'eth_getBalance':
+            result = hex(int(params[0], 16) * 10 ** 12)
+        elif method == 'eth_getBlockByNumber':
+            number = block_number()
+            result = {'number': hex(number), 'hash': '0x' + f'{number:064x}', 'baseFeePerGas': hex(10 ** 9)}
+        elif method == 'eth_call':
+            result = multicall_answer(params[0]['data'])
+        else:
+            return {'jsonrpc': '2.0', 'id': call.get('id'), 'error': {'code': -32601, 'message': 'Method not found'}}
+        return {'jsonrpc': '2.0', 'id': call.get('id'), 'result': result}
+
+    async def rpc(request):
+        await asyncio.sleep(latency)
+        body = await request.json()
+        if isinstance(body, list):
+            return web.json_response([rpc_answer(call) for call in body])
+        return web.json_response(rpc_answer(body))
+
+    async def list_users(request):
+        await asyncio.sleep(latency)
+        limit = int(request.query.get('limit', 100))
+        start = int(request.query.get('cursor') or 0)
+        page = privy_users[start:start + limit]
+        next_cursor = str(start + limit) if start + limit < len(privy_users) else None
+        return web.json_response({'data': page, 'next_cursor': next_cursor})
+
+    app = web.Application()
+    app.router.add_post('/rpc', rpc)
+    app.router.add_get('/api/v1/users', list_users)
+    ready.set()
+    web.run_app(app, host='127.0.0.1', port=port, print=None, handle_signals=True)
+
+
+class FakeMessage:
+    def __init__(self, content=None, embed=None):
+        self.content = content
+        self.embed = embed
+
+    async def edit(self, content=None, embed=None, **kwargs):
+        self.content, self.embed = content, embed
+
+    async def delete(self):
+        pass
+
+
+class FakeUser:
+    """Discord user/member: messageable, comparable by ID"""
+
+    def __init__(self, user_id):
+        self.id = user_id
+        self.name = f'user{user_id}'
+        self.mention = f'<@{user_id}>'
+        self.bot = False
+
+    def __eq__(self, other):
+        return isinstance(other, FakeUser) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __str__(self):
+        return self.name
+
+    async def send(self, content=None, embed=None, **kwargs):
+        return FakeMessage(content, embed)
+
+
+class FakeObject:
+    def __init__(self, object_id):
+        self.id = object_id
+
+
+class FakeContext:
+    """The parts of commands.Context the command handlers use (prefix command, no interaction)"""
+
+    def __init__(self, author):
+        self.author = author
+        self.guild = FakeObject(1)
+        self.channel = FakeObject(2)
+        self.message = FakeMessage()
+        self.interaction = None
+
+    async def send(self, content=None, embed=None, **kwargs):
+        return FakeMessage(content, embed)
+
+
+class LoopBlockingMonitor:
+    """Sums how late a ticking task wakes up: time the loop spent blocked on something else"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.lags = []
+        self.task = None
+
+    async def loop(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, time.perf_counter() - started - self.interval))
+
+    def start(self):
+        self.lags = []
+        self.task = asyncio.create_task(self.loop())
+
+    def stop(self):
+        self.task.cancel()
+        return {'blocked_ms': sum(self.lags) * 1000, 'max_lag_ms': max(self.lags, default=0) * 1000}
+
+
+def summarize(latencies, elapsed):
+    latencies = sorted(latencies)
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    return {
+        'requests': len(latencies),
+        'requests_per_second': len(latencies) / elapsed if elapsed else None,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99)
+    }
+
+
+async def drive(invoke, requests, concurrency):
+    """Run invoke() requests times, concurrency at a time; latency per call and loop blocking"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            await invoke()
+            latencies.append(time.perf_counter() - started)
+
+    monitor = LoopBlockingMonitor()
+    monitor.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    result = summarize(latencies, elapsed)
+    result.update(monitor.stop())
+    return result
+
+
+def write_config(workdir, stub_url, tokens):
+    config = {
+        'discord_token': 'bench',
+        'privy_app_id': 'bench',
+        'privy_app_secret': 'bench',
+        # Offline: only the stub node, no public fallbacks
+        'networks': {network: {'rpc_url': f'{stub_url}/rpc', 'rpc_alternatives': [],
+                               'tokens': {f'TK{i}': token_address(i) for i in range(tokens)}}
+                     for network in ('sepolia', 'ethereum')},
+        'token_metadata_cache': os.path.join(workdir, 'token_metadata.json'),
+        'payments_db': os.path.join(workdir, 'pending_payments.db'),
+        'wallets_db': os.path.join(workdir, 'wallets.db'),
+        'sync_slash_commands': False,
+        'rate_limits': {'privy': {'rate': 100000}, 'rpc': {'rate': 100000}}
+    }
+    with open(os.path.join(workdir, 'config.json'), 'w') as f:
+        json.dump(config, f)
+
+
+async def bench_commands(main, users, requests, concurrency):
+    main.privy_api.base_url = main.NETWORKS['sepolia']['rpc_url'].rsplit('/', 1)[0]
+
+    # Steady state, as after on_ready: user index synced, chain heads followed
+    await main.privy_api.sync_users(full=True)
+    main.head_tracker.start()
+    await main.check_connections()
+    while not all(main.head_tracker.is_live(network) for network in main.NETWORKS):
+        await asyncio.sleep(0.05)
+
+    def random_user():
+        return FakeUser(100000 + random.randrange(users))
+
+    async def wallet():
+        await main.wallet_command.callback(FakeContext(random_user()))
+
+    async def balance():
+        await main.balance_command.callback(FakeContext(random_user()), 'sepolia')
+
+    def pay(currency):
+        async def invoke():
+            sender = random_user()
+            recipient = FakeUser(100000 + (sender.id - 100000 + 1) % users)
+            await main.pay_command.callback(FakeContext(sender), recipient, 0.01, currency=currency)
+        return invoke
+
+    results = {}
+    scenarios = [('wallet', wallet), ('balance', balance), ('pay', pay('ETH'))]
+    if main.NETWORKS['sepolia']['tokens']:
+        scenarios.append(('pay token', pay(next(iter(main.NETWORKS['sepolia']['tokens'])))))
+    for name, invoke in scenarios:
+        results[name] = await drive(invoke, requests, concurrency)
+
+    main.head_tracker.close()
+    await main.privy_api.close()
+    await main.web3_manager.close()
+    return results
+
+
+def bench_api(workdir, requests):
+    """Payment API routes through Flask's test client, on the database the commands filled"""
+    webapp_dir = os.path.join(workdir, 'webapp')
+    os.makedirs(webapp_dir, exist_ok=True)
+    os.chdir(webapp_dir)  # The API resolves ../pending_payments.db from its working directory
+    spec = importlib.util.spec_from_file_location('payment_api', os.path.join(ROOT, 'webapp', 'payment-api.py'))
+    api = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(api)
+    api.notify_bot = lambda payment_id: None  # No bot listening
+    client = api.app.test_client()
+
+    ids = [payment['id'] for payment in api.payment_store.iter_payments()]
+    unconfirmed = list(ids)
+    random.shuffle(unconfirmed)
+    routes = {
+        'GET /api/payment/<id>': lambda: client.get(f'/api/payment/{random.choice(ids)}'),
+        'POST /api/payment/<id>/confirm': lambda: client.post(f'/api/payment/{unconfirmed.pop()}/confirm',
+                                                              json={'transaction_hash': '0x' + os.urandom(32).hex()}),
+        'GET /api/payments': lambda: client.get('/api/payments?limit=100'),
+        'GET /health': lambda: client.get('/health'),
+    }
+
+    results = {}
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')  # The API prints a line per request
+    try:
+        for route, call in routes.items():
+            count = min(requests, len(unconfirmed)) if 'confirm' in route else requests
+            latencies = []
+            started = time.perf_counter()
+            for _ in range(count):
+                call_started = time.perf_counter()
+                response = call()
+                latencies.append(time.perf_counter() - call_started)
+                assert response.status_code == 200, (route, response.status_code)
+            results[route] = summarize(latencies, time.perf_counter() - started) if latencies else None
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+        api.payment_store.close()
+    return results
+
+
+def run(users, tokens, requests, concurrency, latency, block_time, port):
+    ready = multiprocessing.Event()
+    stubs = multiprocessing.Process(target=run_stubs, args=(port, users, latency, block_time, ready), daemon=True)
+    stubs.start()
+    ready.wait(10)
+    time.sleep(0.5)
+
+    cwd = os.getcwd()
+    null = open(os.devnull, 'w')
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            # main.py reads config.json and creates its databases in the working directory
+            write_config(workdir, f'http://127.0.0.1:{port}', tokens)
+            os.chdir(workdir)
+            stdout, sys.stdout = sys.stdout, null  # The bot logs connections and syncs
+            try:
+                import main
+                commands = asyncio.run(bench_commands(main, users, requests, concurrency))
+                main.payment_store.close()
+                main.wallet_directory.close()
+            finally:
+                sys.stdout = stdout
+            api = bench_api(workdir, requests)
+            os.chdir(cwd)
+    finally:
+        os.chdir(cwd)
+        null.close()
+        stubs.terminate()
+        stubs.join()
+
+    return {
+        'config': {'users': users, 'tokens': tokens, 'requests': requests, 'concurrency': concurrency,
+                   'upstream_latency_ms': latency * 1000, 'block_time': block_time},
+        'commands': commands,
+        'api': api
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000, help='Privy users behind the stub')
+    parser.add_argument('--tokens', type=int, default=5, help='ERC-20 tokens configured per network')
+    parser.add_argument('--requests', type=int, default=500, help='Invocations per scenario')
+    parser.add_argument('--concurrency', type=int, default=50, help='Commands in flight at once')
+    parser.add_argument('--latency', type=float, default=20, help='Stub Privy/RPC latency (ms)')
+    parser.add_argument('--block-time', type=float, default=12, help='Stub chain block time (s)')
+    parser.add_argument('--port', type=int, default=5056)
+    parser.add_argument('--json', action='store_true', help='Print machine-readable results')
+    args = parser.parse_args()
+
+    results = run(args.users, args.tokens, args.requests, args.concurrency, args.latency / 1000, args.block_time,
+                  args.port)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'scenario':>32} | {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9} | {'blocked':>9} {'max lag':>9}")
+    for group in ('commands', 'api'):
+        for name, result in results[group].items():
+            if result is None:
+                continue
+            blocking = (f"{result['blocked_ms']:>7.1f}ms {result['max_lag_ms']:>7.1f}ms"
+                        if 'blocked_ms' in result else f"{'-':>9} {'-':>9}")
+            print(f"{name:>32} | {result['requests_per_second']:>8.0f} {result['p50_ms']:>7.2f}ms "
+                  f"{result['p95_ms']:>7.2f}ms {result['p99_ms']:>7.2f}ms | {blocking}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+import copy
+
+from tokens import MULTICALL3_ADDRESS, is_address
+
+# Networks available without any configuration; config 'networks' entries override or extend them
+DEFAULT_NETWORKS = {
+    'sepolia': {
+        'name': 'Sepolia Testnet',
+        'chain_id': 11155111,
+        'rpc_url': 'https://rpc.sepolia.org',
+        'rpc_alternatives': [
+            'https://ethereum-sepolia-rpc.publicnode.com',
+            'https://sepolia.gateway.tenderly.co',
+            'https://rpc2.sepolia.org',
+            'https://rpc.sepolia.org'
+        ],
+        'explorer': 'https://sepolia.etherscan.io',
+        'currency': 'SepoliaETH',
+        'faucet': 'https://sepoliafaucet.com',
+        'testnet': True,
+        'tokens': {
+            'USDC': '0x1c7D4B196Cb0C7B01d743Fbc6116a902379C7238'
+        },
+        'confirmations': 3,
+        'block_time': 12
+    },
+    'ethereum': {
+        'name': 'Ethereum Mainnet',
+        'chain_id': 1,
+        'rpc_url': 'https://ethereum-rpc.publicnode.com',
+        'rpc_alternatives': [
+            'https://eth.public-rpc.com',
+            'https://ethereum.publicnode.com',
+            'https://rpc.ankr.com/eth',
+            'https://eth-mainnet.public.blastapi.io'
+        ],
+        'explorer': 'https://etherscan.io',
+        'currency': 'ETH',
+        'faucet': None,
+        'tokens': {
+            'USDC': '0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48',
+            'USDT': '0xdAC17F958D2ee523a2206206994597C13D831ec7',
+            'DAI': '0x6B175474E89094C44Da98b954EedeAC495271d0F'
+        },
+        'confirmations': 12,
+        'block_time': 12
+    }
+}
+
+REQUIRED_FIELDS = ('name', 'chain_id', 'rpc_url')
+
+
+def parse_caip2(chain_id):
+    """
+    (namespace, reference) of a CAIP-2 chain ID such as 'eip155:8453'. A bare EVM chain
+    ID (8453 or '8453') is read as eip155. Raises ValueError on anything else.
+    """
+    if isinstance(chain_id, int) and not isinstance(chain_id, bool):
+        return 'eip155', str(chain_id)
+    if not isinstance(chain_id, str):
+        raise ValueError(f"Invalid chain ID: {chain_id!r}")
+    if chain_id.isdigit():
+        return 'eip155', str(int(chain_id))
+    namespace, separator, reference = chain_id.partition(':')
+    if not separator or not namespace or not reference or ':' in reference:
+        raise ValueError(f"Invalid CAIP-2 chain ID: {chain_id!r}")
+    if namespace == 'eip155':
+        if not reference.isdigit():
+            raise ValueError(f"Invalid EVM chain ID: {chain_id!r}")
+        reference = str(int(reference))
+    return namespace, reference
+
+
+class ChainRegistry:
+    """
+    Configured networks, keyed by their short name (e.g. 'sepolia'), with lookups by
+    CAIP-2 chain ID and by display name precomputed so resolving a chain is one dict lookup.
+    default is the network used when none is given (the first one if it isn't configured).
+    """
+
+    def __init__(self, networks, default=None):
+        self.networks = {}
+        self.by_chain_id = {}
+        self.by_name = {}
+        for key, info in networks.items():
+            missing = [field for field in REQUIRED_FIELDS if not info.get(field)]
+            if missing:
+                raise ValueError(f"Network '{key}' is missing {', '.join(missing)}")
+            caip2 = 'eip155:' + parse_caip2(info['chain_id'])[1]
+            if caip2 in self.by_chain_id:
+                raise ValueError(f"Networks '{self.by_chain_id[caip2]}' and '{key}' have the same chain ID")
+            info = dict(info, caip2=caip2)
+            info.setdefault('rpc_alternatives', [])
+            info.setdefault('explorer', None)
+            info.setdefault('currency', 'ETH')
+            info.setdefault('faucet', None)
+            info.setdefault('testnet', False)
+            info.setdefault('confirmations', 1)
+            info.setdefault('block_time', 12)
+            # ERC-20 tokens: currency symbol -> contract address, read through Multicall3
+            info['multicall'] = (info.get('multicall') or MULTICALL3_ADDRESS).lower()
+            info['tokens'] = {symbol.upper(): address.lower() for symbol, address in (info.get('tokens') or {}).items()}
+            invalid = [symbol for symbol, address in info['tokens'].items() if not is_address(address)]
+            if invalid or not is_address(info['multicall']):
+                raise ValueError(f"Network '{key}' has an invalid contract address "
+                                 f"({', '.join(invalid) or 'multicall'})")
+            self.networks[key] = info
+            self.by_chain_id[caip2] = key
+            self.by_name[info['name']] = key
+        self.default = default if default in self.networks else next(iter(self.networks), None)
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Default networks, overridden or extended by config 'networks' (a null entry removes
+        a network). The older '<network>_rpc_url' and '<network>_confirmations' keys still apply.
+        'default_network' picks the network used when none is given.
+        """
+        networks = copy.deepcopy(DEFAULT_NETWORKS)
+        for key, info in config.get('networks', {}).items():
+            if info is None:
+                networks.pop(key, None)
+            else:
+                networks[key] = dict(networks.get(key, {}), **info)
+        for key, info in networks.items():
+            if f'{key}_rpc_url' in config:
+                info['rpc_url'] = config[f'{key}_rpc_url']
+            if f'{key}_confirmations' in config:
+                info['confirmations'] = config[f'{key}_confirmations']
+        return cls(networks, default=config.get('default_network', 'sepolia'))
+
+    def network_for_chain_id(self, chain_id):
+        """Network key of a chain ID (CAIP-2 or bare EVM ID), or None if it isn't configured"""
+        try:
+            namespace, reference = parse_caip2(chain_id)
+        except ValueError:
+            return None
+        return self.by_chain_id.get(f'{namespace}:{reference}')
+
+    def network_for_name(self, name):
+        """Network key whose display name is name, or None"""
+        return self.by_name.get(name)
+
+    def lookup(self, value):
+        """Network key from a key, a display name or a chain ID, or None"""
+        if value in self.networks:
+            return value
+        return self.by_name.get(value) or self.network_for_chain_id(value)
+
+    @staticmethod
+    def is_evm(wallet):
+        """True for wallets on an EVM chain (eip155 chain ID, or an Ethereum wallet without one)"""
+        try:
+            return parse_caip2(wallet.get('chain_id') or '')[0] == 'eip155'
+        except ValueError:
+            return (wallet.get('chain_type') or '').lower() == 'ethereum'
+
+    def chain_name(self, wallet):
+        """Display name of a wallet's chain"""
+        chain_id = wallet.get('chain_id') or ''
+        network = self.network_for_chain_id(chain_id)
+        if network:
+            return self.networks[network]['name']
+        try:
+            namespace, reference = parse_caip2(chain_id)
+        except ValueError:
+            return wallet.get('chain_type') or 'Unknown'
+        if namespace == 'eip155':
+            return f"Ethereum (Chain {reference})"
+        if namespace == 'solana':
+            return 'Solana'
+        return wallet.get('chain_type') or namespace
@@ -1,12 +1,29 @@
 import discord
+from discord import app_commands
 from discord.ext import commands
 import json
 import aiohttp
+from aiohttp import web
 import asyncio
-from datetime import datetime
-from web3 import Web3
+from datetime import datetime, timedelta
 import uuid
 import os
+import sys
+import subprocess
+import time
+import heapq
+import itertools
+import random
+from decimal import Decimal
+from collections import OrderedDict
+from payment_store import PaymentStore, parse_timestamp, payments_db_path
+from wallet_directory import WalletDirectory, extract_wallets
+from chains import ChainRegistry
+from tokens import (TokenMetadataCache, BALANCE_OF, DECIMALS, SYMBOL, encode_address, encode_call,
+                    encode_aggregate3, decode_aggregate3, decode_uint, decode_string, from_units, to_units,
+                    transfer_data, transferred_amount)
+from metrics import REGISTRY, CONTENT_TYPE, EventLoopLagMonitor, span
+import traceback
 
 
 # Function to load configuration
@@ -29,100 +46,960 @@ def load_config():
 # Load configuration
 config = load_config()
 
+# Commands are available as slash commands; "$" prefix commands can be turned off
+PREFIX_COMMANDS = config.get('prefix_commands', True)
+
 # Configure intents (bot permissions)
 intents = discord.Intents.default()
-intents.message_content = True
+if PREFIX_COMMANDS:
+    # Reading "$..." messages needs the privileged message content intent
+    intents.message_content = True
+else:
+    # Slash commands only: don't receive guild and DM messages at all
+    intents.messages = False
+
+# Sharding: one process can run every shard (AutoShardedBot), or shard groups can run in
+# separate processes (shard_processes). Processes share payments and the Privy user
+# directory through SQLite; PAYBOT_SHARD_IDS / PAYBOT_SHARD_COUNT select a process's group.
+SHARD_COUNT = int(os.environ.get('PAYBOT_SHARD_COUNT') or config.get('shard_count') or 0) or None
+SHARD_IDS = ([int(shard_id) for shard_id in os.environ['PAYBOT_SHARD_IDS'].split(',')]
+             if os.environ.get('PAYBOT_SHARD_IDS') else config.get('shard_ids'))
+SHARD_PROCESSES = config.get('shard_processes', 1)
+# The primary process runs the background duties that must not be duplicated
+# (payment event server, expiry, receipt watching, Privy sync)
+IS_PRIMARY = os.environ.get('PAYBOT_PRIMARY', '1' if not SHARD_IDS or 0 in SHARD_IDS else '0') == '1'
 
 # Create bot instance with '$' prefix
-bot = commands.Bot(command_prefix='$', intents=intents)
-
-# Network configuration with free public RPCs
-NETWORKS = {
-    'sepolia': {
-        'name': 'Sepolia Testnet',
-        'chain_id': 11155111,
-        'rpc_url': config.get('sepolia_rpc_url', 'https://rpc.sepolia.org'),
-        'rpc_alternatives': [
-            'https://ethereum-sepolia-rpc.publicnode.com',
-            'https://sepolia.gateway.tenderly.co',
-            'https://rpc2.sepolia.org',
-            'https://rpc.sepolia.org'
-        ],
-        'explorer': 'https://sepolia.etherscan.io',
-        'currency': 'SepoliaETH',
-        'faucet': 'https://sepoliafaucet.com'
-    },
-    'ethereum': {
-        'name': 'Ethereum Mainnet',
-        'chain_id': 1,
-        'rpc_url': config.get('ethereum_rpc_url', 'https://ethereum-rpc.publicnode.com'),
-        'rpc_alternatives': [
-            'https://eth.public-rpc.com',
-            'https://ethereum.publicnode.com',
-            'https://rpc.ankr.com/eth',
-            'https://eth-mainnet.public.blastapi.io'
-        ],
-        'explorer': 'https://etherscan.io',
-        'currency': 'ETH',
-        'faucet': None
-    }
-}
+command_prefix = '$' if PREFIX_COMMANDS else commands.when_mentioned
+if config.get('sharded') or SHARD_COUNT or SHARD_IDS:
+    bot = commands.AutoShardedBot(command_prefix=command_prefix, intents=intents,
+                                  shard_count=SHARD_COUNT, shard_ids=SHARD_IDS)
+else:
+    bot = commands.Bot(command_prefix=command_prefix, intents=intents)
 
 
-class Web3Manager:
+def instrument_discord_http(http):
+    """Time every Discord REST call, by route"""
+    request = http.request
+
+    async def timed_request(route, **kwargs):
+        target = f"{route.method} {route.path}"
+        started = time.perf_counter()
+        try:
+            return await request(route, **kwargs)
+        except discord.HTTPException as e:
+            UPSTREAM_ERRORS.inc(upstream='discord', target=target, reason=e.status)
+            raise
+        finally:
+            UPSTREAM_SECONDS.observe(time.perf_counter() - started, upstream='discord', target=target)
+
+    http.request = timed_request
+
+
+instrument_discord_http(bot.http)
+
+
+@bot.before_invoke
+async def start_command_timer(ctx):
+    ctx.started_at = time.perf_counter()
+
+
+def finish_command(ctx):
+    """Record how long a command took (once, whether it completed or failed)"""
+    started = getattr(ctx, 'started_at', None)
+    if started is None or ctx.command is None:
+        return
+    ctx.started_at = None
+    COMMAND_SECONDS.observe(time.perf_counter() - started, command=ctx.command.qualified_name,
+                            transport='slash' if ctx.interaction else 'prefix')
+
+
+@bot.after_invoke
+async def stop_command_timer(ctx):
+    finish_command(ctx)
+
+# Networks: the defaults (Sepolia, Ethereum) plus any configured in config 'networks'
+try:
+    CHAINS = ChainRegistry.from_config(config)
+except ValueError as e:
+    print(f"❌ Invalid network configuration: {e}")
+    exit(1)
+NETWORKS = CHAINS.networks
+DEFAULT_NETWORK = CHAINS.default
+# Wallet picked first for a user with several: one on the default network
+PREFERRED_CHAIN = NETWORKS[DEFAULT_NETWORK]['caip2'] if DEFAULT_NETWORK else None
+
+
+# Metrics, served on /metrics by each bot process's metrics server
+COMMAND_SECONDS = REGISTRY.histogram('paybot_command_seconds', 'Command handling time', ('command', 'transport'))
+COMMAND_ERRORS = REGISTRY.counter('paybot_command_errors_total', 'Commands that failed', ('command', 'error'))
+UPSTREAM_SECONDS = REGISTRY.histogram('paybot_upstream_request_seconds', 'Outbound request time',
+                                      ('upstream', 'target'))
+UPSTREAM_ERRORS = REGISTRY.counter('paybot_upstream_errors_total', 'Failed outbound requests',
+                                   ('upstream', 'target', 'reason'))
+CACHE_REQUESTS = REGISTRY.counter('paybot_cache_requests_total', 'Cache lookups by result', ('cache', 'result'))
+LOOP_LAG = REGISTRY.histogram('paybot_event_loop_lag_seconds', 'Delay of event loop wake-ups',
+                              buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1))
+
+
+class SingleFlight:
+    """
+    Request coalescing: concurrent calls with the same key share one in-flight
+    future instead of each hitting the upstream. Counts calls and coalesced calls.
+    """
+
     def __init__(self):
-        self.connections = {}
+        self.in_flight = {}
+        self.stats = {'calls': 0, 'coalesced': 0}
+
+    async def do(self, key, factory):
+        """Await factory() for this key, or join the identical call already running"""
+        self.stats['calls'] += 1
+        task = self.in_flight.get(key)
+        if task is not None:
+            self.stats['coalesced'] += 1
+        else:
+            task = asyncio.ensure_future(factory())
+            self.in_flight[key] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        # Shielded: one caller giving up doesn't cancel the call for the others
+        return await asyncio.shield(task)
+
+
+# Outbound request priorities: lower goes first when an upstream is saturated
+PRIORITY_PAYMENT = 0
+PRIORITY_COMMAND = 1
+PRIORITY_BACKGROUND = 2
+
+
+class UpstreamBusy(Exception):
+    """HTTP 429/5xx from an upstream: worth retrying after a pause"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
 
-    def get_web3(self, network='sepolia'):
-        """Get a Web3 connection for a given network with fallback to multiple RPCs"""
-        if network not in self.connections:
-            # Try primary RPC
-            primary_rpc = NETWORKS[network]['rpc_url']
+class RateLimited(Exception):
+    """An outbound request couldn't get a slot before its deadline"""
+    pass
+
+
+def retry_after_seconds(response):
+    """Retry-After header of a response in seconds, if it gives a number"""
+    try:
+        return float(response.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """
+    Token bucket for one upstream. Requests that find the bucket empty queue by
+    priority (then arrival) until a token frees up or their deadline passes, and
+    are retried with jittered exponential backoff when the upstream answers 429/5xx.
+    """
+
+    def __init__(self, rate=10, burst=None, max_wait=5, max_retries=3, backoff=0.5, max_backoff=10):
+        self.rate = rate  # Tokens per second
+        self.capacity = burst or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.waiters = []  # Heap of (priority, arrival, future)
+        self.arrivals = itertools.count()
+        self.timer = None
+        self.stats = {'granted': 0, 'queued': 0, 'rejected': 0, 'retried': 0}
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def dispatch(self):
+        """Hand free tokens to the most urgent waiters, then wait for the next token"""
+        self.timer = None
+        self.refill()
+        while self.waiters and self.tokens >= 1:
+            _, _, future = heapq.heappop(self.waiters)
+            if future.done():  # Gave up (deadline or cancellation)
+                continue
+            self.tokens -= 1
+            future.set_result(None)
+        while self.waiters and self.waiters[0][2].done():
+            heapq.heappop(self.waiters)
+        if self.waiters:
+            self.timer = asyncio.get_running_loop().call_later((1 - self.tokens) / self.rate, self.dispatch)
+
+    async def acquire(self, priority=PRIORITY_COMMAND, deadline=None):
+        """Take a token, waiting in priority order; RateLimited if deadline (monotonic) passes first"""
+        self.refill()
+        if not self.waiters and self.tokens >= 1:
+            self.tokens -= 1
+            self.stats['granted'] += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (priority, next(self.arrivals), future))
+        self.stats['queued'] += 1
+        if self.timer is None:
+            self.dispatch()
+        timeout = None if deadline is None else max(0, deadline - time.monotonic())
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self.stats['rejected'] += 1
+            raise RateLimited("No request slot before the deadline") from None
+        self.stats['granted'] += 1
+
+    def penalize(self):
+        """The upstream pushed back: spend the burst so queued requests slow down"""
+        self.refill()
+        self.tokens = min(self.tokens, 0)
+
+    async def run(self, factory, priority=PRIORITY_COMMAND, deadline=None):
+        """Await factory() under the rate limit, retrying it when it raises UpstreamBusy"""
+        if deadline is None:
+            deadline = time.monotonic() + self.max_wait
+        attempt = 0
+        while True:
+            await self.acquire(priority, deadline)
             try:
-                w3 = Web3(Web3.HTTPProvider(primary_rpc))
-                if w3.is_connected():
-                    self.connections[network] = w3
-                    return w3
-                else:
-                    print(f"⚠️ Primary RPC {primary_rpc} unavailable, trying alternatives...")
+                return await factory()
+            except UpstreamBusy as e:
+                self.penalize()
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                # Full jitter, so callers rejected together don't come back together
+                delay = e.retry_after or random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+                if time.monotonic() + delay >= deadline:
+                    raise
+                self.stats['retried'] += 1
+                await asyncio.sleep(delay)
+
+
+def import_web3():
+    """web3 is the slowest import of the bot by far: it is only loaded when first needed"""
+    from web3 import AsyncWeb3, AsyncHTTPProvider
+    return AsyncWeb3, AsyncHTTPProvider
+
+
+class RPCError(Exception):
+    """Error returned by a JSON-RPC endpoint"""
+    pass
+
+
+class RPCEndpoint:
+    """Health statistics for one RPC URL"""
+
+    def __init__(self, url, alpha=0.3, failure_threshold=3, cooldown=30):
+        self.url = url
+        self.w3 = None
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.latency = None  # EWMA, seconds
+        self.error_rate = 0.0  # EWMA of failures (0..1)
+        self.block_number = None
+        self.consecutive_failures = 0
+        self.open_until = 0  # Circuit breaker: skipped until this time
+
+    def is_available(self):
+        """False while the circuit breaker is open"""
+        return time.monotonic() >= self.open_until
+
+    def record_latency(self, latency):
+        self.latency = latency if self.latency is None else self.alpha * latency + (1 - self.alpha) * self.latency
+
+    def record_success(self, latency, block_number=None):
+        self.record_latency(latency)
+        self.error_rate = (1 - self.alpha) * self.error_rate
+        self.consecutive_failures = 0
+        self.open_until = 0
+        if block_number is not None:
+            self.block_number = max(self.block_number or 0, block_number)
+
+    def record_failure(self):
+        self.error_rate = self.alpha + (1 - self.alpha) * self.error_rate
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.failure_threshold:
+            # Open the breaker; after the cooldown the endpoint gets a trial call again
+            self.open_until = time.monotonic() + self.cooldown
+            print(f"⚠️ Circuit opened for {self.url} after {self.consecutive_failures} failures")
+
+    def score(self, head=None, lag_penalty=0.5):
+        """Lower is better: latency, inflated by errors and by lagging behind the head"""
+        latency = self.latency if self.latency is not None else 1.0
+        lag = max(0, head - self.block_number) if head and self.block_number else 0
+        return latency * (1 + 4 * self.error_rate) + lag * lag_penalty
+
+
+class RPCEndpointPool:
+    """RPC endpoints of one network, ranked by health"""
+
+    def __init__(self, urls, **endpoint_options):
+        self.endpoints = [RPCEndpoint(url, **endpoint_options) for url in dict.fromkeys(urls)]
+
+    def head(self):
+        """Highest block number seen across endpoints"""
+        return max((e.block_number for e in self.endpoints if e.block_number), default=None)
+
+    def ranked(self):
+        """Available endpoints, best first (endpoints that never answered come last)"""
+        head = self.head()
+        return sorted((e for e in self.endpoints if e.is_available()),
+                      key=lambda e: (e.latency is None, e.score(head)))
+
+    def has_healthy(self):
+        return any(e.latency is not None and e.is_available() for e in self.endpoints)
+
+
+class Web3Manager:
+    def __init__(self, request_timeout=10, batch_size=100, max_concurrency=10,
+                 failure_threshold=3, cooldown=30, hedge_delay=0.2, rate_limits=None, probe_timeout=2):
+        self.pools = {}
+        self.session = None
+        self.request_timeout = request_timeout
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.endpoint_options = {'failure_threshold': failure_threshold, 'cooldown': cooldown}
+        self.hedge_delay = hedge_delay
+        self.probe_timeout = probe_timeout
+        self.health_task = None
+        self.flights = SingleFlight()
+        # Token bucket options: 'rpc' applies to every endpoint, an RPC URL key overrides it
+        self.rate_limits = rate_limits or {}
+        self.limiters = {}
+
+    async def get_session(self):
+        """Create the HTTP session shared by every RPC provider"""
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout),
+                connector=aiohttp.TCPConnector(limit=100, keepalive_timeout=60)
+            )
+        return self.session
+
+    def get_pool(self, network):
+        """Endpoint pool for a network: primary RPC first, then alternatives"""
+        if network not in self.pools:
+            urls = [NETWORKS[network]['rpc_url']] + NETWORKS[network].get('rpc_alternatives', [])
+            self.pools[network] = RPCEndpointPool(urls, **self.endpoint_options)
+        return self.pools[network]
+
+    def get_limiter(self, url):
+        """Rate limiter of one RPC endpoint"""
+        if url not in self.limiters:
+            self.limiters[url] = RateLimiter(**self.rate_limits.get(url, self.rate_limits.get('rpc', {})))
+        return self.limiters[url]
+
+    async def create_web3(self, rpc_url):
+        """Build an AsyncWeb3 instance that uses the shared connection pool"""
+        AsyncWeb3, AsyncHTTPProvider = await asyncio.to_thread(import_web3)
+        provider = AsyncHTTPProvider(rpc_url)
+        await provider.cache_async_session(await self.get_session())
+        return AsyncWeb3(provider)
+
+    async def connect(self, network, priority=PRIORITY_COMMAND):
+        """
+        Make sure a network has an endpoint known to answer. Every endpoint is probed at
+        once, each within probe_timeout, and the first to answer wins; the slower probes
+        finish in the background and rank the other endpoints.
+        """
+        pool = self.get_pool(network)
+        if pool.has_healthy():
+            return True
+
+        probes = {asyncio.ensure_future(self.probe(endpoint, priority)): endpoint for endpoint in pool.ranked()}
+        pending = set(probes)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for probe in done:
+                if probe.result():
+                    print(f"✅ Successfully connected with {probes[probe].url}")
+                    return True
+        print(f"❌ Unable to connect to {network} network")
+        return False
+
+    async def get_web3(self, network='sepolia', priority=PRIORITY_COMMAND):
+        """Get a Web3 connection to the healthiest RPC of a network (created on first use)"""
+        if not await self.connect(network, priority):
+            return None
+
+        ranked = self.get_pool(network).ranked()
+        if not ranked:
+            return None
+        endpoint = ranked[0]
+        if endpoint.w3 is None:
+            endpoint.w3 = await self.create_web3(endpoint.url)
+        return endpoint.w3
+
+    async def probe(self, endpoint, priority=PRIORITY_BACKGROUND):
+        """Measure one endpoint with eth_blockNumber, return True if it answered"""
+        return await self.flights.do(('probe', endpoint.url), lambda: self.send_probe(endpoint, priority))
+
+    async def send_probe(self, endpoint, priority=PRIORITY_BACKGROUND):
+        try:
+            # A dead endpoint must not hold up the probes for request_timeout
+            result = await asyncio.wait_for(
+                self.send(endpoint, {'jsonrpc': '2.0', 'id': 1, 'method': 'eth_blockNumber', 'params': []}, priority),
+                self.probe_timeout)
+            endpoint.block_number = max(endpoint.block_number or 0, int(result['result'], 16))
+            return True
+        except asyncio.TimeoutError:
+            endpoint.record_failure()
+            print(f"⚠️ RPC probe timed out after {self.probe_timeout}s: {endpoint.url}")
+            return False
+        except Exception as e:
+            print(f"⚠️ RPC error {endpoint.url}: {e}")
+            return False
+
+    async def check_health(self, network):
+        """Probe every endpoint of a network concurrently (also gives open circuits a retry)"""
+        pool = self.get_pool(network)
+        await asyncio.gather(*(self.probe(endpoint) for endpoint in pool.endpoints))
+
+    async def health_loop(self, interval):
+        while True:
+            await asyncio.gather(*(self.check_health(network) for network in NETWORKS))
+            await asyncio.sleep(interval)
+
+    def start_health_checks(self, interval=30):
+        """Start the background endpoint health checks (once)"""
+        if self.health_task is None or self.health_task.done():
+            self.health_task = asyncio.create_task(self.health_loop(interval))
+        return self.health_task
+
+    async def send(self, endpoint, payload, priority=PRIORITY_COMMAND):
+        """POST a raw JSON-RPC payload to one endpoint within its rate limit, recording latency and errors"""
+        try:
+            return await self.get_limiter(endpoint.url).run(lambda: self.send_once(endpoint, payload), priority)
+        except UpstreamBusy:
+            # Still throttled or failing after the retries
+            endpoint.record_failure()
+            raise
+
+    async def send_once(self, endpoint, payload):
+        session = await self.get_session()
+        started = time.monotonic()
+        try:
+            async with session.post(endpoint.url, json=payload) as response:
+                if response.status == 429 or response.status >= 500:
+                    raise UpstreamBusy(f"HTTP {response.status} from {endpoint.url}", retry_after_seconds(response))
+                if response.status != 200:
+                    raise RPCError(f"HTTP {response.status} from {endpoint.url}")
+                reply = await response.json(content_type=None)
+        except UpstreamBusy:
+            UPSTREAM_ERRORS.inc(upstream='rpc', target=endpoint.url, reason='busy')
+            raise
+        except asyncio.CancelledError:
+            # Lost a hedged race: still count how long it had been waiting
+            endpoint.record_latency(time.monotonic() - started)
+            raise
+        except Exception as e:
+            endpoint.record_failure()
+            UPSTREAM_ERRORS.inc(upstream='rpc', target=endpoint.url, reason=type(e).__name__)
+            raise
+        endpoint.record_success(time.monotonic() - started)
+        UPSTREAM_SECONDS.observe(time.monotonic() - started, upstream='rpc', target=endpoint.url)
+        return reply
+
+    async def send_hedged(self, endpoints, payload, priority=PRIORITY_COMMAND, tried=None):
+        """
+        Send to the best endpoint, and to the runner-up if the first is slow or fails;
+        the first answer wins. Every endpoint the request was sent to is appended to tried.
+        """
+        tried = [] if tried is None else tried
+        tasks = []
+
+        def start(endpoint):
+            tasks.append(asyncio.create_task(self.send(endpoint, payload, priority)))
+            tried.append(endpoint)
+
+        start(endpoints[0])
+        try:
+            pending = set(tasks)
+            error = None
+            while pending:
+                held_back = len(tasks) < len(endpoints)
+                done, pending = await asyncio.wait(pending, timeout=self.hedge_delay if held_back else None,
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                if held_back:
+                    # No answer within hedge_delay, or an early failure: don't wait any longer
+                    start(endpoints[len(tasks)])
+                    pending.add(tasks[-1])
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def post_rpc(self, network, payload, hedge=False, priority=PRIORITY_COMMAND):
+        """Send a JSON-RPC payload to the best endpoint, failing over down the ranking"""
+        if not await self.connect(network, priority):
+            raise RPCError(f"Unable to connect to {network} network")
+
+        endpoints = self.get_pool(network).ranked()
+        error = RPCError(f"No RPC endpoint available for {network}")
+        if hedge and len(endpoints) > 1:
+            tried = []
+            try:
+                return await self.send_hedged(endpoints[:2], payload, priority, tried)
             except Exception as e:
-                print(f"⚠️ Primary RPC error {primary_rpc}: {e}")
-
-            # Try alternative RPCs
-            if 'rpc_alternatives' in NETWORKS[network]:
-                for rpc_url in NETWORKS[network]['rpc_alternatives']:
-                    try:
-                        w3 = Web3(Web3.HTTPProvider(rpc_url))
-                        if w3.is_connected():
-                            print(f"✅ Successfully connected with {rpc_url}")
-                            self.connections[network] = w3
-                            return w3
-                    except Exception as e:
-                        print(f"⚠️ Alternative RPC error {rpc_url}: {e}")
-                        continue
-
-            print(f"❌ Unable to connect to {network} network")
+                print(f"⚠️ Hedged request failed ({e}), failing over")
+                error = e
+                # Only the endpoints that were actually sent the request are skipped
+                endpoints = [endpoint for endpoint in endpoints if endpoint not in tried]
+
+        for endpoint in endpoints:
+            try:
+                return await self.send(endpoint, payload, priority)
+            except Exception as e:
+                print(f"⚠️ RPC error {endpoint.url}: {e}")
+                error = e
+        raise error
+
+    @staticmethod
+    def rpc_result(reply):
+        """Extract the result of a JSON-RPC reply, or the error it carries"""
+        if reply.get('error'):
+            return RPCError(reply['error'].get('message', str(reply['error'])))
+        return reply.get('result')
+
+    async def call(self, network, method, params=None, hedge=False, priority=PRIORITY_COMMAND):
+        """Send a single (read-only) JSON-RPC request, sharing identical in-flight requests"""
+        key = ('call', network, method, json.dumps(params or []), hedge)
+        return await self.flights.do(key, lambda: self.send_call(network, method, params, hedge, priority))
+
+    async def send_call(self, network, method, params=None, hedge=False, priority=PRIORITY_COMMAND):
+        reply = await self.post_rpc(network, {'jsonrpc': '2.0', 'id': 1, 'method': method, 'params': params or []},
+                                    hedge=hedge, priority=priority)
+        result = self.rpc_result(reply)
+        if isinstance(result, RPCError):
+            raise result
+        return result
+
+    async def batch_call(self, network, calls, hedge=False, priority=PRIORITY_COMMAND):
+        """
+        Send several (read-only) JSON-RPC requests in one batch and return their results in order.
+        A failed call yields an RPCError in its slot. Endpoints that reject batches
+        fall back to concurrent single requests, at most max_concurrency at a time.
+        An identical batch already in flight is shared instead of being sent again.
+        """
+        if not calls:
+            return []
+        key = ('batch', network, json.dumps(calls), hedge)
+        return list(await self.flights.do(key, lambda: self.send_batch(network, calls, hedge, priority)))
+
+    async def send_batch(self, network, calls, hedge=False, priority=PRIORITY_COMMAND):
+
+        results = []
+        for start in range(0, len(calls), self.batch_size):
+            chunk = calls[start:start + self.batch_size]
+            payload = [{'jsonrpc': '2.0', 'id': i, 'method': method, 'params': params}
+                       for i, (method, params) in enumerate(chunk)]
+            try:
+                replies = await self.post_rpc(network, payload, hedge=hedge, priority=priority)
+                if not isinstance(replies, list):
+                    raise RPCError("Batch requests not supported")
+                by_id = {reply.get('id'): reply for reply in replies}
+                results.extend(self.rpc_result(by_id[i]) if i in by_id else RPCError("Missing batch reply")
+                               for i in range(len(chunk)))
+            except (RPCError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"⚠️ Batch request failed on {network} ({e}), sending calls individually")
+                results.extend(await self.concurrent_call(network, chunk, priority))
+        return results
+
+    async def concurrent_call(self, network, calls, priority=PRIORITY_COMMAND):
+        """Send JSON-RPC requests concurrently with a bounded number in flight"""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def bounded(method, params):
+            async with semaphore:
+                try:
+                    return await self.call(network, method, params, priority=priority)
+                except Exception as e:
+                    return e if isinstance(e, RPCError) else RPCError(str(e))
+
+        return await asyncio.gather(*(bounded(method, params) for method, params in calls))
+
+    async def get_balances(self, network, addresses, block='latest', hedge=False, priority=PRIORITY_COMMAND):
+        """Balances in wei for many addresses, keyed by address (RPCError on failure)"""
+        addresses = list(dict.fromkeys(addresses))
+        results = await self.batch_call(network, [('eth_getBalance', [address, block]) for address in addresses],
+                                        hedge=hedge, priority=priority)
+        return {address: result if isinstance(result, RPCError) else int(result, 16)
+                for address, result in zip(addresses, results)}
+
+    async def close(self):
+        """Close the shared HTTP session"""
+        if self.health_task:
+            self.health_task.cancel()
+        if self.session:
+            await self.session.close()
+
+
+class ChainHeadTracker:
+    """
+    Follows the head of every network in the background and caches the latest block,
+    base fee and gas price, so commands read them from memory instead of the RPC.
+    Polls once per expected block time, then every poll_interval until the next block shows up.
+    """
+
+    def __init__(self, manager, poll_interval=1, stale_after=60):
+        self.manager = manager
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.heads = {}  # network -> latest head
+        self.subscribers = []
+        self.tasks = {}
+
+    def get(self, network):
+        """Latest head of a network, or None if unknown or stale"""
+        head = self.heads.get(network)
+        if head is None or time.monotonic() - head['updated_at'] > self.stale_after:
             return None
+        return head
+
+    def is_live(self, network):
+        return self.get(network) is not None
+
+    def subscribe(self, callback):
+        """Call callback(network, head) as a task on every new block"""
+        if callback not in self.subscribers:
+            self.subscribers.append(callback)
+
+    async def poll(self, network):
+        """Fetch the latest block and gas price in one batch"""
+        block, gas_price = await self.manager.batch_call(
+            network, [('eth_getBlockByNumber', ['latest', False]), ('eth_gasPrice', [])], priority=PRIORITY_BACKGROUND)
+        if isinstance(block, RPCError) or isinstance(gas_price, RPCError) or block is None:
+            raise RPCError(f"head poll failed: {block if isinstance(block, RPCError) else gas_price}")
+        return {
+            'block_number': int(block['number'], 16),
+            'block_hash': block['hash'],
+            'base_fee': int(block['baseFeePerGas'], 16) if block.get('baseFeePerGas') else None,
+            'gas_price': int(gas_price, 16),
+            'updated_at': time.monotonic()
+        }
+
+    async def follow(self, network):
+        block_time = NETWORKS[network].get('block_time', 12)
+        seen_at = 0
+        while True:
+            try:
+                head = await self.poll(network)
+                previous = self.heads.get(network)
+                self.heads[network] = head
+                if previous is None or head['block_number'] != previous['block_number']:
+                    seen_at = time.monotonic()
+                    for callback in self.subscribers:
+                        asyncio.create_task(callback(network, head))
+            except Exception as e:
+                print(f"❌ Head tracker error on {network}: {e}")
 
-        return self.connections[network]
+            # Nothing new is expected before a block time has elapsed
+            await asyncio.sleep(max(self.poll_interval, seen_at + block_time - time.monotonic()))
 
-    def is_connected(self, network='sepolia'):
-        """Check if Web3 connection is active"""
-        w3 = self.get_web3(network)
-        if w3:
+    def start(self):
+        """Start one follower task per network (once)"""
+        for network in NETWORKS:
+            if network not in self.tasks or self.tasks[network].done():
+                self.tasks[network] = asyncio.create_task(self.follow(network))
+
+    def close(self):
+        for task in self.tasks.values():
+            task.cancel()
+
+
+class BalanceCache:
+    """
+    Native and token balances keyed by (network, address), each tagged with the head block
+    they were read at. An entry is only served while that block is still the head, and the
+    least recently read entries are evicted first. On every new head, addresses read
+    within recent_window seconds are refreshed in bulk (one batch for native balances, one
+    aggregate3 call for token balances), so hot users hit memory.
+    """
+
+    # Entry fields: [block_number, balance_wei, token balances, last_read]
+    NATIVE, TOKENS, LAST_READ = 1, 2, 3
+
+    def __init__(self, manager, tracker, tokens, max_size=10000, recent_window=300):
+        self.manager = manager
+        self.tracker = tracker
+        self.tokens = tokens  # TokenBalances
+        self.max_size = max_size
+        self.recent_window = recent_window
+        self.entries = OrderedDict()  # (network, address) -> entry
+
+    def store(self, network, address, block_number, field, value, last_read, touch=True):
+        key = (network, address)
+        entry = self.entries.get(key)
+        if entry is None or entry[0] != block_number:
+            entry = self.entries[key] = [block_number, None, None, last_read]
+        entry[field] = value
+        entry[self.LAST_READ] = max(entry[self.LAST_READ], last_read)
+        if touch:
+            self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    @staticmethod
+    def failed(value):
+        """True for a balance that couldn't be read (never cached)"""
+        if isinstance(value, dict):
+            return any(isinstance(amount, RPCError) for amount in value.values())
+        return isinstance(value, RPCError)
+
+    async def read(self, network, addresses, field, fetch, cache):
+        """Values of field keyed by address, from memory when read at the current head"""
+        head = self.tracker.get(network)
+        now = time.monotonic()
+        values, missing = {}, []
+
+        for address in dict.fromkeys(addresses):
+            entry = self.entries.get((network, address))
+            if head and entry and entry[0] == head['block_number'] and entry[field] is not None:
+                entry[self.LAST_READ] = now
+                self.entries.move_to_end((network, address))
+                values[address] = entry[field]
+            else:
+                missing.append(address)
+
+        CACHE_REQUESTS.inc(len(values), cache=cache, result='hit')
+        CACHE_REQUESTS.inc(len(missing), cache=cache, result='miss')
+        if missing:
+            fetched = await fetch(network, missing)
+            for address, value in fetched.items():
+                # Without a known head there is nothing to bound staleness against: don't cache
+                if head and not self.failed(value):
+                    self.store(network, address, head['block_number'], field, value, now)
+            values.update(fetched)
+
+        return values
+
+    async def get_balances(self, network, addresses):
+        """Balances in wei keyed by address (RPCError on failure), from memory when current"""
+        return await self.read(network, addresses, self.NATIVE,
+                               lambda network, missing: self.manager.get_balances(network, missing, hedge=True),
+                               'balances')
+
+    async def get_token_balances(self, network, addresses):
+        """Token balances keyed by address then symbol (see TokenBalances), from memory when current"""
+        if not NETWORKS[network]['tokens']:
+            return {}
+        return await self.read(network, addresses, self.TOKENS, self.tokens.get_balances, 'token_balances')
+
+    async def on_new_head(self, network, head):
+        """Head tracker callback: refresh recently read balances of this network in bulk"""
+        cutoff = time.monotonic() - self.recent_window
+        recent = [(address, entry) for (entry_network, address), entry in list(self.entries.items())
+                  if entry_network == network and entry[self.LAST_READ] >= cutoff]
+        native = [address for address, entry in recent if entry[self.NATIVE] is not None]
+        tokens = [address for address, entry in recent if entry[self.TOKENS] is not None]
+        if not native and not tokens:
+            return
+
+        async def no_balances():
+            return {}
+
+        # Native balances in one batch and token balances in one aggregate3 call, concurrently
+        results = await asyncio.gather(
+            self.manager.get_balances(network, native, priority=PRIORITY_BACKGROUND) if native else no_balances(),
+            self.tokens.get_balances(network, tokens, priority=PRIORITY_BACKGROUND) if tokens else no_balances(),
+            return_exceptions=True)
+        for field, fetched in zip((self.NATIVE, self.TOKENS), results):
+            if isinstance(fetched, Exception):
+                print(f"❌ Balance refresh error on {network}: {fetched}")
+                continue
+            for address, value in fetched.items():
+                entry = self.entries.get((network, address))
+                if entry is not None and value is not None and not self.failed(value):
+                    self.store(network, address, head['block_number'], field, value, entry[self.LAST_READ],
+                               touch=False)
+
+
+class TokenBalances:
+    """
+    ERC-20 balances of the configured tokens. Every balance of every wallet on a network,
+    plus the metadata of tokens not in the on-disk cache yet, is read with one Multicall3
+    aggregate3 eth_call (split only past max_calls calls).
+    """
+
+    def __init__(self, manager, metadata_cache, max_calls=500):
+        self.manager = manager
+        self.metadata_cache = metadata_cache
+        self.max_calls = max_calls
+
+    @staticmethod
+    def find(network, currency):
+        """Contract address of a configured token symbol on a network, or None"""
+        return NETWORKS[network]['tokens'].get(currency.upper())
+
+    def metadata(self, network, address):
+        """{'decimals', 'symbol'} of a token, or None if not read yet"""
+        return self.metadata_cache.get(NETWORKS[network]['caip2'], address)
+
+    async def aggregate(self, network, calls, hedge=False, priority=PRIORITY_COMMAND):
+        """[(success, return data)] of [(target, calldata)] through Multicall3"""
+        results = []
+        for start in range(0, len(calls), self.max_calls):
+            data = encode_aggregate3(calls[start:start + self.max_calls])
+            result = await self.manager.call(network, 'eth_call', [{'to': NETWORKS[network]['multicall'], 'data': data},
+                                                                   'latest'], hedge=hedge, priority=priority)
             try:
-                return w3.is_connected()
-            except:
-                return False
-        return False
+                results.extend(decode_aggregate3(result))
+            except ValueError as e:
+                raise RPCError(f"Multicall failed on {network}: {e}")
+        return results
+
+    async def get_balances(self, network, addresses=(), priority=PRIORITY_COMMAND):
+        """
+        Token balances of addresses, keyed by address then token symbol (in token units,
+        RPCError for a token that couldn't be read). Missing metadata rides along in the same call.
+        """
+        tokens = NETWORKS[network]['tokens']
+        missing = [token for token in dict.fromkeys(tokens.values()) if self.metadata(network, token) is None]
+        addresses = list(dict.fromkeys(addresses))
+        calls = [(token, encode_call(selector)) for token in missing for selector in (DECIMALS, SYMBOL)]
+        calls += [(token, encode_call(BALANCE_OF, encode_address(address)))
+                  for address in addresses for token in tokens.values()]
+        if not calls:
+            return {}
+        try:
+            results = await self.aggregate(network, calls, hedge=True, priority=priority)
+        except Exception as e:
+            error = e if isinstance(e, RPCError) else RPCError(str(e))
+            return {address: {symbol: error for symbol in tokens} for address in addresses}
+
+        fetched = {}
+        for i, token in enumerate(missing):
+            (decimals_ok, decimals), (symbol_ok, symbol) = results[2 * i:2 * i + 2]
+            decimals = decode_uint(decimals) if decimals_ok else None
+            if decimals is not None and decimals <= 255:
+                fetched[token] = {'decimals': decimals, 'symbol': (decode_string(symbol) if symbol_ok else None)}
+        if fetched:
+            self.metadata_cache.update(NETWORKS[network]['caip2'], fetched)
+
+        balances = {}
+        results = iter(results[2 * len(missing):])
+        for address in addresses:
+            balances[address] = {}
+            for symbol, token in tokens.items():
+                success, data = next(results)
+                metadata, value = self.metadata(network, token), decode_uint(data) if success else None
+                if metadata is None or value is None:
+                    balances[address][symbol] = RPCError(f"Unable to read {symbol} balance")
+                else:
+                    balances[address][symbol] = from_units(value, metadata['decimals'])
+        return balances
+
+    async def get_metadata(self, network, token, priority=PRIORITY_COMMAND):
+        """Metadata of one configured token, read on-chain (with the others missing) if not cached"""
+        if self.metadata(network, token) is None:
+            await self.get_balances(network, priority=priority)
+        return self.metadata(network, token)
+
+
+class PrivyUserCache:
+    """
+    In-memory index of Privy users keyed by Discord subject ID (TTL + LRU).
+    Every sync, full or incremental, revalidates the whole index: entries only expire
+    once neither they nor the index were refreshed within ttl (e.g. while Privy is down).
+    """
+
+    def __init__(self, ttl=300, max_size=10000, miss_ttl=30):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.miss_ttl = miss_ttl
+        self.users = OrderedDict()  # discord_id -> (expires_at, user)
+        self.loaded_at = None
+
+    @staticmethod
+    def discord_ids(user):
+        """Yield the Discord subject IDs linked to a Privy user"""
+        for account in user.get('linked_accounts', []):
+            if account.get('type') == 'discord_oauth' and account.get('subject'):
+                yield str(account['subject'])
+
+    def get(self, discord_id):
+        """Return the cached user, or None if missing or expired"""
+        key = str(discord_id)
+        entry = self.users.get(key)
+        if entry is None:
+            return None
+        expires_at, user = entry
+        if expires_at <= time.monotonic() and not self.recently_synced():
+            del self.users[key]
+            return None
+        self.users.move_to_end(key)
+        return user
+
+    def put(self, discord_id, user):
+        """Insert or refresh a user, evicting the least recently used entries"""
+        key = str(discord_id)
+        self.users[key] = (time.monotonic() + self.ttl, user)
+        self.users.move_to_end(key)
+        while len(self.users) > self.max_size:
+            self.users.popitem(last=False)
+
+    def load(self, users):
+        """Index every Discord-linked user from a Privy user list, return how many were indexed"""
+        indexed = 0
+        for user in users:
+            for discord_id in self.discord_ids(user):
+                self.put(discord_id, user)
+                indexed += 1
+        return indexed
+
+    def mark_loaded(self):
+        """Record that the index now reflects the Privy user list (users unchanged since stay valid)"""
+        self.loaded_at = time.monotonic()
+
+    def recently_synced(self):
+        """True if a sync confirmed the index less than ttl seconds ago"""
+        return self.loaded_at is not None and time.monotonic() - self.loaded_at < self.ttl
+
+    def recently_loaded(self):
+        """True if the full user list was indexed less than miss_ttl seconds ago"""
+        return self.loaded_at is not None and time.monotonic() - self.loaded_at < self.miss_ttl
+
+
+def privy_user_updated_at(user):
+    """Latest creation/verification timestamp of a Privy user (unix seconds)"""
+    timestamps = [user.get('created_at') or 0]
+    for account in user.get('linked_accounts', []):
+        timestamps.append(account.get('latest_verified_at') or account.get('verified_at') or 0)
+    return max(timestamps)
 
 
 class PrivyAPI:
-    def __init__(self, app_id, app_secret):
+    def __init__(self, app_id, app_secret, cache_ttl=300, cache_size=10000,
+                 page_size=100, full_sync_every=12, wallet_directory=None, rate_limit=None, syncs=True):
         self.app_id = app_id
         self.app_secret = app_secret
         self.base_url = "https://auth.privy.io"
         self.session = None
+        self.user_cache = PrivyUserCache(ttl=cache_ttl, max_size=cache_size)
+        self.wallet_directory = wallet_directory  # Persistent Discord ID -> wallet table fed by syncs
+        self.limiter = RateLimiter(**(rate_limit or {}))
+        # Background sync state; a process that doesn't sync (syncs=False) reads the shared
+        # wallet directory kept current by the one that does
+        self.syncs = syncs
+        self.page_size = page_size
+        self.full_sync_every = full_sync_every
+        self.flights = SingleFlight()
+        self.sync_task = None
+        self.sync_watermark = None  # Newest updated_at seen by the last sync
+        self.syncs_since_full = 0
+        self.last_sync = None
         # Configure headers that work
         import base64
         credentials = base64.b64encode(f"{self.app_id}:{self.app_secret}".encode()).decode()
@@ -138,49 +1015,141 @@ class PrivyAPI:
             self.session = aiohttp.ClientSession()
         return self.session
 
-    async def get_user_by_discord_id(self, discord_id):
+    async def get_user_by_discord_id(self, discord_id, priority=PRIORITY_COMMAND):
         """Search for a Privy user by Discord ID"""
+        # Warm cache: O(1) lookup, no HTTP call
+        user = self.user_cache.get(discord_id)
+        if user is not None:
+            CACHE_REQUESTS.inc(cache='privy_users', result='hit')
+            return user
+        CACHE_REQUESTS.inc(cache='privy_users', result='miss')
+
+        # Recorded by an earlier sync, possibly in another bot process
+        if self.wallet_directory:
+            user = await asyncio.to_thread(self.wallet_directory.get_user, discord_id)
+            CACHE_REQUESTS.inc(cache='wallet_directory', result='miss' if user is None else 'hit')
+            if user is not None:
+                self.user_cache.put(discord_id, user)
+                return user
+
+        # The index was rebuilt moments ago and this user wasn't in it, or another process syncs
+        if not self.syncs or self.user_cache.recently_loaded():
+            return None
+
+        # Pull new users (e.g. someone who just linked Discord), then retry
+        await self.sync_users(priority=priority)
+        return self.user_cache.get(discord_id)
+
+    async def fetch_user_page(self, params):
         session = await self.get_session()
+        with UPSTREAM_SECONDS.time(upstream='privy', target='/api/v1/users'):
+            async with session.get(f"{self.base_url}/api/v1/users",
+                                   headers=self.headers, params=params) as response:
+                if response.status != 200:
+                    UPSTREAM_ERRORS.inc(upstream='privy', target='/api/v1/users', reason=response.status)
+                if response.status == 429 or response.status >= 500:
+                    raise UpstreamBusy(f"Error searching user: {response.status}", retry_after_seconds(response))
+                if response.status != 200:
+                    raise RuntimeError(f"Error searching user: {response.status}")
+                return await response.json()
+
+    async def iter_user_pages(self, priority=PRIORITY_BACKGROUND):
+        """Yield the Privy user list one page at a time, following pagination cursors"""
+        cursor = None
+
+        while True:
+            params = {'limit': self.page_size}
+            if cursor:
+                params['cursor'] = cursor
+
+            # Only one page is held in memory at a time
+            result = await self.limiter.run(lambda: self.fetch_user_page(params), priority)
+
+            yield result.get('data', [])
+
+            cursor = result.get('next_cursor')
+            if not cursor:
+                return
+
+    async def sync_users(self, full=None, priority=PRIORITY_BACKGROUND):
+        """
+        Refresh the Discord ID index from Privy.
+        A full sync builds a new snapshot and swaps it in when complete, so lookups keep
+        using the previous one meanwhile (and drops users deleted from Privy). An incremental
+        sync merges only users created or verified since the last sync. The user list can't
+        be filtered by update time and a user keeps their position in it when they link a
+        new wallet, so an incremental sync still reads every page: it can't stop early.
+        """
+        # Concurrent callers (cache misses, the background loop) share the sync in progress
+        return await self.flights.do('sync_users', lambda: self.run_sync(full, priority))
+
+    async def run_sync(self, full=None, priority=PRIORITY_BACKGROUND):
+        if full is None:
+            full = self.sync_watermark is None or self.syncs_since_full >= self.full_sync_every
+
+        started = time.monotonic()
+        started_at = time.time()
+        target = PrivyUserCache(ttl=self.user_cache.ttl, max_size=self.user_cache.max_size,
+                                miss_ttl=self.user_cache.miss_ttl) if full else self.user_cache
+        watermark = self.sync_watermark or 0
+        newest = watermark
+        pages = users_seen = indexed = 0
 
         try:
-            async with session.get(f"{self.base_url}/api/v1/users",
-                                   headers=self.headers) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    users = result.get('data', [])
-
-                    # Search for user with matching Discord ID
-                    for user in users:
-                        linked_accounts = user.get('linked_accounts', [])
-                        for account in linked_accounts:
-                            if (account.get('type') == 'discord_oauth' and
-                                    account.get('subject') == str(discord_id)):
-                                return user
-
-                    return None  # No user found
-                else:
-                    print(f"❌ Error searching user: {response.status}")
-                    return None
+            async for page in self.iter_user_pages(priority):
+                pages += 1
+                users_seen += len(page)
+
+                if not full:
+                    page = [user for user in page if privy_user_updated_at(user) > watermark]
+                for user in page:
+                    newest = max(newest, privy_user_updated_at(user))
+                indexed += target.load(page)
+                if self.wallet_directory and page:
+                    await asyncio.to_thread(self.wallet_directory.update_from_users, page)
         except Exception as e:
-            print(f"❌ User search error: {e}")
+            print(f"❌ User sync error: {e}")
             return None
 
+        if full:
+            self.user_cache = target
+            self.syncs_since_full = 0
+            if self.wallet_directory:
+                await asyncio.to_thread(self.wallet_directory.prune, started_at)
+        else:
+            self.syncs_since_full += 1
+        self.user_cache.mark_loaded()
+        self.sync_watermark = newest
+
+        self.last_sync = {
+            'mode': 'full' if full else 'incremental',
+            'pages': pages,
+            'users': users_seen,
+            'indexed': indexed,
+            'cached': len(self.user_cache.users),
+            'duration': time.monotonic() - started
+        }
+        return self.last_sync
+
+    async def sync_loop(self, interval):
+        """Periodically sync the user index in the background"""
+        while True:
+            stats = await self.sync_users()
+            if stats:
+                print(f"🔄 Privy {stats['mode']} sync: {stats['users']} users over {stats['pages']} page(s), "
+                      f"{stats['indexed']} indexed in {stats['duration']:.2f}s")
+            await asyncio.sleep(interval)
+
+    def start_sync(self, interval=60):
+        """Start the background sync task (once)"""
+        if self.sync_task is None or self.sync_task.done():
+            self.sync_task = asyncio.create_task(self.sync_loop(interval))
+        return self.sync_task
+
     async def get_user_wallets(self, user_data):
         """Extract wallets from user data"""
         try:
-            wallets = []
-            linked_accounts = user_data.get('linked_accounts', [])
-
-            for account in linked_accounts:
-                if account.get('type') == 'wallet':
-                    wallets.append({
-                        'address': account.get('address'),
-                        'wallet_type': account.get('wallet_client_type', 'privy'),
-                        'chain_type': account.get('chain_type', 'ethereum'),
-                        'chain_id': account.get('chain_id', 'eip155:1'),
-                        'wallet_client': account.get('wallet_client', 'privy')
-                    })
-
+            wallets = extract_wallets(user_data)
             return {'wallets': wallets} if wallets else None
         except Exception as e:
             print(f"❌ Wallet extraction error: {e}")
@@ -188,39 +1157,187 @@ class PrivyAPI:
 
     async def close(self):
         """Close HTTP session"""
+        if self.sync_task:
+            self.sync_task.cancel()
         if self.session:
             await self.session.close()
 
 
 # Initialize Privy API and Web3Manager
-privy_api = PrivyAPI(config['privy_app_id'], config['privy_app_secret'])
-web3_manager = Web3Manager()
+# SQLite stores are called from worker threads (asyncio.to_thread), never on the event loop;
+# a write lock held by another process fails the call after SQLITE_TIMEOUT seconds
+SQLITE_TIMEOUT = config.get('sqlite_timeout', 5)
+wallet_directory = WalletDirectory(config.get('wallets_db', 'wallets.db'), timeout=SQLITE_TIMEOUT)
+privy_api = PrivyAPI(config['privy_app_id'], config['privy_app_secret'],
+                     cache_ttl=config.get('privy_cache_ttl', 300),
+                     cache_size=config.get('privy_cache_size', 10000),
+                     page_size=config.get('privy_page_size', 100),
+                     full_sync_every=config.get('privy_full_sync_every', 12),
+                     wallet_directory=wallet_directory,
+                     rate_limit=config.get('rate_limits', {}).get('privy'),
+                     syncs=IS_PRIMARY)
+web3_manager = Web3Manager(request_timeout=config.get('rpc_timeout', 10),
+                           batch_size=config.get('rpc_batch_size', 100),
+                           max_concurrency=config.get('rpc_max_concurrency', 10),
+                           failure_threshold=config.get('rpc_failure_threshold', 3),
+                           cooldown=config.get('rpc_cooldown', 30),
+                           hedge_delay=config.get('rpc_hedge_delay', 0.2),
+                           rate_limits=config.get('rate_limits'),
+                           probe_timeout=config.get('rpc_probe_timeout', 2))
+head_tracker = ChainHeadTracker(web3_manager, stale_after=config.get('head_stale_after', 60))
+token_balances = TokenBalances(web3_manager, TokenMetadataCache(config.get('token_metadata_cache',
+                                                                      'token_metadata.json')))
+balance_cache = BalanceCache(web3_manager, head_tracker, token_balances,
+                             max_size=config.get('balance_cache_size', 10000),
+                             recent_window=config.get('balance_refresh_window', 300))
+loop_monitor = EventLoopLagMonitor(LOOP_LAG)
+
+# Counters kept by the coalescing and rate limiting layers, read at scrape time
+REGISTRY.counter('paybot_singleflight_calls_total', 'Calls through request coalescing',
+                 ('upstream', 'result')).set_function(lambda: {
+                     (upstream, result): flights.stats[key]
+                     for upstream, flights in (('rpc', web3_manager.flights), ('privy', privy_api.flights))
+                     for result, key in (('total', 'calls'), ('coalesced', 'coalesced'))})
+REGISTRY.counter('paybot_rate_limiter_requests_total', 'Outbound requests through the rate limiters',
+                 ('upstream', 'target', 'result')).set_function(lambda: {
+                     (upstream, target, result): count
+                     for upstream, target, limiter in [('privy', privy_api.base_url, privy_api.limiter)] +
+                     [('rpc', url, limiter) for url, limiter in list(web3_manager.limiters.items())]
+                     for result, count in limiter.stats.items()})
 
 
 # Event triggered when bot is ready
+@bot.event
+async def setup_hook():
+    """Register the slash commands with Discord before connecting"""
+    if IS_PRIMARY and config.get('sync_slash_commands', True):
+        synced = await bot.tree.sync()
+        print(f'✅ {len(synced)} slash command(s) synced')
+
+
 @bot.event
 async def on_ready():
     print(f'✅ Bot connected as {bot.user.name}!')
     print(f'🆔 Bot ID: {bot.user.id}')
     print(f'🌐 Bot is present on {len(bot.guilds)} server(s)')
+    if bot.shard_count:
+        print(f'🧩 Shards {SHARD_IDS or list(range(bot.shard_count))} of {bot.shard_count}'
+              f'{" (primary)" if IS_PRIMARY else ""}')
+
+    # Measure event loop lag and serve /metrics (every process, not only the primary)
+    loop_monitor.start()
+    await metrics_server.start(host=config.get('metrics_host', '127.0.0.1'), port=METRICS_PORT)
+    # Keep RPC endpoint scores fresh and retry open circuits
+    web3_manager.start_health_checks(config.get('rpc_health_interval', 30))
+    # Follow every chain head; commands and the receipt watcher read from it
+    head_tracker.start()
+    if IS_PRIMARY:
+        # Keep the Discord ID index warm in the background (other processes read the shared directory)
+        privy_api.start_sync(config.get('privy_sync_interval', 60))
+        # Expire stale payment links and archive settled payments
+        payment_expiry.start()
+        # Deliver confirmations coming from the web API (replays any backlog first)
+        await payment_notifier.start(port=config.get('bot_events_port', 5001))
+        # Verify submitted transactions on-chain
+        receipt_watcher.start(head_tracker, payment_notifier)
+    # Refresh hot balances once per block
+    head_tracker.subscribe(balance_cache.on_new_head)
+    # Pre-render the static embeds; the networks one follows status changes
+    embed_cache.get('faucet', None, build_faucet_embed)
+    head_tracker.subscribe(refresh_networks_embed)
+
+    # Check Web3 connections in the background: commands don't wait for slow endpoints
+    asyncio.create_task(check_connections())
 
-    # Check Web3 connections
-    for network in NETWORKS:
-        if web3_manager.is_connected(network):
+    print('------')
+
+
+async def check_connections():
+    """Connect to every network at once and report (also loads web3 off the event loop)"""
+    async def check(network):
+        if await web3_manager.get_web3(network, PRIORITY_BACKGROUND):
             print(f'✅ {NETWORKS[network]["name"]} connection active')
         else:
             print(f'❌ {NETWORKS[network]["name"]} connection failed')
 
-    print('------')
+    await asyncio.gather(*(check(network) for network in NETWORKS))
+
+
+class EmbedCache:
+    """Pre-rendered embeds, rebuilt only when their key (e.g. network status) changes"""
+
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, name, key, build):
+        entry = self.entries.get(name)
+        if entry is None or entry[0] != key:
+            CACHE_REQUESTS.inc(cache='embeds', result='miss')
+            entry = self.entries[name] = (key, build())
+        else:
+            CACHE_REQUESTS.inc(cache='embeds', result='hit')
+        return entry[1]
+
+
+embed_cache = EmbedCache()
+
+
+class CommandReply:
+    """
+    Answer to a command behind a loading placeholder. The placeholder is only posted
+    if the answer takes longer than delay seconds, so answers served from the caches
+    cost one Discord message instead of a message and an edit.
+    """
+
+    def __init__(self, channel, loading_text, delay=0.5):
+        self.channel = channel
+        self.message = None
+        self.posting = False
+        self.placeholder = None
+        # A deferred slash command already shows Discord's own "thinking..." state
+        if getattr(channel, 'interaction', None) is None:
+            self.placeholder = asyncio.create_task(self.post_placeholder(loading_text, delay))
+
+    async def post_placeholder(self, text, delay):
+        if delay:
+            await asyncio.sleep(delay)
+        self.posting = True
+        self.message = await self.channel.send(text)
+
+    async def send(self, content=None, embed=None):
+        """Edit the placeholder into the answer, or send the answer directly if there is none"""
+        if self.placeholder is None:
+            pass
+        elif not self.posting:
+            self.placeholder.cancel()
+        else:
+            try:
+                await self.placeholder
+            except discord.HTTPException:
+                pass
+        if self.message:
+            await self.message.edit(content=content or "", embed=embed)
+        else:
+            await self.channel.send(content=content or None, embed=embed)
+
+
+LOADING_DELAY = config.get('loading_placeholder_delay', 0.5)
+
+
+async def defer(ctx, ephemeral=False):
+    """Acknowledge a slash command that has I/O to do (no-op for prefix commands)"""
+    if ctx.interaction:
+        await ctx.defer(ephemeral=ephemeral)
 
 
 # $wallet command
-@bot.command(name='wallet')
+@bot.hybrid_command(name='wallet')
 async def wallet_command(ctx):
     """Retrieve user's wallet information from Privy"""
+    await defer(ctx)
 
-    # Loading message
-    loading_msg = await ctx.send("🔍 Searching for your wallet information...")
+    # Loading message (skipped when the answer comes from the caches)
+    reply = CommandReply(ctx, "🔍 Searching for your wallet information...", LOADING_DELAY)
 
     try:
         # Get Discord user
@@ -230,15 +1347,15 @@ async def wallet_command(ctx):
         user_data = await privy_api.get_user_by_discord_id(discord_user_id)
 
         if not user_data:
-            await loading_msg.edit(content="❌ No Privy account found linked to your Discord.\n"
-                                           "Please connect first on our application with Discord.")
+            await reply.send(content="❌ No Privy account found linked to your Discord.\n"
+                                      "Please connect first on our application with Discord.")
             return
 
         # Extract wallets from user data
         wallets_data = await privy_api.get_user_wallets(user_data)
 
         if not wallets_data or not wallets_data.get('wallets'):
-            await loading_msg.edit(content="❌ No wallet found for your account.")
+            await reply.send(content="❌ No wallet found for your account.")
             return
 
         # Format wallet information
@@ -268,11 +1385,7 @@ async def wallet_command(ctx):
         for i, wallet in enumerate(wallets_data['wallets'], 1):
             wallet_address = wallet.get('address', 'Address not available')
             wallet_type = wallet.get('wallet_type', 'Unknown type')
-            chain_type = wallet.get('chain_type', 'Unknown chain')
-            chain_id = wallet.get('chain_id', 'N/A')
-
-            # Format chain name
-            chain_name = "Ethereum" if "eip155" in chain_id else "Solana" if "solana" in chain_id else chain_type
+            chain_name = CHAINS.chain_name(wallet)
 
             embed.add_field(
                 name=f"💼 Wallet {i} ({chain_name})",
@@ -290,30 +1403,35 @@ async def wallet_command(ctx):
 
         embed.add_field(
             name="🌐 Supported Networks",
-            value="• Ethereum Mainnet\n• Sepolia Testnet\n\nUse `$balance sepolia` to see your Sepolia balance",
+            value='\n'.join(f"• {info['name']}" for info in NETWORKS.values()) +
+                  (f"\n\nUse `$balance {DEFAULT_NETWORK}` to see your {NETWORKS[DEFAULT_NETWORK]['name']} balance"
+                   if DEFAULT_NETWORK else ''),
             inline=False
         )
 
         embed.set_footer(text="Information retrieved from Privy.io")
 
-        await loading_msg.edit(content="", embed=embed)
+        await reply.send(embed=embed)
 
     except Exception as e:
-        await loading_msg.edit(content=f"❌ Error retrieving information: {str(e)}")
+        await reply.send(content=f"❌ Error retrieving information: {str(e)}")
         print(f"❌ Error in wallet_command: {e}")
 
 
 # New $balance command to check balance on Sepolia
-@bot.command(name='balance')
-async def balance_command(ctx, network='sepolia'):
+@bot.hybrid_command(name='balance')
+@app_commands.describe(network=f"Network to check (name or chain ID): {', '.join(NETWORKS)}")
+async def balance_command(ctx, network: str = None):
     """Check your wallet balance on a specific network"""
 
-    if network not in NETWORKS:
-        await ctx.send(f"❌ Network '{network}' not supported.\n"
+    requested, network = network, CHAINS.lookup(network) if network else DEFAULT_NETWORK
+    if network is None:
+        await ctx.send(f"❌ Network '{requested}' not supported.\n"
                        f"Available networks: {', '.join(NETWORKS.keys())}")
         return
 
-    loading_msg = await ctx.send(f"🔍 Checking balance on {NETWORKS[network]['name']}...")
+    await defer(ctx)
+    reply = CommandReply(ctx, f"🔍 Checking balance on {NETWORKS[network]['name']}...", LOADING_DELAY)
 
     try:
         # Get user and their wallets
@@ -321,20 +1439,20 @@ async def balance_command(ctx, network='sepolia'):
         user_data = await privy_api.get_user_by_discord_id(discord_user_id)
 
         if not user_data:
-            await loading_msg.edit(content="❌ No Privy account found linked to your Discord.")
+            await reply.send(content="❌ No Privy account found linked to your Discord.")
             return
 
         wallets_data = await privy_api.get_user_wallets(user_data)
 
         if not wallets_data or not wallets_data.get('wallets'):
-            await loading_msg.edit(content="❌ No wallet found for your account.")
+            await reply.send(content="❌ No wallet found for your account.")
             return
 
         # Get Web3 connection
-        w3 = web3_manager.get_web3(network)
+        w3 = await web3_manager.get_web3(network)
 
-        if not w3 or not web3_manager.is_connected(network):
-            await loading_msg.edit(content=f"❌ Unable to connect to {NETWORKS[network]['name']} network.")
+        if not w3:
+            await reply.send(content=f"❌ Unable to connect to {NETWORKS[network]['name']} network.")
             return
 
         embed = discord.Embed(
@@ -344,46 +1462,68 @@ async def balance_command(ctx, network='sepolia'):
             timestamp=datetime.now()
         )
 
-        # Check balance for each Ethereum wallet
-        for i, wallet in enumerate(wallets_data['wallets'], 1):
-            wallet_address = wallet.get('address')
-            chain_type = wallet.get('chain_type', '')
+        # Keep Ethereum wallets only
+        ethereum_wallets = [
+            (i, wallet.get('address')) for i, wallet in enumerate(wallets_data['wallets'], 1)
+            if CHAINS.is_evm(wallet)
+        ]
+        valid_addresses = [w3.to_checksum_address(address) for _, address in ethereum_wallets
+                           if w3.is_address(address)]
+
+        # Native and token balances from the block-height cache; misses are read concurrently
+        # (one batch for native balances, one multicall for every token balance)
+        balances, tokens = await asyncio.gather(balance_cache.get_balances(network, valid_addresses),
+                                                balance_cache.get_token_balances(network, valid_addresses))
+
+        # Block and gas price come from the head tracker; the RPC is only asked when it has nothing fresh
+        head = head_tracker.get(network)
+        if head:
+            block_number, gas_price = head['block_number'], head['gas_price']
+        else:
+            results = await web3_manager.batch_call(network, [('eth_blockNumber', []), ('eth_gasPrice', [])])
+            block_number, gas_price = (value if isinstance(value, RPCError) else int(value, 16)
+                                       for value in results)
 
-            # Check if it's an Ethereum wallet
-            if 'ethereum' in chain_type.lower() or 'eip155' in wallet.get('chain_id', ''):
-                try:
-                    # Verify address is valid
-                    if w3.is_address(wallet_address):
-                        checksum_address = w3.to_checksum_address(wallet_address)
-                        balance_wei = w3.eth.get_balance(checksum_address)
-                        balance_eth = w3.from_wei(balance_wei, 'ether')
-
-                        embed.add_field(
-                            name=f"💼 Wallet {i}",
-                            value=f"**Address:** `{wallet_address}`\n"
-                                  f"**Balance:** {balance_eth:.6f} {NETWORKS[network]['currency']}\n"
-                                  f"**Explorer:** [View on Etherscan]({NETWORKS[network]['explorer']}/address/{wallet_address})",
-                            inline=False
-                        )
-                    else:
-                        embed.add_field(
-                            name=f"💼 Wallet {i}",
-                            value=f"**Address:** `{wallet_address}`\n"
-                                  f"**Error:** Invalid address",
-                            inline=False
-                        )
-                except Exception as e:
-                    embed.add_field(
-                        name=f"💼 Wallet {i}",
-                        value=f"**Address:** `{wallet_address}`\n"
-                              f"**Error:** {str(e)[:100]}...",
-                        inline=False
-                    )
+        for i, wallet_address in ethereum_wallets:
+            if not w3.is_address(wallet_address):
+                embed.add_field(
+                    name=f"💼 Wallet {i}",
+                    value=f"**Address:** `{wallet_address}`\n"
+                          f"**Error:** Invalid address",
+                    inline=False
+                )
+                continue
+
+            balance_wei = balances[w3.to_checksum_address(wallet_address)]
+            if isinstance(balance_wei, RPCError):
+                embed.add_field(
+                    name=f"💼 Wallet {i}",
+                    value=f"**Address:** `{wallet_address}`\n"
+                          f"**Error:** {str(balance_wei)[:100]}...",
+                    inline=False
+                )
+                continue
+
+            balance_eth = w3.from_wei(balance_wei, 'ether')
+            # Tokens held; a token that couldn't be read is flagged instead of shown as 0
+            token_lines = ''.join(
+                f"**{symbol}:** {'unavailable' if isinstance(amount, RPCError) else f'{amount:.6f}'}\n"
+                for symbol, amount in tokens.get(w3.to_checksum_address(wallet_address), {}).items()
+                if isinstance(amount, RPCError) or amount)
+            embed.add_field(
+                name=f"💼 Wallet {i}",
+                value=f"**Address:** `{wallet_address}`\n"
+                      f"**Balance:** {balance_eth:.6f} {NETWORKS[network]['currency']}\n"
+                      f"{token_lines}"
+                      f"**Explorer:** [View on {NETWORKS[network].get('explorer_name', 'Etherscan')}]"
+                      f"({NETWORKS[network]['explorer']}/address/{wallet_address})",
+                inline=False
+            )
 
         # Network information
-        try:
-            block_number = w3.eth.block_number
-            gas_price = w3.eth.gas_price
+        if isinstance(block_number, RPCError) or isinstance(gas_price, RPCError):
+            print(f"❌ Error retrieving network info: {block_number if isinstance(block_number, RPCError) else gas_price}")
+        else:
             gas_price_gwei = w3.from_wei(gas_price, 'gwei')
 
             embed.add_field(
@@ -393,31 +1533,27 @@ async def balance_command(ctx, network='sepolia'):
                       f"**Gas Price:** {gas_price_gwei:.2f} Gwei",
                 inline=False
             )
-        except Exception as e:
-            print(f"❌ Error retrieving network info: {e}")
 
-        # Add faucet link for Sepolia
-        if network == 'sepolia':
+        # Add faucet link for testnets
+        if NETWORKS[network]['faucet']:
             embed.add_field(
                 name="🚰 Need test funds?",
-                value=f"Get free SepoliaETH: [Sepolia Faucet]({NETWORKS['sepolia']['faucet']})",
+                value=f"Get free {NETWORKS[network]['currency']}: "
+                      f"[{NETWORKS[network]['name']} Faucet]({NETWORKS[network]['faucet']})",
                 inline=False
             )
 
         embed.set_footer(text=f"Data retrieved from {NETWORKS[network]['name']}")
 
-        await loading_msg.edit(content="", embed=embed)
+        await reply.send(embed=embed)
 
     except Exception as e:
-        await loading_msg.edit(content=f"❌ Error checking balance: {str(e)}")
+        await reply.send(content=f"❌ Error checking balance: {str(e)}")
         print(f"❌ Error in balance_command: {e}")
 
 
-# $networks command to list supported networks
-@bot.command(name='networks')
-async def networks_command(ctx):
-    """Display supported networks"""
-
+def build_networks_embed():
+    """Supported networks with their live status"""
     embed = discord.Embed(
         title="🌐 Supported Networks",
         description="List of available blockchain networks",
@@ -426,7 +1562,7 @@ async def networks_command(ctx):
     )
 
     for network_key, network_info in NETWORKS.items():
-        status = "🟢 Connected" if web3_manager.is_connected(network_key) else "🔴 Disconnected"
+        status = "🟢 Connected" if head_tracker.is_live(network_key) else "🔴 Disconnected"
         faucet_info = f"\n**Faucet:** [Link]({network_info['faucet']})" if network_info['faucet'] else ""
 
         embed.add_field(
@@ -434,22 +1570,38 @@ async def networks_command(ctx):
             value=f"**Chain ID:** {network_info['chain_id']}\n"
                   f"**Currency:** {network_info['currency']}\n"
                   f"**Status:** {status}\n"
-                  f"**Explorer:** [Etherscan]({network_info['explorer']})"
+                  f"**Explorer:** [{network_info.get('explorer_name', 'Etherscan')}]({network_info['explorer']})"
                   f"{faucet_info}",
             inline=False
         )
 
     embed.add_field(
         name="💡 Usage",
-        value="• `$balance sepolia` - Check Sepolia balance\n"
-              "• `$balance ethereum` - Check Ethereum balance\n"
+        value=''.join(f"• `$balance {network_key}` - Check {network_info['name']} balance\n"
+                      for network_key, network_info in NETWORKS.items()) +
               "• `$wallet` - View all your wallets",
         inline=False
     )
 
     embed.set_footer(text="Use $balance <network> to check your balances")
+    return embed
+
 
-    await ctx.send(embed=embed)
+def network_status():
+    """Connected flag of every network: the networks embed is re-rendered when it changes"""
+    return tuple(head_tracker.is_live(network_key) for network_key in NETWORKS)
+
+
+async def refresh_networks_embed(network, head):
+    """Head tracker callback: re-render the networks embed if a network's status changed"""
+    embed_cache.get('networks', network_status(), build_networks_embed)
+
+
+# $networks command to list supported networks
+@bot.hybrid_command(name='networks')
+async def networks_command(ctx):
+    """Display supported networks"""
+    await ctx.send(embed=embed_cache.get('networks', network_status(), build_networks_embed))
 
 
 # Command error handling
@@ -458,7 +1610,11 @@ async def on_command_error(ctx, error):
     if isinstance(error, commands.CommandNotFound):
         return
     else:
+        finish_command(ctx)
+        COMMAND_ERRORS.inc(command=ctx.command.qualified_name if ctx.command else 'unknown',
+                           error=type(getattr(error, 'original', error)).__name__)
         print(f'❌ Command error: {error}')
+        traceback.print_exception(type(error), error, error.__traceback__)
         await ctx.send('An error occurred while executing the command.')
 
 
@@ -472,44 +1628,132 @@ async def on_message(message):
 
 # Cleanup function on shutdown
 async def close_bot():
+    loop_monitor.close()
+    payment_expiry.close()
+    head_tracker.close()
+    await payment_notifier.close()
+    await metrics_server.close()
     await privy_api.close()
+    await web3_manager.close()
     await bot.close()
 
 
-# Temporary storage for pending payments
-pending_payments = {}
+# Payment storage shared with the payment API (migrates pending_payments.json on first run)
+PAYMENT_TTL_HOURS = config.get('payment_ttl_hours', 24)
+payment_store = PaymentStore(payments_db_path(config=config),
+                             legacy_json_path='pending_payments.json',
+                             payment_ttl=PAYMENT_TTL_HOURS * 3600, timeout=SQLITE_TIMEOUT)
+
+
+class PaymentExpiryScheduler:
+    """Expires stale pending payments and archives settled ones in the background"""
+
+    def __init__(self, store, max_sleep=60, archive_after=7 * 24 * 3600, archive_interval=3600, batch_size=500):
+        self.store = store
+        self.batch_size = batch_size
+        self.max_sleep = max_sleep
+        self.archive_after = archive_after
+        self.archive_interval = archive_interval
+        self.task = None
+        self.last_archive = 0
+
+    async def run_once(self):
+        """Expire everything that is due and archive if it's time, return the next wake-up delay"""
+        while True:
+            expired = await asyncio.to_thread(self.store.expire_due, limit=self.batch_size)
+            if expired:
+                print(f"⏰ Expired {len(expired)} pending payment(s)")
+            if len(expired) < self.batch_size:
+                break
 
+        if time.time() - self.last_archive >= self.archive_interval:
+            self.last_archive = time.time()
+            while True:
+                archived = await asyncio.to_thread(self.store.archive_settled, self.archive_after,
+                                                   limit=self.batch_size)
+                if archived:
+                    print(f"📦 Archived {archived} settled payment(s)")
+                if archived < self.batch_size:
+                    break
 
-def save_pending_payments():
-    """Save pending payments to a file"""
-    try:
-        with open('pending_payments.json', 'w') as f:
-            json.dump(pending_payments, f, indent=2, default=str)
-    except Exception as e:
-        print(f"❌ Error saving payments: {e}")
+        # Sleep until the oldest pending payment expires (the expiry index gives it directly)
+        next_expiry = await asyncio.to_thread(self.store.next_expiry)
+        if next_expiry is None:
+            return self.max_sleep
+        return min(self.max_sleep, max(0, next_expiry - time.time()))
 
+    async def loop(self):
+        while True:
+            try:
+                delay = await self.run_once()
+            except Exception as e:
+                print(f"❌ Payment expiry error: {e}")
+                delay = self.max_sleep
+            await asyncio.sleep(delay)
 
-def load_pending_payments():
-    """Load pending payments from file"""
-    global pending_payments
-    try:
-        if os.path.exists('pending_payments.json'):
-            with open('pending_payments.json', 'r') as f:
-                pending_payments = json.load(f)
-    except Exception as e:
-        print(f"❌ Error loading payments: {e}")
-        pending_payments = {}
+    def start(self):
+        """Start the background task (once)"""
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.loop())
+        return self.task
+
+    def close(self):
+        if self.task:
+            self.task.cancel()
+
+
+payment_expiry = PaymentExpiryScheduler(payment_store,
+                                        archive_after=config.get('payment_archive_after_days', 7) * 24 * 3600)
+
+if IS_PRIMARY:
+    # Expiry and archiving progress, read from the store once per scrape by the process that runs them
+    payment_stats = {}
+    REGISTRY.add_collector(lambda: payment_stats.update(payment_store.stats()))
+    REGISTRY.counter('paybot_payments_expired_total', 'Pending payments expired').set_function(
+        lambda: {(): payment_stats['expired_total']})
+    REGISTRY.counter('paybot_payments_archived_total', 'Settled payments moved to the archive').set_function(
+        lambda: {(): payment_stats['archived_total']})
+    REGISTRY.gauge('paybot_payments_hot', 'Payments in the active database, by status', ('status',)).set_function(
+        lambda: {(status,): count for status, count in payment_stats['hot_by_status'].items()})
 
 
 # $pay command
-@bot.command(name='pay')
-async def pay_command(ctx, recipient: discord.Member = None, amount: float = None, *, currency: str = "ETH"):
+@bot.hybrid_command(name='pay')
+@app_commands.describe(recipient="User to pay", amount="Amount to send", currency="Currency (default ETH)",
+                       network=f"Network to pay on: {', '.join(NETWORKS)} (default {DEFAULT_NETWORK})")
+async def pay_command(ctx, recipient: discord.Member = None, amount: float = None, currency: str = "ETH",
+                      network: str = None):
     """Allows paying another Discord user"""
+    with span('pay', transport='slash' if ctx.interaction else 'prefix', currency=currency):
+        await process_payment_request(ctx, recipient, amount, currency, network)
+
+
+async def resolve_wallet(discord_id, priority=PRIORITY_COMMAND, preferred_chain=PREFERRED_CHAIN):
+    """
+    (has Privy account, wallet to use) for a Discord user, from the wallet directory.
+    Unknown users are looked up in Privy once and recorded.
+    """
+    known, wallet = await asyncio.to_thread(wallet_directory.resolve, discord_id, preferred_chain)
+    CACHE_REQUESTS.inc(cache='wallet_directory', result='hit' if known else 'miss')
+    if not known:
+        user_data = await privy_api.get_user_by_discord_id(discord_id, priority)
+        if user_data:
+            await asyncio.to_thread(wallet_directory.update_from_users, [user_data])
+            known, wallet = await asyncio.to_thread(wallet_directory.resolve, discord_id, preferred_chain)
+    return known, wallet
+
+
+def payment_network(payment):
+    """Network key of a payment (the webapp sent payments stored before it was recorded on Sepolia)"""
+    return payment.get('network') or 'sepolia'
+
+
+async def process_payment_request(ctx, recipient, amount, currency, network=None):
 
     # Parameter validation
     if recipient is None:
         # This message will be ephemeral
-        await ctx.send("❌ **Usage:** `$pay @user <amount> [currency]`\n"
+        await ctx.send("❌ **Usage:** `$pay @user <amount> [currency] [network]`\n"
                        "📋 **Example:** `$pay @JohnDoe 0.1 ETH`",
                        ephemeral=True)
         return
@@ -529,92 +1773,88 @@ async def pay_command(ctx, recipient: discord.Member = None, amount: float = Non
         await ctx.send("❌ You cannot pay a bot!", ephemeral=True)
         return
 
-    # Delete the user's initial message to not show it publicly
-    try:
-        await ctx.message.delete()
-    except discord.Forbidden:
-        print(f"Unable to delete message from {ctx.author}. Missing permissions?")
-        # Continue even without deletion if permissions are missing
-    except discord.NotFound:
-        pass  # Message already deleted or not found
+    # The payment is sent on the requested network, or the default one: never guessed from a wallet
+    requested, network = network, CHAINS.lookup(network) if network else DEFAULT_NETWORK
+    if network is None:
+        await ctx.send(f"❌ Network '{requested}' not supported.\n"
+                       f"Available networks: {', '.join(NETWORKS.keys())}", ephemeral=True)
+        return
+    network_info = NETWORKS[network]
+
+    if ctx.interaction:
+        # Slash commands leave no message to delete; only the sender sees the answer
+        await defer(ctx, ephemeral=True)
+    else:
+        # Delete the user's initial message to not show it publicly
+        try:
+            await ctx.message.delete()
+        except discord.Forbidden:
+            print(f"Unable to delete message from {ctx.author}. Missing permissions?")
+            # Continue even without deletion if permissions are missing
+        except discord.NotFound:
+            pass  # Message already deleted or not found
 
     # Send initial loading message as a DM to the sender
-    loading_msg_dm = await ctx.author.send("🔄 Processing your payment request...")
+    reply = CommandReply(ctx.author, "🔄 Processing your payment request...", LOADING_DELAY)
+    answered = False
 
     try:
+        # Resolve both parties concurrently from the local wallet directory
+        with span('pay.resolve_wallets'):
+            (sender_known, sender_wallet), (recipient_known, recipient_wallet) = await asyncio.gather(
+                resolve_wallet(ctx.author.id, PRIORITY_PAYMENT, network_info['caip2']),
+                resolve_wallet(recipient.id, PRIORITY_PAYMENT, network_info['caip2']))
+
         # Verify sender has a Privy account
-        sender_data = await privy_api.get_user_by_discord_id(ctx.author.id)
-        if not sender_data:
-            await loading_msg_dm.edit(
+        if not sender_known:
+            await reply.send(
                 content="❌ **Sender error:** No Privy account found linked to your Discord.\n"
                         "Please connect first on our application with Discord.")
             return
 
         # Verify recipient has a Privy account
-        recipient_data = await privy_api.get_user_by_discord_id(recipient.id)
-        if not recipient_data:
-            await loading_msg_dm.edit(
+        if not recipient_known:
+            await reply.send(
                 content=f"❌ **Recipient error:** {recipient.mention} doesn't have a linked Privy account.\n"
                         "The recipient must first connect on our application.")
             return
 
-        # Get sender's wallets
-        sender_wallets = await privy_api.get_user_wallets(sender_data)
-        if not sender_wallets or not sender_wallets.get('wallets'):
-            await loading_msg_dm.edit(content="❌ **Sender error:** No wallet found for your account.")
+        if not sender_wallet:
+            await reply.send(content="❌ **Sender error:** No wallet found for your account.")
             return
 
-        # Get recipient's wallets
-        recipient_wallets = await privy_api.get_user_wallets(recipient_data)
-        if not recipient_wallets or not recipient_wallets.get('wallets'):
-            await loading_msg_dm.edit(
+        if not recipient_wallet:
+            await reply.send(
                 content=f"❌ **Recipient error:** {recipient.mention} doesn't have a configured wallet.")
             return
 
-        # Take the first wallet of each user (Sepolia by default)
-        sender_wallet = None
-        recipient_wallet = None
-
-        # Look for Sepolia wallet first, then Ethereum
-        for wallet in sender_wallets['wallets']:
-            if ('eip155:11155111' in wallet.get('chain_id', '') or
-                    'eip155' in wallet.get('chain_id', '') or
-                    wallet.get('chain_type') == 'ethereum'):
-                sender_wallet = wallet
-                break
-
-        for wallet in recipient_wallets['wallets']:
-            if ('eip155:11155111' in wallet.get('chain_id', '') or
-                    'eip155' in wallet.get('chain_id', '') or
-                    wallet.get('chain_type') == 'ethereum'):
-                recipient_wallet = wallet
-                break
-
-        # If no Ethereum wallet, take the first available
-        if not sender_wallet and sender_wallets['wallets']:
-            sender_wallet = sender_wallets['wallets'][0]
-
-        if not recipient_wallet and recipient_wallets['wallets']:
-            recipient_wallet = recipient_wallets['wallets'][0]
-
-        if not sender_wallet or not recipient_wallet:
-            await loading_msg_dm.edit(content="❌ Unable to find compatible wallets for the transaction.")
+        # Both wallets must be EVM accounts, usable on the payment's network
+        chain_name = network_info['name']
+        if not CHAINS.is_evm(sender_wallet):
+            await reply.send(content=f"❌ **Sender error:** Your {CHAINS.chain_name(sender_wallet)} wallet "
+                                     f"can't send on {chain_name}.")
+            return
+        if not CHAINS.is_evm(recipient_wallet):
+            await reply.send(content=f"❌ **Recipient error:** {recipient.mention}'s "
+                                     f"{CHAINS.chain_name(recipient_wallet)} wallet can't receive on {chain_name}.")
             return
 
-        # Technical details - calculate chains before using them
-        def get_chain_name(wallet):
-            chain_id = wallet.get('chain_id', '')
-            if 'eip155:11155111' in chain_id:
-                return 'Sepolia Testnet'
-            elif 'eip155:1' in chain_id:
-                return 'Ethereum Mainnet'
-            elif 'eip155' in chain_id:
-                return f"Ethereum (Chain {chain_id.split(':')[-1]})"
-            else:
-                return wallet.get('chain_type', 'Unknown')
-
-        sender_chain = get_chain_name(sender_wallet)
-        recipient_chain = get_chain_name(recipient_wallet)
+        # The currency must be the native one or a token configured on the payment's network
+        native = {'ETH', network_info['currency'].upper()}
+        token = None
+        if currency.upper() not in native:
+            token = token_balances.find(network, currency)
+            if token is None:
+                available = dict.fromkeys(['ETH', network_info['currency'], *network_info['tokens']])
+                await reply.send(
+                    content=f"❌ **Currency error:** {currency.upper()} is not supported on {chain_name}.\n"
+                            f"Available currencies: {', '.join(available)}")
+                return
+            metadata = await token_balances.get_metadata(network, token, PRIORITY_PAYMENT)
+            if metadata is None:
+                await reply.send(content=f"❌ Unable to read the {currency.upper()} token on {chain_name}. "
+                                         "Please try again later.")
+                return
 
         # Generate unique ID for payment
         payment_id = str(uuid.uuid4())
@@ -630,17 +1870,32 @@ async def pay_command(ctx, recipient: discord.Member = None, amount: float = Non
             'currency': currency.upper(),
             'sender_wallet': sender_wallet['address'],
             'recipient_wallet': recipient_wallet['address'],
-            'sender_chain': sender_chain,
-            'recipient_chain': recipient_chain,
+            'sender_chain': chain_name,
+            'recipient_chain': chain_name,
+            # The webapp sends the transaction on this network and the receipt watcher follows it
+            'network': network,
+            'chain_id': network_info['chain_id'],
+            'testnet': network_info['testnet'],
+            'explorer': network_info['explorer'],
             'timestamp': datetime.now().isoformat(),
+            'expires_at': (datetime.now() + timedelta(hours=PAYMENT_TTL_HOURS)).isoformat(),
             'status': 'pending',  # Initial status
             'guild_id': ctx.guild.id,
             'channel_id': ctx.channel.id,
             'transaction_hash': None  # Add field for transaction hash
         }
-
-        pending_payments[payment_id] = payment_data
-        save_pending_payments()
+        if not token:
+            # Exact value the webapp sends and the receipt watcher expects (no float rounding)
+            payment_data['amount_wei'] = str(to_wei(amount))
+        if token:
+            # The webapp sends transaction_data (transfer to the recipient) to the token contract
+            token_amount = to_units(amount, metadata['decimals'])
+            payment_data.update(token_address=token, token_decimals=metadata['decimals'],
+                                token_amount=str(token_amount),
+                                transaction_data=transfer_data(recipient_wallet['address'], token_amount))
+
+        with span('pay.store', payment_id=payment_id):
+            await asyncio.to_thread(payment_store.create, payment_data)
 
         # Payment confirmation URL (adapt URL according to your configuration)
         confirmation_url = f"http://localhost:5173/confirm-payment/{payment_id}"
@@ -658,7 +1913,8 @@ async def pay_command(ctx, recipient: discord.Member = None, amount: float = Non
             value=(
                 f"**From:** {ctx.author.name} (`{sender_wallet['address'][:6]}...{sender_wallet['address'][-4:]}`)\n"
                 f"**To:** {recipient.name} (`{recipient_wallet['address'][:6]}...{recipient_wallet['address'][-4:]}`)\n"
-                f"**Amount:** `{amount} {currency.upper()}`"
+                f"**Amount:** `{amount} {currency.upper()}`\n"
+                f"**Network:** {chain_name}"
             ),
             inline=False
         )
@@ -669,16 +1925,16 @@ async def pay_command(ctx, recipient: discord.Member = None, amount: float = Non
             inline=False
         )
 
-        # Add note for Sepolia
+        # Add note for testnets
         testnet_warning = ""
-        if "Sepolia" in sender_chain or "Sepolia" in recipient_chain:
-            testnet_warning = "\n🚨 **Warning: This is the Sepolia test network.** Funds have no real value."
+        if network_info['testnet']:
+            testnet_warning = f"\n🚨 **Warning: This is the {chain_name} test network.** Funds have no real value."
 
         embed.add_field(
             name="⚠️ Important Information",
             value=(
                 f"This link is personal and must be used by you only.\n"
-                f"The link will expire after 24 hours.\n"
+                f"The link will expire after {PAYMENT_TTL_HOURS} hours.\n"
                 f"**Transaction ID:** `{payment_id}`"
                 f"{testnet_warning}"
             ),
@@ -687,27 +1943,35 @@ async def pay_command(ctx, recipient: discord.Member = None, amount: float = Non
 
         embed.set_footer(text="Thank you for using PayBot for your secure transactions.")
 
-        # Send embed as DM to sender
-        await loading_msg_dm.edit(content="", embed=embed)
-        # Send a short, ephemeral message in the channel
-        await ctx.send(
-            f"✅ {ctx.author.mention}, your payment request has been sent to your private messages. Please check your DMs to confirm the transaction.",
-            ephemeral=True)
+        with span('pay.reply', payment_id=payment_id):
+            # Send embed as DM to sender
+            await reply.send(embed=embed)
+            # Send a short, ephemeral message in the channel
+            await ctx.send(
+                f"✅ {ctx.author.mention}, your payment request has been sent to your private messages. Please check your DMs to confirm the transaction.",
+                ephemeral=True)
+        answered = True
 
     except Exception as e:
-        await loading_msg_dm.edit(content=f"❌ Error processing payment: {str(e)}")
+        await reply.send(content=f"❌ Error processing payment: {str(e)}")
         print(f"❌ Error in pay_command: {e}")
+    finally:
+        # A deferred slash command stays "thinking" until it gets an answer
+        if ctx.interaction and not answered:
+            await ctx.send("📬 Your payment request could not be created, check your private messages for details.",
+                           ephemeral=True)
 
 
 # New command to check payment status
-@bot.command(name='payment')
+@bot.hybrid_command(name='payment')
+@app_commands.describe(payment_id="ID of the payment")
 async def payment_status(ctx, payment_id: str = None):
     """Check payment status"""
     if not payment_id:
         await ctx.send("❌ **Usage:** `$payment <payment_ID>`", ephemeral=True)
         return
 
-    payment = pending_payments.get(payment_id)
+    payment = await asyncio.to_thread(payment_store.get, payment_id)
     if not payment:
         await ctx.send("❌ Payment not found or expired.", ephemeral=True)
         return
@@ -718,7 +1982,7 @@ async def payment_status(ctx, payment_id: str = None):
         return
 
     embed = discord.Embed(
-        title=f"📊 Payment Status",
+        title="📊 Payment Status",
         color=0x00ff00 if payment['status'] == 'completed' else 0xffaa00,
         timestamp=datetime.now()
     )
@@ -735,8 +1999,406 @@ async def payment_status(ctx, payment_id: str = None):
     await ctx.send(embed=embed, ephemeral=True)  # Made this response ephemeral too
 
 
+def build_payment_received_embed(payment):
+    """Embed DMed to the recipient once a payment is completed"""
+    transaction_hash = payment.get('transaction_hash') or "N/A"
+    embed = discord.Embed(
+        title="🎉 You received money!",  # New title
+        description=(f"{payment['sender_name']} sent you **{payment['amount']} {payment['currency']}** "
+                     f"to your wallet `{payment['recipient_wallet'][:10]}...{payment['recipient_wallet'][-8:]}` !"),
+        # New description
+        color=0x00ff00,
+        timestamp=datetime.now()
+    )
+
+    embed.add_field(
+        name="🆔 Payment ID",
+        value=f"`{payment['id']}`",
+        inline=True
+    )
+    if transaction_hash != "N/A":
+        embed.add_field(
+            name="🔗 Transaction Hash",
+            value=f"`{transaction_hash}`",
+            inline=False
+        )
+        # Explorer of the payment's network
+        network_info = NETWORKS.get(payment_network(payment))
+
+        if network_info and network_info.get('explorer'):
+            embed.add_field(
+                name="🌐 View on Explorer",
+                value=f"[Click here]({network_info['explorer']}/tx/{transaction_hash})",
+                inline=False
+            )
+
+    embed.set_footer(text="Congratulations!")
+    return embed
+
+
+def build_payment_failed_embed(payment):
+    """Embed DMed to the sender when the on-chain transaction doesn't settle the payment"""
+    embed = discord.Embed(
+        title="⚠️ Your payment could not be verified",
+        description=(f"Your payment of **{payment['amount']} {payment['currency']}** to "
+                     f"{payment['recipient_name']} was not settled on-chain."),
+        color=0xff0000,
+        timestamp=datetime.now()
+    )
+    embed.add_field(name="🆔 Payment ID", value=f"`{payment['id']}`", inline=True)
+    embed.add_field(name="❓ Reason", value=payment.get('failure_reason', 'Unknown'), inline=True)
+    if payment.get('transaction_hash'):
+        embed.add_field(name="🔗 Transaction Hash", value=f"`{payment['transaction_hash']}`", inline=False)
+    return embed
+
+
+class PaymentNotifier:
+    """
+    Delivers payment events queued in the store (e.g. a confirmation from the web API)
+    as Discord DMs. The API pings a small HTTP server in the bot when a payment changes,
+    so subscribers (the receipt watcher) check it and delivery happens right away;
+    a periodic poll and a replay at startup pick up anything missed.
+    Each event is claimed before delivery so it is only sent once.
+    """
+
+    def __init__(self, store, poll_interval=10, lease=60):
+        self.store = store
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.runner = None
+        self.subscribers = []
+
+    def subscribe(self, callback):
+        """Call callback(payment_id) as a task when the API reports a change to a payment"""
+        if callback not in self.subscribers:
+            self.subscribers.append(callback)
+
+    async def deliver(self, event):
+        """Deliver one event, return (status, recipient user)"""
+        if not await asyncio.to_thread(self.store.claim_event, event['id'], lease=self.lease):
+            return 'skipped', None  # Already delivered or being delivered elsewhere
+
+        payment = await asyncio.to_thread(self.store.get, event['payment_id'])
+        if payment is None:
+            await asyncio.to_thread(self.store.complete_event, event['id'], error='payment not found')
+            return 'not_found', None
+
+        # Completed payments notify the recipient, failed ones the sender
+        if event['type'] == 'payment_failed':
+            recipient_id, embed = payment['sender_id'], build_payment_failed_embed(payment)
+        else:
+            recipient_id, embed = payment['recipient_id'], build_payment_received_embed(payment)
+
+        # Get Discord recipient
+        recipient_discord_user = bot.get_user(recipient_id)  # Try to get user object
+
+        try:
+            if not recipient_discord_user:  # If not in cache, try to fetch
+                recipient_discord_user = await bot.fetch_user(recipient_id)
+        except discord.NotFound:
+            print(f"❌ Discord recipient {recipient_id} not found for payment {payment['id']}")
+            await asyncio.to_thread(self.store.complete_event, event['id'], error='recipient not found')
+            return 'not_found', None
+        except Exception as e:
+            print(f"❌ Error fetching recipient {recipient_id}: {e}")
+            await asyncio.to_thread(self.store.release_event, event['id'])
+            return 'error', None
+
+        # Send DM to recipient
+        try:
+            await recipient_discord_user.send(embed=embed)
+        except discord.Forbidden:
+            await asyncio.to_thread(self.store.complete_event, event['id'], error='DMs disabled')
+            return 'forbidden', recipient_discord_user
+        except Exception as e:
+            print(f"❌ Error sending payment confirmation DM: {e}")
+            await asyncio.to_thread(self.store.release_event, event['id'])
+            return 'error', recipient_discord_user
+
+        await asyncio.to_thread(self.store.complete_event, event['id'])
+        print(f"✅ Payment {payment['id']} notification sent to {recipient_discord_user}")
+        return 'sent', recipient_discord_user
+
+    async def process_pending(self):
+        """Deliver every undelivered event (also replays the backlog after a restart)"""
+        while True:
+            events = await asyncio.to_thread(self.store.pending_events, lease=self.lease)
+            for event in events:
+                await self.deliver(event)
+            if len(events) < 100:
+                return
+
+    async def loop(self):
+        while True:
+            try:
+                await self.process_pending()
+            except Exception as e:
+                print(f"❌ Payment event processing error: {e}")
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+
+    async def handle_event_ping(self, request):
+        """POST /payment-events: sent by the payment API after a state change ({'payment_id'})"""
+        try:
+            data = await request.json()
+        except ValueError:
+            data = None
+        payment_id = data.get('payment_id') if isinstance(data, dict) else None
+        if payment_id:
+            for callback in self.subscribers:
+                asyncio.create_task(callback(str(payment_id)))
+        self.wakeup.set()
+        return web.json_response({'queued': True}, status=202)
+
+    async def start(self, host='127.0.0.1', port=5001):
+        """Start the delivery task and the local HTTP server (once)"""
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.loop())
+        if self.runner is None:
+            app = web.Application()
+            app.router.add_post('/payment-events', self.handle_event_ping)
+            self.runner = web.AppRunner(app)
+            await self.runner.setup()
+            try:
+                await web.TCPSite(self.runner, host, port).start()
+                print(f"📡 Payment event listener on http://{host}:{port}/payment-events")
+            except OSError as e:
+                # Events are still delivered by polling
+                print(f"⚠️ Unable to start payment event listener on port {port}: {e}")
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+        if self.runner:
+            await self.runner.cleanup()
+
+
+payment_notifier = PaymentNotifier(payment_store, poll_interval=config.get('payment_event_poll_interval', 10))
+
+
+class MetricsServer:
+    """
+    Serves this process's metrics on /metrics (Prometheus text format). Every bot process
+    runs one, on its own port, so shard groups that aren't primary can be scraped too.
+    """
+
+    def __init__(self):
+        self.runner = None
+
+    async def handle_metrics(self, request):
+        """GET /metrics: Prometheus text format (rendered in a worker thread: collectors query SQLite)"""
+        body = await asyncio.to_thread(REGISTRY.render)
+        return web.Response(body=body.encode(), headers={'Content-Type': CONTENT_TYPE})
+
+    async def start(self, host='127.0.0.1', port=9100):
+        """Start the HTTP server (once)"""
+        if self.runner is not None:
+            return
+        app = web.Application()
+        app.router.add_get('/metrics', self.handle_metrics)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        try:
+            await web.TCPSite(self.runner, host, port).start()
+            print(f"📊 Metrics on http://{host}:{port}/metrics")
+        except OSError as e:
+            print(f"⚠️ Unable to start metrics server on port {port}: {e}")
+
+    async def close(self):
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+
+
+# Shard group processes get consecutive ports from run_shard_processes
+METRICS_PORT = int(os.environ.get('PAYBOT_METRICS_PORT') or config.get('metrics_port', 9100))
+metrics_server = MetricsServer()
+
+
+def to_wei(amount):
+    """ETH amount (as stored on a payment) to wei, without float rounding"""
+    return int(Decimal(str(amount)) * 10 ** 18)
+
+
+class ReceiptWatcher:
+    """
+    Settles submitted payments from on-chain receipts.
+    On every new block of a network, the receipts (and transactions, for payments not yet
+    verified) of all in-flight payments are fetched in one JSON-RPC batch. Payments move:
+    submitted -> confirmed (mined, matches sender/recipient/amount) -> completed (final),
+    or to failed (reverted, mismatching or never mined). A confirmed payment whose receipt
+    disappears or moves to another block is marked reorged and watched again.
+    """
+
+    WATCHED_STATUSES = ['submitted', 'confirmed', 'reorged']
+
+    def __init__(self, manager, store, submit_timeout=3600):
+        self.manager = manager
+        self.store = store
+        self.submit_timeout = submit_timeout
+        self.locks = {}
+        self.tracker = None
+
+    async def unwatchable(self, payment):
+        """Fail a payment whose network isn't configured: nothing would ever settle it"""
+        network = payment_network(payment)
+        if network in NETWORKS:
+            return False
+        await self.settle(payment, payment['status'], 'failed',
+                          {'failure_reason': f"Network {network} is not configured"}, event_type='payment_failed')
+        return True
+
+    def watched(self):
+        """Payments waiting for on-chain settlement, by network key (blocking: run in a thread)"""
+        by_network = {}
+        for payment in self.store.iter_payments(status=self.WATCHED_STATUSES):
+            if payment.get('transaction_hash'):
+                by_network.setdefault(payment_network(payment), []).append(payment)
+        return by_network
+
+    async def in_flight(self, network):
+        """Payments of a network waiting for on-chain settlement (failing those of unconfigured networks)"""
+        by_network = await asyncio.to_thread(self.watched)
+        for payment in [payment for key, payments in by_network.items() if key not in NETWORKS
+                        for payment in payments]:
+            await self.unwatchable(payment)
+        return by_network.get(network, [])
+
+    async def settle(self, payment, from_status, to_status, fields=None, event_type=None):
+        updated_payment, updated = await asyncio.to_thread(self.store.transition, payment['id'], [from_status],
+                                                           to_status, fields, event_type=event_type)
+        if updated:
+            print(f"🔗 Payment {payment['id']}: {from_status} -> {to_status}")
+            if event_type:
+                payment_notifier.wakeup.set()
+        return updated
+
+    @staticmethod
+    def verify(payment, tx, receipt):
+        """Reason why a transaction doesn't settle the payment, or None if it does"""
+        if (tx.get('from') or '').lower() != payment['sender_wallet'].lower():
+            return 'Sent from another wallet'
+        if payment.get('token_address'):
+            # Token payment: a transfer to the recipient logged by the token contract
+            if (tx.get('to') or '').lower() != payment['token_address']:
+                return 'Sent to another contract'
+            sent = transferred_amount(receipt, payment['token_address'], payment['sender_wallet'],
+                                      payment['recipient_wallet'])
+            if sent != int(payment['token_amount']):
+                return 'Amount does not match'
+            return None
+        if (tx.get('to') or '').lower() != payment['recipient_wallet'].lower():
+            return 'Sent to another wallet'
+        expected = int(payment['amount_wei']) if payment.get('amount_wei') else to_wei(payment['amount'])
+        if int(tx.get('value', '0x0'), 16) != expected:
+            return 'Amount does not match'
+        return None
+
+    async def check(self, network, head, payments=None):
+        """Check every in-flight payment of a network (or only payments) against the chain head"""
+        if payments is None:
+            payments = await self.in_flight(network)
+        if not payments:
+            return
+
+        # One batch: every receipt, plus the transaction itself for payments not verified yet
+        unverified = [payment for payment in payments if payment['status'] != 'confirmed']
+        results = await self.manager.batch_call(
+            network,
+            [('eth_getTransactionReceipt', [payment['transaction_hash']]) for payment in payments] +
+            [('eth_getTransactionByHash', [payment['transaction_hash']]) for payment in unverified],
+            priority=PRIORITY_PAYMENT
+        )
+        receipts = dict(zip([payment['id'] for payment in payments], results[:len(payments)]))
+        transactions = dict(zip([payment['id'] for payment in unverified], results[len(payments):]))
+        required = NETWORKS[network].get('confirmations', 1)
+
+        for payment in payments:
+            receipt, status = receipts[payment['id']], payment['status']
+            if isinstance(receipt, RPCError):
+                continue
+
+            if receipt is None:
+                if status == 'confirmed':
+                    # The block that included it is no longer canonical
+                    await self.settle(payment, status, 'reorged', {'reorg_count': payment.get('reorg_count', 0) + 1})
+                elif time.time() - (parse_timestamp(payment.get('submitted_at')) or time.time()) > self.submit_timeout:
+                    await self.settle(payment, status, 'failed', {'failure_reason': 'Transaction not found on-chain'},
+                                      event_type='payment_failed')
+                continue
+
+            if status == 'confirmed' and receipt['blockHash'] != payment.get('receipt_block_hash'):
+                await self.settle(payment, status, 'reorged', {'reorg_count': payment.get('reorg_count', 0) + 1})
+                continue
+
+            if status != 'confirmed':
+                if receipt.get('status') == '0x0':
+                    await self.settle(payment, status, 'failed', {'failure_reason': 'Transaction reverted'},
+                                      event_type='payment_failed')
+                    continue
+                tx = transactions.get(payment['id'])
+                if tx is None or isinstance(tx, RPCError):
+                    continue
+                reason = self.verify(payment, tx, receipt)
+                if reason:
+                    await self.settle(payment, status, 'failed', {'failure_reason': reason},
+                                      event_type='payment_failed')
+                    continue
+
+            block_number = int(receipt['blockNumber'], 16)
+            fields = {'receipt_block': block_number, 'receipt_block_hash': receipt['blockHash']}
+            if head - block_number + 1 >= required:
+                await self.settle(payment, status, 'completed', dict(fields, settled_at=datetime.now().isoformat()),
+                                  event_type='payment_completed')
+            elif status != 'confirmed':
+                await self.settle(payment, status, 'confirmed', fields)
+
+    async def on_new_head(self, network, head):
+        """Head tracker callback: check in-flight payments once per new block"""
+        lock = self.locks.setdefault(network, asyncio.Lock())
+        if lock.locked():
+            return  # The previous block's check is still running; the next block catches up
+        async with lock:
+            try:
+                await self.check(network, head['block_number'])
+            except Exception as e:
+                print(f"❌ Receipt watcher error on {network}: {e}")
+
+    async def check_payment(self, payment_id):
+        """Check one payment right away (the API reported its transaction), without waiting for a block"""
+        payment = await asyncio.to_thread(self.store.get, payment_id)
+        if (payment is None or payment['status'] not in self.WATCHED_STATUSES or
+                not payment.get('transaction_hash') or await self.unwatchable(payment)):
+            return
+        network = payment_network(payment)
+        head = self.tracker.get(network) if self.tracker else None
+        if head is None:
+            return  # No head yet: the first block checks it
+        async with self.locks.setdefault(network, asyncio.Lock()):
+            try:
+                await self.check(network, head['block_number'], [payment])
+            except Exception as e:
+                print(f"❌ Receipt watcher error on {network}: {e}")
+
+    def start(self, tracker, notifier=None):
+        """Check in-flight payments on every new block seen by the tracker, and when the API reports one"""
+        self.tracker = tracker
+        tracker.subscribe(self.on_new_head)
+        if notifier:
+            notifier.subscribe(self.check_payment)
+
+
+receipt_watcher = ReceiptWatcher(web3_manager, payment_store,
+                                 submit_timeout=config.get('receipt_submit_timeout', 3600))
+
+
 # NEW COMMAND: To be called by your backend after transaction confirmation
-@bot.command(name='confirm_payment')
+@bot.hybrid_command(name='confirm_payment')
 @commands.is_owner()  # Limit this command to bot owner for security
 async def confirm_payment_command(ctx, payment_id: str = None, transaction_hash: str = "N/A"):
     """
@@ -747,91 +2409,45 @@ async def confirm_payment_command(ctx, payment_id: str = None, transaction_hash:
         await ctx.send("❌ Usage: `$confirm_payment <payment_ID> [transaction_hash]`")
         return
 
-    payment = pending_payments.get(payment_id)
+    if transaction_hash != "N/A":
+        # A real transaction: let the receipt watcher verify it on-chain before completing
+        payment, updated = await asyncio.to_thread(payment_store.transition, payment_id, ['pending'], 'submitted',
+                                                   {'transaction_hash': transaction_hash,
+                                                    'submitted_at': datetime.now().isoformat()})
+        if payment and updated:
+            await ctx.send(f"🔗 Payment `{payment_id}` submitted. It will complete once the transaction is final.")
+            return
+    else:
+        # Update payment status (atomic: only a pending payment can be completed)
+        payment, updated = await asyncio.to_thread(payment_store.transition, payment_id, ['pending'], 'completed',
+                                                   {'transaction_hash': transaction_hash},
+                                                   event_type='payment_completed')
     if not payment:
         await ctx.send(f"❌ Payment with ID `{payment_id}` not found or already processed.")
         return
 
-    if payment['status'] == 'completed':
-        await ctx.send(f"⚠️ Payment `{payment_id}` is already marked as completed.")
+    if not updated:
+        await ctx.send(f"⚠️ Payment `{payment_id}` is already marked as {payment['status']}.")
         return
 
-    # Update payment status
-    payment['status'] = 'completed'
-    payment['transaction_hash'] = transaction_hash
-    save_pending_payments()
-
-    # Get Discord recipient
-    recipient_id = payment['recipient_id']
-    recipient_discord_user = bot.get_user(recipient_id)  # Try to get user object
-
-    if not recipient_discord_user:
-        try:  # If not in cache, try to fetch
-            recipient_discord_user = await bot.fetch_user(recipient_id)
-        except discord.NotFound:
-            print(f"❌ Discord recipient {recipient_id} not found for payment {payment_id}")
+    # Deliver the recipient DM now (same path as confirmations coming from the web API)
+    for event in await asyncio.to_thread(payment_store.pending_events, payment_id=payment_id):
+        status, recipient_discord_user = await payment_notifier.deliver(event)
+
+        if status == 'sent':
+            await ctx.send(
+                f"✅ Payment `{payment_id}` marked as completed. DM sent to {recipient_discord_user.mention}.")
+        elif status == 'forbidden':
+            await ctx.send(
+                f"❌ Unable to send DM to {recipient_discord_user.mention}. They may have DMs disabled.")
+        elif status == 'not_found':
             await ctx.send(f"❌ Discord recipient for payment `{payment_id}` not found.")
-            return
-        except Exception as e:
-            print(f"❌ Error fetching recipient {recipient_id}: {e}")
-            await ctx.send(f"❌ Error retrieving recipient for payment `{payment_id}`.")
-            return
-
-    # Send DM to recipient
-    try:
-        embed = discord.Embed(
-            title="🎉 You received money!",  # New title
-            description=(f"{payment['sender_name']} sent you **{payment['amount']} {payment['currency']}** "
-                         f"to your wallet `{payment['recipient_wallet'][:10]}...{payment['recipient_wallet'][-8:]}` !"),
-            # New description
-            color=0x00ff00,
-            timestamp=datetime.now()
-        )
-
-        embed.add_field(
-            name="🆔 Payment ID",
-            value=f"`{payment_id}`",
-            inline=True
-        )
-        if transaction_hash != "N/A":
-            embed.add_field(
-                name="🔗 Transaction Hash",
-                value=f"`{transaction_hash}`",
-                inline=False
-            )
-            network_info = None
-            # Try to find explorer information for recipient's network
-            for key, info in NETWORKS.items():
-                if info['name'] == payment['recipient_chain']:
-                    network_info = info
-                    break
-
-            if network_info and network_info.get('explorer'):
-                embed.add_field(
-                    name="🌐 View on Explorer",
-                    value=f"[Click here]({network_info['explorer']}/tx/{transaction_hash})",
-                    inline=False
-                )
-
-        embed.set_footer(text="Congratulations!")
-
-        await recipient_discord_user.send(embed=embed)
-        await ctx.send(
-            f"✅ Payment `{payment_id}` marked as completed. DM sent to {recipient_discord_user.mention}.")
-
-    except discord.Forbidden:
-        await ctx.send(
-            f"❌ Unable to send DM to {recipient_discord_user.mention}. They may have DMs disabled.")
-    except Exception as e:
-        await ctx.send(f"❌ Error sending DM to recipient for payment `{payment_id}`: {str(e)}")
-        print(f"❌ Error sending payment confirmation DM: {e}")
+        elif status == 'error':
+            await ctx.send(f"❌ Error sending DM to recipient for payment `{payment_id}`, it will be retried.")
 
 
-# New command to get Sepolia test ETH
-@bot.command(name='faucet')
-async def faucet_command(ctx):
-    """Provides links to Sepolia faucets"""
-
+def build_faucet_embed():
+    """Sepolia faucet links and instructions"""
     embed = discord.Embed(
         title="🚰 Sepolia Testnet Faucets",
         description="Get test ETH for Sepolia",
@@ -865,24 +2481,54 @@ async def faucet_command(ctx):
         inline=False
     )
 
-    await ctx.send(embed=embed)
+    return embed
 
 
-# Load pending payments at startup
-load_pending_payments()
+# New command to get Sepolia test ETH
+@bot.hybrid_command(name='faucet')
+async def faucet_command(ctx):
+    """Provides links to Sepolia faucets"""
+    await ctx.send(embed=embed_cache.get('faucet', None, build_faucet_embed))
+
 
 # Launch the bot
-if __name__ == '__main__':
+def run_shard_processes(processes, shard_count):
+    """Run the shards split into even groups, one bot process per group, until they exit"""
+    groups = [list(range(shard_count))[i::processes] for i in range(processes)]
+    children = []
+    for index, shard_ids in enumerate(groups):
+        env = dict(os.environ, PAYBOT_SHARD_IDS=','.join(map(str, shard_ids)), PAYBOT_SHARD_COUNT=str(shard_count),
+                   PAYBOT_METRICS_PORT=str(METRICS_PORT + index))
+        children.append(subprocess.Popen([sys.executable, os.path.abspath(__file__)], env=env))
+        print(f"🧩 Started shard group {shard_ids} (pid {children[-1].pid})")
     try:
-        print("🚀 Starting bot...")
-        bot.run(config['discord_token'])
-    except discord.errors.LoginFailure:
-        print("❌ Invalid Discord token! Check your token in config.json")
-    except KeyError as e:
-        print(f"❌ Missing key in config.json: {e}")
-        print("📝 Make sure you have: discord_token, privy_app_id, privy_app_secret")
-    except Exception as e:
-        print(f"❌ Unexpected error: {e}")
+        for child in children:
+            child.wait()
+    except KeyboardInterrupt:
+        pass
     finally:
-        # Cleanup
-        asyncio.run(privy_api.close())
\ No newline at end of file
+        for child in children:
+            if child.poll() is None:
+                child.terminate()
+        for child in children:
+            child.wait()
+
+
+if __name__ == '__main__':
+    if SHARD_PROCESSES > 1 and not os.environ.get('PAYBOT_SHARD_IDS'):
+        print(f"🚀 Starting {SHARD_PROCESSES} bot processes...")
+        run_shard_processes(SHARD_PROCESSES, SHARD_COUNT or SHARD_PROCESSES)
+    else:
+        try:
+            print("🚀 Starting bot...")
+            bot.run(config['discord_token'])
+        except discord.errors.LoginFailure:
+            print("❌ Invalid Discord token! Check your token in config.json")
+        except KeyError as e:
+            print(f"❌ Missing key in config.json: {e}")
+            print("📝 Make sure you have: discord_token, privy_app_id, privy_app_secret")
+        except Exception as e:
+            print(f"❌ Unexpected error: {e}")
+        finally:
+            # Cleanup
+            asyncio.run(close_bot())
\ No newline at end of file
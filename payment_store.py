@@ -0,0 +1,426 @@
+import base64
+import json
+import os
+import queue
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+
+COLUMNS = ('id', 'status', 'sender_id', 'recipient_id', 'guild_id', 'created_at', 'updated_at', 'expires_at', 'data')
+INSERT_SQL = f"INSERT INTO payments ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+
+# Statuses that will never change again and can move to the archive
+SETTLED_STATUSES = ('completed', 'expired', 'failed')
+
+TRANSACTION_HASH_PATTERN = re.compile(r'0x[0-9a-fA-F]{64}')
+
+
+def parse_timestamp(value):
+    """ISO 8601 string to unix time (None if missing or invalid)"""
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def payments_db_path(base_dir='', config=None):
+    """
+    Payment database shared by the bot and the payment API: $PAYBOT_PAYMENTS_DB, else
+    config 'payments_db', else pending_payments.db. base_dir is the bot's directory:
+    relative paths and config.json (read when config isn't given) are resolved from it.
+    """
+    if config is None:
+        try:
+            with open(os.path.join(base_dir, 'config.json'), 'r') as f:
+                config = json.load(f)
+        except (OSError, ValueError):
+            config = {}
+    path = os.environ.get('PAYBOT_PAYMENTS_DB') or config.get('payments_db') or 'pending_payments.db'
+    return os.path.join(base_dir, path)
+
+
+class PaymentStore:
+    """
+    Payment storage shared by the bot and the payment API.
+    Backed by SQLite in WAL mode: each write touches a single row, readers never
+    block the writer, and status transitions are atomic across processes.
+    Settled payments are moved to a separate archive database to keep the hot table small.
+    """
+
+    # Fields the web app may set when confirming; everything else stays as the bot created it
+    CONFIRMATION_FIELDS = ('transaction_hash', 'user_id', 'wallet_type', 'executed_via')
+
+    def __init__(self, path='pending_payments.db', legacy_json_path=None, archive_path=None,
+                 payment_ttl=24 * 3600, timeout=30):
+        self.path = path
+        self.timeout = timeout  # Seconds to wait for another process's write lock
+        self.archive_path = archive_path or f"{os.path.splitext(path)[0]}_archive.db"
+        self.payment_ttl = payment_ttl
+        # Connections are reused across requests/threads instead of being reopened
+        self.pool = queue.LifoQueue()
+        self.create_schema()
+        if legacy_json_path:
+            self.migrate_from_json(legacy_json_path)
+
+    def open_connection(self):
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('ATTACH DATABASE ? AS archive', (self.archive_path,))
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled SQLite connection"""
+        try:
+            conn = self.pool.get_nowait()
+        except queue.Empty:
+            conn = self.open_connection()
+        try:
+            yield conn
+        finally:
+            self.pool.put(conn)
+
+    def create_schema(self):
+        with self.connection() as conn:
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS payments (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    sender_id TEXT,
+                    recipient_id TEXT,
+                    guild_id TEXT,
+                    created_at TEXT,
+                    updated_at REAL NOT NULL,
+                    expires_at REAL,
+                    data TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS payments_status ON payments (status, created_at, id);
+                CREATE INDEX IF NOT EXISTS payments_created ON payments (created_at, id);
+                CREATE INDEX IF NOT EXISTS payments_sender ON payments (sender_id, created_at, id);
+                CREATE INDEX IF NOT EXISTS payments_recipient ON payments (recipient_id, created_at, id);
+                CREATE INDEX IF NOT EXISTS payments_guild ON payments (guild_id, created_at, id);
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+                CREATE TABLE IF NOT EXISTS payment_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    payment_id TEXT NOT NULL,
+                    type TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    claimed_at REAL,
+                    delivered_at REAL,
+                    error TEXT
+                );
+                CREATE INDEX IF NOT EXISTS payment_events_undelivered ON payment_events (id)
+                    WHERE delivered_at IS NULL;
+                CREATE TABLE IF NOT EXISTS archive.payments (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    archived_at REAL NOT NULL,
+                    data TEXT NOT NULL
+                );
+            ''')
+            # Databases created before payment expiry have no expires_at column
+            if 'expires_at' not in [row['name'] for row in conn.execute('PRAGMA main.table_info(payments)')]:
+                conn.execute('ALTER TABLE payments ADD COLUMN expires_at REAL')
+            conn.execute('CREATE INDEX IF NOT EXISTS payments_expiry ON payments (status, expires_at)')
+
+    def row_values(self, payment):
+        """Column values for a payment dict"""
+        def text(value):
+            return None if value is None else str(value)
+
+        expires_at = parse_timestamp(payment.get('expires_at'))
+        if expires_at is None:
+            expires_at = (parse_timestamp(payment.get('timestamp')) or time.time()) + self.payment_ttl
+
+        return (payment['id'], payment.get('status', 'pending'), text(payment.get('sender_id')),
+                text(payment.get('recipient_id')), text(payment.get('guild_id')),
+                payment.get('timestamp'), time.time(), expires_at, json.dumps(payment, default=str))
+
+    @staticmethod
+    def increment(conn, key, amount):
+        """Add to a counter kept in the meta table"""
+        conn.execute('INSERT INTO meta VALUES (?, ?) ON CONFLICT(key) '
+                     'DO UPDATE SET value = CAST(value AS INTEGER) + excluded.value', (key, amount))
+
+    def migrate_from_json(self, json_path):
+        """Import payments from the legacy pending_payments.json file (once)"""
+        with self.connection() as conn:
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+                return 0
+            if not os.path.exists(json_path):
+                return 0
+
+            try:
+                with open(json_path, 'r') as f:
+                    payments = json.load(f)
+            except Exception as e:
+                print(f"❌ Error reading {json_path} for migration: {e}")
+                return 0
+
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Another process may have migrated while we were reading the file
+                if conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+                    conn.execute('ROLLBACK')
+                    return 0
+                conn.executemany(INSERT_SQL.replace('INSERT', 'INSERT OR IGNORE', 1),
+                                 [self.row_values(dict(payment, id=payment_id))
+                                  for payment_id, payment in payments.items()])
+                conn.execute("INSERT INTO meta VALUES ('json_migrated', ?)", (str(time.time()),))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+        print(f"✅ Migrated {len(payments)} payment(s) from {json_path}")
+        return len(payments)
+
+    def get(self, payment_id):
+        """Return a payment dict (looking in the archive too), or None if it doesn't exist"""
+        with self.connection() as conn:
+            row = conn.execute('SELECT data FROM main.payments WHERE id = ?', (payment_id,)).fetchone()
+            if row is None:
+                row = conn.execute('SELECT data FROM archive.payments WHERE id = ?', (payment_id,)).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def create(self, payment):
+        """Insert a new payment"""
+        with self.connection() as conn:
+            conn.execute(INSERT_SQL, self.row_values(payment))
+        return payment
+
+    def create_many(self, payments):
+        """Insert several payments in one transaction"""
+        with self.connection() as conn:
+            conn.execute('BEGIN')
+            try:
+                conn.executemany(INSERT_SQL, [self.row_values(payment) for payment in payments])
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+    def transition(self, payment_id, from_statuses, to_status, fields=None, event_type=None):
+        """
+        Atomically move a payment from one of from_statuses to to_status, merging fields.
+        If event_type is given, an event is queued for the bot in the same transaction.
+        Returns (payment, True) on success, (payment, False) if its status didn't allow
+        the transition, and (None, False) if it doesn't exist.
+        """
+        with self.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute('SELECT data FROM payments WHERE id = ?', (payment_id,)).fetchone()
+                if row is None:
+                    conn.execute('ROLLBACK')
+                    return None, False
+
+                payment = json.loads(row['data'])
+                if payment.get('status') not in from_statuses:
+                    conn.execute('ROLLBACK')
+                    return payment, False
+
+                payment.update(fields or {})
+                payment['status'] = to_status
+                conn.execute('UPDATE payments SET status = ?, updated_at = ?, data = ? WHERE id = ?',
+                             (to_status, time.time(), json.dumps(payment, default=str), payment_id))
+                if event_type:
+                    conn.execute('INSERT INTO payment_events (payment_id, type, created_at) VALUES (?, ?, ?)',
+                                 (payment_id, event_type, time.time()))
+                conn.execute('COMMIT')
+                return payment, True
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+    def confirm(self, payment_id, data=None):
+        """
+        Confirmation from the web app: the payment becomes 'submitted' and the bot verifies
+        its transaction_hash on-chain before completing it. Only CONFIRMATION_FIELDS are
+        taken from data, so a client can't rewrite what the transaction is checked against.
+        Raises ValueError without a valid transaction_hash. Returns the result of transition().
+        """
+        fields = {key: value for key, value in (data or {}).items() if key in self.CONFIRMATION_FIELDS}
+        transaction_hash = fields.get('transaction_hash')
+        if not isinstance(transaction_hash, str) or not TRANSACTION_HASH_PATTERN.fullmatch(transaction_hash):
+            raise ValueError("A valid transaction_hash is required")
+        now = datetime.now().isoformat()
+        fields.update(confirmed_at=now, submitted_at=now)
+        return self.transition(payment_id, ['pending'], 'submitted', fields)
+
+    @staticmethod
+    def encode_cursor(created_at, payment_id):
+        return base64.urlsafe_b64encode(json.dumps([created_at, payment_id]).encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """Decode a pagination cursor, raising ValueError if it is malformed"""
+        try:
+            created_at, payment_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return created_at, payment_id
+        except Exception:
+            raise ValueError(f"Invalid cursor: {cursor}")
+
+    def query(self, status=None, sender_id=None, recipient_id=None, guild_id=None,
+              since=None, until=None, cursor=None, limit=100):
+        """
+        One page of payments, oldest first, matching the given filters.
+        status may be a single status or a list of statuses.
+        since/until bound the creation timestamp (ISO format, until exclusive).
+        Returns (payments, next_cursor); next_cursor is None on the last page.
+        """
+        clauses, params = [], []
+        for column, value in (('status', status), ('sender_id', sender_id),
+                              ('recipient_id', recipient_id), ('guild_id', guild_id)):
+            if isinstance(value, (list, tuple)):
+                clauses.append(f"{column} IN ({', '.join('?' * len(value))})")
+                params.extend(str(item) for item in value)
+            elif value is not None:
+                clauses.append(f'{column} = ?')
+                params.append(str(value))
+        if since:
+            clauses.append('created_at >= ?')
+            params.append(since)
+        if until:
+            clauses.append('created_at < ?')
+            params.append(until)
+        if cursor:
+            # Keyset pagination: resume strictly after the last row of the previous page
+            clauses.append('(created_at, id) > (?, ?)')
+            params.extend(self.decode_cursor(cursor))
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        with self.connection() as conn:
+            rows = conn.execute(f'SELECT id, created_at, data FROM payments {where} '
+                                f'ORDER BY created_at, id LIMIT ?', params + [limit + 1]).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = self.encode_cursor(rows[-1]['created_at'], rows[-1]['id'])
+        return [json.loads(row['data']) for row in rows], next_cursor
+
+    def iter_payments(self, batch_size=500, **filters):
+        """Yield every payment matching the filters, one page in memory at a time"""
+        cursor = None
+        while True:
+            payments, cursor = self.query(cursor=cursor, limit=batch_size, **filters)
+            yield from payments
+            if cursor is None:
+                return
+
+    def next_expiry(self):
+        """Unix time at which the oldest pending payment expires, or None"""
+        with self.connection() as conn:
+            row = conn.execute("SELECT MIN(expires_at) AS next FROM payments WHERE status = 'pending'").fetchone()
+        return row['next']
+
+    def expire_due(self, now=None, limit=500):
+        """Mark pending payments past their expiry as expired, return their IDs"""
+        now = now or time.time()
+        with self.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Walks payments_expiry in order: only the rows that are due are read
+                rows = conn.execute("SELECT id, data FROM payments WHERE status = 'pending' AND expires_at <= ? "
+                                    "ORDER BY expires_at LIMIT ?", (now, limit)).fetchall()
+                updates = []
+                for row in rows:
+                    payment = json.loads(row['data'])
+                    payment['status'] = 'expired'
+                    updates.append(('expired', now, json.dumps(payment, default=str), row['id']))
+                conn.executemany('UPDATE payments SET status = ?, updated_at = ?, data = ? WHERE id = ?', updates)
+                if updates:
+                    self.increment(conn, 'expired_total', len(updates))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return [row['id'] for row in rows]
+
+    def archive_settled(self, older_than, limit=1000):
+        """Move payments settled more than older_than seconds ago to the archive database"""
+        cutoff = time.time() - older_than
+        placeholders = ', '.join('?' * len(SETTLED_STATUSES))
+        with self.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                ids = [row['id'] for row in conn.execute(
+                    f'SELECT id FROM payments WHERE status IN ({placeholders}) AND updated_at < ? LIMIT ?',
+                    SETTLED_STATUSES + (cutoff, limit))]
+                id_list = ', '.join('?' * len(ids))
+                if ids:
+                    conn.execute(f'INSERT OR REPLACE INTO archive.payments SELECT id, status, ?, data '
+                                 f'FROM main.payments WHERE id IN ({id_list})', [time.time()] + ids)
+                    conn.execute(f'DELETE FROM main.payments WHERE id IN ({id_list})', ids)
+                    self.increment(conn, 'archived_total', len(ids))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return len(ids)
+
+    def pending_events(self, payment_id=None, limit=100, lease=60):
+        """Undelivered events that nobody is currently working on, oldest first"""
+        query = ('SELECT id, payment_id, type, created_at FROM payment_events '
+                 'WHERE delivered_at IS NULL AND (claimed_at IS NULL OR claimed_at < ?)')
+        params = [time.time() - lease]
+        if payment_id is not None:
+            query += ' AND payment_id = ?'
+            params.append(payment_id)
+        with self.connection() as conn:
+            rows = conn.execute(query + ' ORDER BY id LIMIT ?', params + [limit]).fetchall()
+        return [dict(row) for row in rows]
+
+    def claim_event(self, event_id, lease=60):
+        """
+        Take an event for delivery. Returns False if it was already delivered or is
+        claimed by another consumer whose lease hasn't run out.
+        """
+        now = time.time()
+        with self.connection() as conn:
+            cursor = conn.execute('UPDATE payment_events SET claimed_at = ? WHERE id = ? AND delivered_at IS NULL '
+                                  'AND (claimed_at IS NULL OR claimed_at < ?)', (now, event_id, now - lease))
+        return cursor.rowcount == 1
+
+    def complete_event(self, event_id, error=None):
+        """Mark a claimed event as delivered (error records a permanent failure)"""
+        with self.connection() as conn:
+            conn.execute('UPDATE payment_events SET delivered_at = ?, error = ? WHERE id = ?',
+                         (time.time(), error, event_id))
+
+    def release_event(self, event_id):
+        """Give a claimed event back so it is retried"""
+        with self.connection() as conn:
+            conn.execute('UPDATE payment_events SET claimed_at = NULL WHERE id = ? AND delivered_at IS NULL',
+                         (event_id,))
+
+    def stats(self):
+        """Hot set size per status plus cumulative expiry/archive counters"""
+        with self.connection() as conn:
+            by_status = {row['status']: row['count'] for row in
+                         conn.execute('SELECT status, COUNT(*) AS count FROM payments GROUP BY status')}
+            counters = {row['key']: int(row['value']) for row in
+                        conn.execute("SELECT key, value FROM meta WHERE key IN ('expired_total', 'archived_total')")}
+        return {
+            'hot_payments': sum(by_status.values()),
+            'hot_by_status': by_status,
+            'expired_total': counters.get('expired_total', 0),
+            'archived_total': counters.get('archived_total', 0)
+        }
+
+    def close(self):
+        """Close every pooled connection"""
+        while True:
+            try:
+                self.pool.get_nowait().close()
+            except queue.Empty:
+                return
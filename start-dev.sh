@@ -12,11 +12,8 @@ cleanup() {
 # Trap pour nettoyer à la fermeture
 trap cleanup SIGINT SIGTERM
 
-# Créer un fichier de paiements vide si nécessaire
-if [ ! -f "pending_payments.json" ]; then
-    echo "{}" > pending_payments.json
-    echo "✅ Fichier pending_payments.json créé"
-fi
+# Les paiements sont stockés dans pending_payments.db (créée automatiquement,
+# un ancien pending_payments.json est importé au premier lancement)
 
 # Démarrer l'API Python en arrière-plan
 echo "🔄 Démarrage de l'API Python (port 5000)..."
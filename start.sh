@@ -2,6 +2,12 @@
 
 echo "🚀 Démarrage du PayBot Stack..."
 
+# Mode production (./start.sh --prod): API ASGI multi-workers au lieu du serveur Flask de debug
+MODE="dev"
+if [ "$1" = "--prod" ]; then
+    MODE="prod"
+fi
+
 # Couleurs pour les logs
 RED='\033[0;31m'
 GREEN='\033[0;32m'
@@ -44,11 +50,9 @@ if [ ! -d "webapp/node_modules" ]; then
     cd webapp && npm install && cd ..
 fi
 
-# Créer un fichier de paiements vide si nécessaire
-if [ ! -f "pending_payments.json" ]; then
-    echo "{}" > pending_payments.json
-    echo -e "${GREEN}✅ Fichier pending_payments.json créé${NC}"
-fi
+# Les paiements sont stockés dans pending_payments.db (créée automatiquement,
+# un ancien pending_payments.json est importé au premier lancement). Le bot et l'API
+# lisent le même réglage: PAYBOT_PAYMENTS_DB ou "payments_db" dans config.json
 
 # Vérifier le fichier de config
 if [ ! -f "config.json" ]; then
@@ -65,9 +69,14 @@ fi
 echo -e "${GREEN}✅ Toutes les dépendances sont prêtes${NC}"
 
 # Démarrer l'API Python
-echo -e "${YELLOW}🔄 Démarrage de l'API Python (port 5000)...${NC}"
 cd webapp
-python payment-api.py &
+if [ "$MODE" = "prod" ]; then
+    echo -e "${YELLOW}🔄 Démarrage de l'API Python en production (ASGI, port 5000)...${NC}"
+    python payment_asgi.py &
+else
+    echo -e "${YELLOW}🔄 Démarrage de l'API Python (port 5000)...${NC}"
+    python payment-api.py &
+fi
 API_PID=$!
 cd ..
 
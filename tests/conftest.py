@@ -0,0 +1,31 @@
+import json
+import os
+import sys
+
+import pytest
+
+# The bot's modules live at the project root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+
+@pytest.fixture(scope='session')
+def main_module(tmp_path_factory):
+    """main.py imported with a throwaway config.json and databases (no Discord or network access)"""
+    pytest.importorskip('discord')
+    workdir = tmp_path_factory.mktemp('bot')
+    config = {
+        'discord_token': 'test',
+        'privy_app_id': 'test',
+        'privy_app_secret': 'test',
+        'payments_db': str(workdir / 'pending_payments.db'),
+        'wallets_db': str(workdir / 'wallets.db'),
+        'token_metadata_cache': str(workdir / 'token_metadata.json'),
+    }
+    (workdir / 'config.json').write_text(json.dumps(config))
+    cwd = os.getcwd()
+    os.chdir(workdir)  # main.py reads config.json from the working directory
+    try:
+        import main
+    finally:
+        os.chdir(cwd)
+    return main
@@ -0,0 +1,73 @@
+import asyncio
+
+
+class FakeTracker:
+    def __init__(self, block_number):
+        self.head = {'block_number': block_number}
+
+    def get(self, network):
+        return self.head
+
+
+class FakeManager:
+    def __init__(self):
+        self.calls = []
+
+    async def get_balances(self, network, addresses, hedge=False, priority=None):
+        self.calls.append(list(addresses))
+        return {address: 10 ** 18 for address in addresses}
+
+
+class FakeTokens:
+    def __init__(self):
+        self.calls = []
+
+    async def get_balances(self, network, addresses=(), priority=None):
+        self.calls.append(list(addresses))
+        return {address: {'USDC': 5} for address in addresses}
+
+
+def make_cache(main, block_number=100):
+    manager, tokens = FakeManager(), FakeTokens()
+    return main.BalanceCache(manager, FakeTracker(block_number), tokens), manager, tokens
+
+
+def test_token_balances_are_served_from_memory_at_the_same_head(main_module):
+    cache, manager, tokens = make_cache(main_module)
+
+    async def scenario():
+        for _ in range(3):
+            assert await cache.get_token_balances('sepolia', ['0xa', '0xb']) == {'0xa': {'USDC': 5},
+                                                                                 '0xb': {'USDC': 5}}
+            assert await cache.get_balances('sepolia', ['0xa']) == {'0xa': 10 ** 18}
+
+    asyncio.run(scenario())
+    assert tokens.calls == [['0xa', '0xb']]
+    assert manager.calls == [['0xa']]
+
+
+def test_new_head_refreshes_tokens_in_one_call(main_module):
+    cache, manager, tokens = make_cache(main_module)
+
+    async def scenario():
+        await cache.get_token_balances('sepolia', ['0xa', '0xb'])
+        await cache.get_balances('sepolia', ['0xa'])
+        cache.tracker.head = {'block_number': 101}
+        await cache.on_new_head('sepolia', cache.tracker.head)
+        # Refreshed in bulk: reads at the new head don't go to the node
+        await cache.get_token_balances('sepolia', ['0xa', '0xb'])
+        await cache.get_balances('sepolia', ['0xa'])
+
+    asyncio.run(scenario())
+    assert [sorted(call) for call in tokens.calls] == [['0xa', '0xb'], ['0xa', '0xb']]
+    assert manager.calls == [['0xa'], ['0xa']]
+
+
+def test_networks_without_tokens_skip_the_multicall(main_module):
+    cache, _, tokens = make_cache(main_module)
+    main_module.NETWORKS['sepolia']['tokens'], saved = {}, main_module.NETWORKS['sepolia']['tokens']
+    try:
+        assert asyncio.run(cache.get_token_balances('sepolia', ['0xa'])) == {}
+    finally:
+        main_module.NETWORKS['sepolia']['tokens'] = saved
+    assert tokens.calls == []
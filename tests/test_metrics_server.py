@@ -0,0 +1,47 @@
+import asyncio
+
+import aiohttp
+
+from test_rpc_failover import unused_port
+
+
+def test_metrics_server_serves_registry(main_module):
+    async def scenario():
+        server = main_module.MetricsServer()
+        port = unused_port()
+        await server.start(port=port)
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f'http://127.0.0.1:{port}/metrics') as response:
+                    body = await response.text()
+                    assert response.status == 200
+                    assert response.headers['Content-Type'].startswith('text/plain')
+                # The payment event listener is a separate server
+                async with session.post(f'http://127.0.0.1:{port}/payment-events') as response:
+                    assert response.status in (404, 405)
+        finally:
+            await server.close()
+        return body
+
+    body = asyncio.run(scenario())
+    assert '# TYPE paybot_command_seconds histogram' in body
+
+
+def test_expiry_metrics_exported(main_module):
+    rendered = main_module.REGISTRY.render()
+    assert 'paybot_payments_expired_total 0' in rendered
+    assert 'paybot_payments_archived_total 0' in rendered
+    assert '# TYPE paybot_payments_hot gauge' in rendered
+
+
+def test_payment_stats_are_read_once_per_scrape(main_module, monkeypatch):
+    calls = []
+    stats = main_module.payment_store.stats
+
+    def counted():
+        calls.append(1)
+        return stats()
+
+    monkeypatch.setattr(main_module.payment_store, 'stats', counted)
+    main_module.REGISTRY.render()
+    assert len(calls) == 1
@@ -0,0 +1,52 @@
+import pytest
+
+from payment_store import PaymentStore, payments_db_path
+
+TRANSACTION_HASH = '0x' + 'ab' * 32
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = PaymentStore(str(tmp_path / 'payments.db'))
+    store.create({'id': 'p1', 'status': 'pending', 'amount': 1, 'amount_wei': str(10 ** 18),
+                  'sender_wallet': '0x' + '11' * 20, 'recipient_wallet': '0x' + '22' * 20,
+                  'sender_id': 1, 'recipient_id': 2, 'guild_id': 3, 'timestamp': '2026-01-01T00:00:00'})
+    yield store
+    store.close()
+
+
+def test_confirm_requires_transaction_hash(store):
+    for data in ({}, {'transaction_hash': 'N/A'}, {'transaction_hash': 42}):
+        with pytest.raises(ValueError):
+            store.confirm('p1', data)
+    assert store.get('p1')['status'] == 'pending'
+
+
+def test_confirm_only_takes_whitelisted_fields(store):
+    payment, updated = store.confirm('p1', {'transaction_hash': TRANSACTION_HASH, 'wallet_type': 'privy',
+                                            'amount': 0.0001, 'amount_wei': '1', 'recipient_wallet': '0xattacker',
+                                            'status': 'completed', 'id': 'p2'})
+    assert updated
+    assert payment['status'] == 'submitted'
+    assert payment['transaction_hash'] == TRANSACTION_HASH
+    assert payment['wallet_type'] == 'privy'
+    assert (payment['amount'], payment['amount_wei'], payment['recipient_wallet']) == (1, str(10 ** 18),
+                                                                                      '0x' + '22' * 20)
+    assert store.get('p1') == payment
+
+
+def test_confirm_only_once(store):
+    store.confirm('p1', {'transaction_hash': TRANSACTION_HASH})
+    payment, updated = store.confirm('p1', {'transaction_hash': TRANSACTION_HASH})
+    assert not updated and payment['status'] == 'submitted'
+
+
+def test_payments_db_path(tmp_path, monkeypatch):
+    monkeypatch.delenv('PAYBOT_PAYMENTS_DB', raising=False)
+    assert payments_db_path(str(tmp_path)) == str(tmp_path / 'pending_payments.db')
+    (tmp_path / 'config.json').write_text('{"payments_db": "data/payments.db"}')
+    # The API runs from webapp/ and resolves the bot's setting from the parent directory
+    assert payments_db_path(str(tmp_path)) == str(tmp_path / 'data' / 'payments.db')
+    assert payments_db_path(config={'payments_db': '/srv/payments.db'}) == '/srv/payments.db'
+    monkeypatch.setenv('PAYBOT_PAYMENTS_DB', '/var/lib/paybot/payments.db')
+    assert payments_db_path(str(tmp_path)) == '/var/lib/paybot/payments.db'
@@ -0,0 +1,135 @@
+import asyncio
+import time
+
+from aiohttp import web
+
+from test_rpc_failover import unused_port
+
+USER = {'id': 'did:privy:1', 'linked_accounts': [{'type': 'discord_oauth', 'subject': '42'}]}
+
+
+def test_entries_expire_without_sync(main_module):
+    cache = main_module.PrivyUserCache(ttl=0.05)
+    cache.put('42', USER)
+    assert cache.get('42') == USER
+    time.sleep(0.1)
+    assert cache.get('42') is None
+
+
+def test_sync_keeps_unchanged_users_valid(main_module):
+    cache = main_module.PrivyUserCache(ttl=0.2)
+    cache.load([USER])
+    cache.mark_loaded()
+    time.sleep(0.15)
+    cache.mark_loaded()  # Incremental sync: nothing changed for this user
+    time.sleep(0.15)  # Past the entry's own TTL, within the sync's
+    assert cache.get('42') == USER
+    time.sleep(0.1)  # No sync for longer than the TTL
+    assert cache.get('42') is None
+
+
+def test_incremental_sync_serves_unchanged_users(main_module):
+    class Privy(main_module.PrivyAPI):
+        pages = [[USER]]
+
+        async def iter_user_pages(self, priority=main_module.PRIORITY_BACKGROUND):
+            for page in self.pages:
+                yield page
+
+    async def scenario():
+        privy = Privy('app', 'secret', cache_ttl=0.2)
+        await privy.run_sync(full=True)
+        time.sleep(0.25)
+        await privy.run_sync(full=False)  # USER hasn't changed: not re-added
+        assert await privy.get_user_by_discord_id('42') == USER
+
+    asyncio.run(scenario())
+
+
+def privy_user(i, wallets):
+    return {'id': f'did:privy:{i}', 'created_at': 1000 + i,
+            'linked_accounts': [{'type': 'discord_oauth', 'subject': str(100 + i), 'verified_at': 1000 + i}] +
+                               [{'type': 'wallet', 'address': address, 'chain_type': 'ethereum',
+                                 'chain_id': 'eip155:11155111', 'verified_at': verified_at}
+                                for address, verified_at in wallets]}
+
+
+async def start_privy(users, page_size, busy_once=False):
+    """Local stand-in for GET /api/v1/users: users newest first, cursor pagination; returns (url, runner, requests)"""
+    requests = []
+
+    async def list_users(request):
+        requests.append(dict(request.query))
+        assert request.headers['privy-app-id'] == 'app'
+        assert request.headers['Authorization'].startswith('Basic ')
+        if busy_once and len(requests) == 1:
+            return web.json_response({'error': 'busy'}, status=429, headers={'Retry-After': '0.01'})
+        ordered = sorted(users.values(), key=lambda user: -user['created_at'])
+        start = int(request.query.get('cursor', 0))
+        page = ordered[start:start + page_size]
+        next_cursor = str(start + page_size) if start + page_size < len(ordered) else None
+        return web.json_response({'data': page, 'next_cursor': next_cursor})
+
+    app = web.Application()
+    app.router.add_get('/api/v1/users', list_users)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    port = unused_port()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    return f'http://127.0.0.1:{port}', runner, requests
+
+
+def test_incremental_sync_picks_up_wallets_linked_by_older_users(main_module, tmp_path):
+    old_wallet, new_wallet = '0x' + 'aa' * 20, '0x' + 'bb' * 20
+    users = {i: privy_user(i, [('0x' + f'{i + 1:040x}', 1000 + i)]) for i in range(5)}
+    users[0] = privy_user(0, [(old_wallet, 1000)])
+
+    async def scenario():
+        url, runner, requests = await start_privy(users, page_size=2, busy_once=True)
+        directory = main_module.WalletDirectory(str(tmp_path / 'wallets.db'))
+        privy = main_module.PrivyAPI('app', 'secret', page_size=2, wallet_directory=directory,
+                                     rate_limit={'rate': 1000})
+        privy.base_url = url
+        try:
+            stats = await privy.sync_users()
+            assert (stats['mode'], stats['pages'], stats['users']) == ('full', 3, 5)
+            # The first request was rejected with 429 and retried by the rate limiter
+            assert privy.limiter.stats['retried'] == 1
+            assert [request.get('cursor') for request in requests] == [None, None, '2', '4']
+            assert directory.resolve(100)[1]['address'] == old_wallet
+
+            # The oldest user, on the last page, links a new wallet: their list position doesn't change
+            users[0] = privy_user(0, [(old_wallet, 1000), (new_wallet, 5000)])
+            stats = await privy.sync_users(full=False)
+            assert (stats['mode'], stats['pages'], stats['indexed']) == ('incremental', 3, 1)
+            addresses = [wallet['address'] for wallet in
+                         main_module.extract_wallets(await privy.get_user_by_discord_id(100))]
+            assert addresses == [old_wallet, new_wallet]
+            assert directory.get_user(100) == users[0]
+        finally:
+            await privy.close()
+            await runner.cleanup()
+            directory.close()
+
+    asyncio.run(scenario())
+
+
+def test_non_syncing_process_reads_the_shared_directory_only(main_module, tmp_path):
+    class Privy(main_module.PrivyAPI):
+        syncs_run = 0
+
+        async def run_sync(self, full=None, priority=main_module.PRIORITY_BACKGROUND):
+            self.syncs_run += 1
+
+    async def scenario():
+        directory = main_module.WalletDirectory(str(tmp_path / 'wallets.db'))
+        privy = Privy('app', 'secret', wallet_directory=directory, syncs=False)
+        try:
+            assert await privy.get_user_by_discord_id('42') is None
+            directory.update_from_users([USER])  # The primary's sync
+            assert await privy.get_user_by_discord_id('42') == USER
+            assert privy.syncs_run == 0
+        finally:
+            directory.close()
+
+    asyncio.run(scenario())
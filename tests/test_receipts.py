@@ -0,0 +1,164 @@
+import asyncio
+import sqlite3
+import time
+from datetime import datetime
+
+SENDER = '0x' + '11' * 20
+RECIPIENT = '0x' + '22' * 20
+
+
+def payment(amount):
+    return {'amount': amount, 'sender_wallet': SENDER, 'recipient_wallet': RECIPIENT}
+
+
+def test_verify_uses_exact_amount_wei(main_module):
+    for amount in (0.07, 0.14, 0.27, 0.28, 1.5):
+        expected = main_module.to_wei(amount)
+        record = dict(payment(amount), amount_wei=str(expected))
+        tx = {'from': SENDER, 'to': RECIPIENT, 'value': hex(expected)}
+        assert main_module.ReceiptWatcher.verify(record, tx, {}) is None
+        assert main_module.ReceiptWatcher.verify(record, dict(tx, value=hex(expected + 8)), {}) == 'Amount does not match'
+
+
+def test_verify_checks_wallets(main_module):
+    record = dict(payment(1), amount_wei=str(10 ** 18))
+    tx = {'from': SENDER, 'to': RECIPIENT, 'value': hex(10 ** 18)}
+    assert main_module.ReceiptWatcher.verify(record, dict(tx, to=SENDER), {}) == 'Sent to another wallet'
+    assert main_module.ReceiptWatcher.verify(record, dict(tx, **{'from': RECIPIENT}), {}) == 'Sent from another wallet'
+
+
+def test_to_wei_is_exact(main_module):
+    assert main_module.to_wei(0.07) == 70000000000000000
+    assert int(0.07 * 1e18) != 70000000000000000  # What a float computation gives
+
+
+class FakeManager:
+    """batch_call answers from receipts/transactions dicts keyed by transaction hash"""
+
+    def __init__(self):
+        self.receipts, self.transactions = {}, {}
+
+    async def batch_call(self, network, calls, priority=None):
+        return [(self.receipts if method == 'eth_getTransactionReceipt' else self.transactions).get(params[0])
+                for method, params in calls]
+
+
+def make_watcher(main, tmp_path, **payment):
+    store = main.PaymentStore(str(tmp_path / 'payments.db'))
+    tx_hash = '0x' + 'ab' * 32
+    store.create(dict({'id': 'p1', 'status': 'submitted', 'amount': 1, 'amount_wei': str(10 ** 18),
+                       'sender_wallet': SENDER, 'recipient_wallet': RECIPIENT, 'network': 'sepolia',
+                       'transaction_hash': tx_hash, 'submitted_at': '2026-01-01T00:00:00'}, **payment))
+    manager = FakeManager()
+    manager.transactions[tx_hash] = {'from': SENDER, 'to': RECIPIENT, 'value': hex(10 ** 18)}
+    return main.ReceiptWatcher(manager, store, submit_timeout=3600), manager, store, tx_hash
+
+
+def receipt(block_number, block_hash='0x01', status='0x1'):
+    return {'blockNumber': hex(block_number), 'blockHash': block_hash, 'status': status, 'logs': []}
+
+
+def test_submitted_payment_confirms_then_completes(main_module, tmp_path):
+    watcher, manager, store, tx_hash = make_watcher(main_module, tmp_path)
+    manager.receipts[tx_hash] = receipt(100)
+    asyncio.run(watcher.check('sepolia', 100))
+    assert store.get('p1')['status'] == 'confirmed'
+    assert store.get('p1')['receipt_block'] == 100
+    required = main_module.NETWORKS['sepolia']['confirmations']
+    asyncio.run(watcher.check('sepolia', 100 + required - 1))
+    assert store.get('p1')['status'] == 'completed'
+    assert [event['type'] for event in store.pending_events(payment_id='p1')] == ['payment_completed']
+
+
+def test_confirmed_payment_is_reorged_when_its_block_changes(main_module, tmp_path):
+    watcher, manager, store, tx_hash = make_watcher(main_module, tmp_path)
+    manager.receipts[tx_hash] = receipt(100, '0x01')
+    asyncio.run(watcher.check('sepolia', 100))
+    manager.receipts[tx_hash] = receipt(101, '0x02')
+    asyncio.run(watcher.check('sepolia', 101))
+    payment = store.get('p1')
+    assert (payment['status'], payment['reorg_count']) == ('reorged', 1)
+    # Watched again: confirmed in its new block
+    asyncio.run(watcher.check('sepolia', 101))
+    assert store.get('p1')['status'] == 'confirmed'
+    assert store.get('p1')['receipt_block'] == 101
+
+
+def test_confirmed_payment_is_reorged_when_its_receipt_disappears(main_module, tmp_path):
+    watcher, manager, store, tx_hash = make_watcher(main_module, tmp_path)
+    manager.receipts[tx_hash] = receipt(100)
+    asyncio.run(watcher.check('sepolia', 100))
+    del manager.receipts[tx_hash]
+    asyncio.run(watcher.check('sepolia', 101))
+    assert store.get('p1')['status'] == 'reorged'
+
+
+def test_unmined_payment_fails_after_submit_timeout(main_module, tmp_path):
+    watcher, _, store, _ = make_watcher(main_module, tmp_path, submitted_at=datetime.now().isoformat())
+    asyncio.run(watcher.check('sepolia', 100))
+    assert store.get('p1')['status'] == 'submitted'
+    watcher.submit_timeout = 0
+    time.sleep(0.01)
+    asyncio.run(watcher.check('sepolia', 100))
+    payment = store.get('p1')
+    assert (payment['status'], payment['failure_reason']) == ('failed', 'Transaction not found on-chain')
+
+
+def test_payment_on_unconfigured_network_fails(main_module, tmp_path):
+    watcher, manager, store, tx_hash = make_watcher(main_module, tmp_path, network='base')
+    manager.receipts[tx_hash] = receipt(100)
+    assert asyncio.run(watcher.in_flight('sepolia')) == []
+    payment = store.get('p1')
+    assert (payment['status'], payment['failure_reason']) == ('failed', 'Network base is not configured')
+
+
+def test_payments_are_matched_by_network_key_not_display_name(main_module, tmp_path):
+    watcher, _, _, _ = make_watcher(main_module, tmp_path, sender_chain='Renamed network')
+    assert [payment['id'] for payment in asyncio.run(watcher.in_flight('sepolia'))] == ['p1']
+    assert asyncio.run(watcher.in_flight('ethereum')) == []
+
+
+def test_api_ping_checks_the_payment_right_away(main_module, tmp_path):
+    watcher, manager, store, tx_hash = make_watcher(main_module, tmp_path)
+    manager.receipts[tx_hash] = receipt(100)
+
+    class Tracker:
+        def get(self, network):
+            return {'block_number': 100}
+
+        def subscribe(self, callback):
+            pass
+
+    watcher.start(Tracker())
+    asyncio.run(watcher.check_payment('p1'))
+    assert store.get('p1')['status'] == 'confirmed'
+
+
+def test_store_calls_do_not_block_the_event_loop(main_module, tmp_path):
+    store = main_module.PaymentStore(str(tmp_path / 'payments.db'), timeout=0.5)
+    scheduler = main_module.PaymentExpiryScheduler(store)
+    blocker = sqlite3.connect(str(tmp_path / 'payments.db'), isolation_level=None)
+    blocker.execute('BEGIN IMMEDIATE')  # Another process holding the write lock
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        try:
+            await scheduler.run_once()
+        except sqlite3.OperationalError:
+            pass  # Busy timeout: the write waited in a worker thread
+        task.cancel()
+        return ticks
+
+    try:
+        assert asyncio.run(scenario()) >= 10
+    finally:
+        blocker.execute('ROLLBACK')
+        blocker.close()
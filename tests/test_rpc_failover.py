@@ -0,0 +1,108 @@
+import asyncio
+import socket
+import time
+
+from aiohttp import web
+
+
+def unused_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def start_node(delay=0.0):
+    """Local JSON-RPC stand-in answering eth_blockNumber after delay seconds; returns (url, runner, calls)"""
+    calls = []
+
+    async def rpc(request):
+        calls.append(await request.json())
+        await asyncio.sleep(delay)
+        return web.json_response({'jsonrpc': '2.0', 'id': 1, 'result': '0x64'})
+
+    app = web.Application()
+    app.router.add_post('/', rpc)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    port = unused_port()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    return f'http://127.0.0.1:{port}', runner, calls
+
+
+def make_manager(main, urls, hedge_delay):
+    """Web3Manager whose sepolia pool ranks urls in the given order, with no probing needed"""
+    manager = main.Web3Manager(request_timeout=5, hedge_delay=hedge_delay, failure_threshold=100)
+    pool = main.RPCEndpointPool(urls)
+    for rank, endpoint in enumerate(pool.endpoints):
+        endpoint.latency = 0.01 * (rank + 1)
+    manager.pools['sepolia'] = pool
+    return manager
+
+
+def test_hedged_call_fails_over_when_best_endpoint_fails_early(main_module):
+    async def scenario():
+        url, runner, calls = await start_node()
+        dead = f'http://127.0.0.1:{unused_port()}'  # Connection refused
+        manager = make_manager(main_module, [dead, url], hedge_delay=5)
+        try:
+            started = time.monotonic()
+            for _ in range(3):
+                assert await manager.call('sepolia', 'eth_blockNumber', hedge=True) == '0x64'
+            # The runner-up is asked as soon as the best endpoint fails, not after hedge_delay
+            assert time.monotonic() - started < 2
+            assert len(calls) == 3
+        finally:
+            await manager.close()
+            await runner.cleanup()
+
+    asyncio.run(scenario())
+
+
+def test_hedged_call_uses_runner_up_when_best_endpoint_is_slow(main_module):
+    async def scenario():
+        slow_url, slow_runner, slow_calls = await start_node(delay=1)
+        fast_url, fast_runner, fast_calls = await start_node()
+        manager = make_manager(main_module, [slow_url, fast_url], hedge_delay=0.05)
+        try:
+            started = time.monotonic()
+            assert await manager.call('sepolia', 'eth_blockNumber', hedge=True) == '0x64'
+            assert time.monotonic() - started < 0.5
+            assert len(slow_calls) == 1 and len(fast_calls) == 1
+        finally:
+            await manager.close()
+            await slow_runner.cleanup()
+            await fast_runner.cleanup()
+
+    asyncio.run(scenario())
+
+
+def test_failover_after_hedge_only_skips_tried_endpoints(main_module):
+    async def scenario():
+        url, runner, calls = await start_node()
+        dead = [f'http://127.0.0.1:{unused_port()}' for _ in range(2)]
+        manager = make_manager(main_module, dead + [url], hedge_delay=5)
+        try:
+            assert await manager.call('sepolia', 'eth_blockNumber', hedge=True) == '0x64'
+            assert len(calls) == 1
+        finally:
+            await manager.close()
+            await runner.cleanup()
+
+    asyncio.run(scenario())
+
+
+def test_hedged_call_raises_when_every_endpoint_fails(main_module):
+    async def scenario():
+        dead = [f'http://127.0.0.1:{unused_port()}' for _ in range(2)]
+        manager = make_manager(main_module, dead, hedge_delay=5)
+        try:
+            try:
+                await manager.call('sepolia', 'eth_blockNumber', hedge=True)
+            except Exception as e:
+                assert 'No RPC endpoint available' not in str(e)
+            else:
+                raise AssertionError('expected the call to fail')
+        finally:
+            await manager.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,99 @@
+from decimal import Decimal
+
+import pytest
+
+from chains import DEFAULT_NETWORKS, ChainRegistry
+from tokens import (BALANCE_OF, TRANSFER_TOPIC, TokenMetadataCache, decode_aggregate3, decode_string, decode_uint,
+                    encode_address, encode_aggregate3, encode_call, encode_uint, from_units, is_address, to_units,
+                    transfer_data, transferred_amount)
+
+SENDER = '0x' + '11' * 20
+RECIPIENT = '0x' + '22' * 20
+TOKEN = '0x' + 'ab' * 20
+
+
+def test_default_networks_load():
+    registry = ChainRegistry.from_config({})
+    assert set(registry.networks) == set(DEFAULT_NETWORKS)
+    for info in registry.networks.values():
+        assert all(is_address(address) for address in info['tokens'].values())
+
+
+def test_invalid_token_address_is_rejected():
+    with pytest.raises(ValueError, match='DAI'):
+        ChainRegistry.from_config({'networks': {'ethereum': {'tokens': {'DAI': '0x1234'}}}})
+
+
+def test_encode_call():
+    assert encode_call(BALANCE_OF, encode_address(SENDER)) == '0x70a08231' + '0' * 24 + '11' * 20
+    assert transfer_data(RECIPIENT, 5) == '0xa9059cbb' + '0' * 24 + '22' * 20 + '0' * 63 + '5'
+
+
+def test_encode_aggregate3_matches_abi():
+    eth_abi = pytest.importorskip('eth_abi')
+    calls = [(TOKEN, encode_call(BALANCE_OF, encode_address(SENDER))), (SENDER, '0x313ce567'), (RECIPIENT, '0x')]
+    expected = eth_abi.encode(['(address,bool,bytes)[]'],
+                              [[(target, True, bytes.fromhex(data[2:])) for target, data in calls]])
+    assert encode_aggregate3(calls) == '0x82ad56cb' + expected.hex()
+
+
+def test_decode_aggregate3():
+    # [(true, uint 42), (false, empty), (true, 33 bytes)]
+    returns = [(True, bytes.fromhex(encode_uint(42))), (False, b''), (True, b'\x01' * 33)]
+    tuples = []
+    for success, data in returns:
+        padded = data + b'\0' * (-len(data) % 32)
+        tuples.append(encode_uint(int(success)) + encode_uint(0x40) + encode_uint(len(data)) + padded.hex())
+    offsets, position = [], 32 * len(tuples)
+    for encoded in tuples:
+        offsets.append(encode_uint(position))
+        position += len(encoded) // 2
+    result = '0x' + encode_uint(0x20) + encode_uint(len(tuples)) + ''.join(offsets) + ''.join(tuples)
+
+    assert decode_aggregate3(result) == returns
+    assert decode_uint(decode_aggregate3(result)[0][1]) == 42
+
+
+def test_decode_aggregate3_rejects_truncated_data():
+    with pytest.raises(ValueError):
+        decode_aggregate3('0x' + encode_uint(0x20))
+
+
+def test_decode_string():
+    assert decode_string(b'MKR'.ljust(32, b'\0')) == 'MKR'  # bytes32 symbol
+    encoded = encode_uint(0x20) + encode_uint(4) + b'USDC'.ljust(32, b'\0').hex()
+    assert decode_string(bytes.fromhex(encoded)) == 'USDC'
+    assert decode_uint(b'') is None
+
+
+def test_units():
+    assert to_units(0.07, 18) == 70000000000000000
+    assert to_units(1.5, 6) == 1500000
+    assert from_units(1500000, 6) == Decimal('1.5')
+
+
+def test_transferred_amount():
+    def transfer(token, sender, recipient, value):
+        return {'address': token, 'data': hex(value),
+                'topics': [TRANSFER_TOPIC, '0x' + sender[2:].rjust(64, '0'), '0x' + recipient[2:].rjust(64, '0')]}
+
+    receipt = {'logs': [transfer(TOKEN, SENDER, RECIPIENT, 7), transfer(TOKEN, SENDER, RECIPIENT, 3),
+                        transfer(TOKEN, RECIPIENT, SENDER, 100), transfer('0x' + 'cd' * 20, SENDER, RECIPIENT, 100)]}
+    assert transferred_amount(receipt, TOKEN, SENDER, RECIPIENT) == 10
+    assert transferred_amount({'logs': None}, TOKEN, SENDER, RECIPIENT) == 0
+
+
+def test_metadata_cache_persists(tmp_path):
+    path = tmp_path / 'token_metadata.json'
+    cache = TokenMetadataCache(str(path))
+    assert cache.get('eip155:1', TOKEN) is None
+    cache.update('eip155:1', {TOKEN: {'decimals': 6, 'symbol': 'USDC'}})
+    reloaded = TokenMetadataCache(str(path))
+    assert reloaded.get('eip155:1', '0x' + TOKEN[2:].upper()) == {'decimals': 6, 'symbol': 'USDC'}
+
+
+def test_default_network():
+    assert ChainRegistry.from_config({}).default == 'sepolia'
+    assert ChainRegistry.from_config({'default_network': 'ethereum'}).default == 'ethereum'
+    # Without the configured default, the first remaining network is used
+    assert ChainRegistry.from_config({'networks': {'sepolia': None}}).default == 'ethereum'
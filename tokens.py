@@ -0,0 +1,150 @@
+import json
+import os
+import re
+import threading
+from decimal import Decimal
+
+# Multicall3 is deployed at the same address on every major EVM chain
+MULTICALL3_ADDRESS = '0xca11bde05977b3631167028862be2a173976ca11'
+
+# Function selectors and event topic (first 4 / 32 bytes of the keccak of the signature)
+AGGREGATE3 = '82ad56cb'  # aggregate3((address,bool,bytes)[])
+BALANCE_OF = '70a08231'  # balanceOf(address)
+DECIMALS = '313ce567'  # decimals()
+SYMBOL = '95d89b41'  # symbol()
+TRANSFER = 'a9059cbb'  # transfer(address,uint256)
+TRANSFER_TOPIC = '0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef'
+
+ADDRESS_PATTERN = re.compile(r'0x[0-9a-fA-F]{40}')
+
+
+def is_address(value):
+    return isinstance(value, str) and ADDRESS_PATTERN.fullmatch(value) is not None
+
+
+def encode_address(address):
+    return address[2:].lower().rjust(64, '0')
+
+
+def encode_uint(value):
+    return f'{value:064x}'
+
+
+def encode_call(selector, *words):
+    """Calldata of a call whose arguments are all static words"""
+    return '0x' + selector + ''.join(words)
+
+
+def transfer_data(recipient, amount):
+    """Calldata of an ERC-20 transfer(recipient, amount)"""
+    return encode_call(TRANSFER, encode_address(recipient), encode_uint(amount))
+
+
+def encode_aggregate3(calls):
+    """Calldata of Multicall3 aggregate3 for [(target, calldata)], every call allowed to fail"""
+    tuples = []
+    for target, data in calls:
+        data = bytes.fromhex(data[2:])
+        padded = data + b'\0' * (-len(data) % 32)
+        tuples.append(encode_address(target) + encode_uint(1) + encode_uint(0x60) + encode_uint(len(data)) +
+                      padded.hex())
+    offsets, position = [], 32 * len(tuples)
+    for encoded in tuples:
+        offsets.append(encode_uint(position))
+        position += len(encoded) // 2
+    return '0x' + AGGREGATE3 + encode_uint(0x20) + encode_uint(len(tuples)) + ''.join(offsets) + ''.join(tuples)
+
+
+def decode_aggregate3(result):
+    """[(success, return data bytes)] from the return value of aggregate3 (ValueError if malformed)"""
+    data = bytes.fromhex(result[2:] if result.startswith('0x') else result)
+
+    def word(offset):
+        if offset + 32 > len(data):
+            raise ValueError("Truncated aggregate3 result")
+        return int.from_bytes(data[offset:offset + 32], 'big')
+
+    array = word(0)
+    base = array + 32
+    results = []
+    for i in range(word(array)):
+        start = base + word(base + 32 * i)
+        data_start = start + word(start + 32)
+        length = word(data_start)
+        results.append((bool(word(start)), data[data_start + 32:data_start + 32 + length]))
+    return results
+
+
+def decode_uint(data):
+    """First word of a return value as an integer, or None if there isn't one"""
+    if len(data) < 32:
+        return None
+    return int.from_bytes(data[:32], 'big')
+
+
+def decode_string(data):
+    """ABI string return value (or the bytes32 some older tokens return for symbol())"""
+    if len(data) == 32:
+        return data.rstrip(b'\0').decode('utf-8', 'replace')
+    offset = decode_uint(data)
+    if offset is None or offset + 32 > len(data):
+        return None
+    length = decode_uint(data[offset:])
+    return data[offset + 32:offset + 32 + length].decode('utf-8', 'replace')
+
+
+def to_units(amount, decimals):
+    """Token amount (as stored on a payment) to base units, without float rounding"""
+    return int(Decimal(str(amount)) * 10 ** decimals)
+
+
+def from_units(value, decimals):
+    return Decimal(value) / 10 ** decimals
+
+
+def transferred_amount(receipt, token, sender, recipient):
+    """Base units of token moved from sender to recipient by the Transfer logs of a receipt"""
+    total = 0
+    for log in receipt.get('logs') or []:
+        topics = log.get('topics') or []
+        if (len(topics) == 3 and topics[0] == TRANSFER_TOPIC and (log.get('address') or '').lower() == token and
+                topics[1][-40:].lower() == sender[2:].lower() and topics[2][-40:].lower() == recipient[2:].lower()):
+            total += int(log.get('data') or '0x0', 16)
+    return total
+
+
+class TokenMetadataCache:
+    """
+    Decimals and symbol of ERC-20 contracts, keyed by CAIP-2 chain ID and address.
+    They never change, so entries are kept forever in a JSON file and read at startup.
+    """
+
+    def __init__(self, path='token_metadata.json'):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        try:
+            with open(path, 'r') as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"⚠️ Unable to read token metadata cache {path} ({e}), starting empty")
+
+    @staticmethod
+    def key(chain_id, address):
+        return f'{chain_id}/{address.lower()}'
+
+    def get(self, chain_id, address):
+        """{'decimals', 'symbol'} of a token, or None if not cached"""
+        return self.entries.get(self.key(chain_id, address))
+
+    def update(self, chain_id, metadata):
+        """Record {address: {'decimals', 'symbol'}} and write the file"""
+        with self.lock:
+            for address, entry in metadata.items():
+                self.entries[self.key(chain_id, address)] = entry
+            temporary = f'{self.path}.tmp'
+            with open(temporary, 'w') as f:
+                json.dump(self.entries, f, indent=2, sort_keys=True)
+            os.replace(temporary, self.path)  # Never leave a half-written cache
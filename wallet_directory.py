@@ -0,0 +1,137 @@
+import json
+import sqlite3
+import threading
+import time
+
+
+def extract_wallets(user_data):
+    """Wallets linked to a Privy user"""
+    wallets = []
+    for account in user_data.get('linked_accounts', []):
+        if account.get('type') == 'wallet':
+            wallets.append({
+                'address': account.get('address'),
+                'wallet_type': account.get('wallet_client_type', 'privy'),
+                'chain_type': account.get('chain_type', 'ethereum'),
+                'chain_id': account.get('chain_id', 'eip155:1'),
+                'wallet_client': account.get('wallet_client', 'privy')
+            })
+    return wallets
+
+
+class WalletDirectory:
+    """
+    Persistent Discord ID -> wallet table, kept current from Privy syncs.
+    Resolving the wallet to use for a Discord user is a single indexed query.
+    The database is shared by every bot process, so one process's sync serves them all.
+    Methods block (the bot calls them from worker threads); the connection is used by
+    one thread at a time, and timeout bounds the wait for another process's write lock.
+    """
+
+    def __init__(self, path='wallets.db', timeout=30):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS accounts (
+                discord_id TEXT PRIMARY KEY,
+                privy_user_id TEXT,
+                updated_at REAL NOT NULL,
+                user_json TEXT
+            );
+            CREATE TABLE IF NOT EXISTS wallets (
+                discord_id TEXT NOT NULL,
+                address TEXT NOT NULL,
+                chain_id TEXT,
+                chain_type TEXT,
+                wallet_type TEXT,
+                wallet_client TEXT,
+                position INTEGER NOT NULL,
+                PRIMARY KEY (discord_id, address)
+            );
+        ''')
+        # Directories created before Privy users were stored have no user_json column
+        if 'user_json' not in [row['name'] for row in self.conn.execute('PRAGMA table_info(accounts)')]:
+            self.conn.execute('ALTER TABLE accounts ADD COLUMN user_json TEXT')
+
+    def update_from_users(self, users):
+        """Record the accounts and wallets of Discord-linked Privy users"""
+        now = time.time()
+        accounts, wallets = [], []
+        for user in users:
+            discord_ids = [str(account['subject']) for account in user.get('linked_accounts', [])
+                           if account.get('type') == 'discord_oauth' and account.get('subject')]
+            for discord_id in discord_ids:
+                accounts.append((discord_id, user.get('id'), now, json.dumps(user)))
+                wallets.extend((discord_id, wallet['address'], wallet['chain_id'], wallet['chain_type'],
+                                wallet['wallet_type'], wallet['wallet_client'], position)
+                               for position, wallet in enumerate(extract_wallets(user)) if wallet['address'])
+        if not accounts:
+            return 0
+
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                self.conn.executemany('INSERT OR REPLACE INTO accounts (discord_id, privy_user_id, updated_at, '
+                                      'user_json) VALUES (?, ?, ?, ?)', accounts)
+                self.conn.executemany('DELETE FROM wallets WHERE discord_id = ?',
+                                      [(account[0],) for account in accounts])
+                self.conn.executemany('INSERT OR REPLACE INTO wallets VALUES (?, ?, ?, ?, ?, ?, ?)', wallets)
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+        return len(accounts)
+
+    def prune(self, older_than):
+        """Forget accounts not seen by a full sync that started at older_than (unix time)"""
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                self.conn.execute('DELETE FROM wallets WHERE discord_id IN '
+                                  '(SELECT discord_id FROM accounts WHERE updated_at < ?)', (older_than,))
+                cursor = self.conn.execute('DELETE FROM accounts WHERE updated_at < ?', (older_than,))
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+        return cursor.rowcount
+
+    def resolve(self, discord_id, preferred_chain=None):
+        """
+        Wallet to use for a Discord user: one on preferred_chain (CAIP-2) first, then any EVM wallet,
+        then the first wallet. Returns (known, wallet): known is False when the Discord ID
+        isn't in the directory, wallet is None when the account has no wallet.
+        """
+        with self.lock:
+            row = self.conn.execute('''
+                SELECT a.discord_id, w.address, w.chain_id, w.chain_type, w.wallet_type, w.wallet_client
+                FROM accounts a LEFT JOIN wallets w ON w.discord_id = a.discord_id
+                WHERE a.discord_id = ?
+                ORDER BY w.chain_id = ? DESC,
+                         (w.chain_id LIKE 'eip155:%' OR w.chain_type = 'ethereum') DESC,
+                         w.position
+                LIMIT 1
+            ''', (str(discord_id), preferred_chain)).fetchone()
+
+        if row is None:
+            return False, None
+        if row['address'] is None:
+            return True, None
+        return True, {key: row[key] for key in ('address', 'chain_id', 'chain_type', 'wallet_type', 'wallet_client')}
+
+    def get_user(self, discord_id):
+        """Privy user recorded for a Discord ID, or None"""
+        with self.lock:
+            row = self.conn.execute('SELECT user_json FROM accounts WHERE discord_id = ?',
+                                    (str(discord_id),)).fetchone()
+        if row is None or row['user_json'] is None:
+            return None
+        return json.loads(row['user_json'])
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -1,79 +1,140 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request
 from flask_cors import CORS
 import json
 import os
+import sys
+import threading
+import time
+import urllib.request
 from datetime import datetime
 
+# Le module de stockage est partagé avec le bot (racine du projet)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from payment_store import PaymentStore, payments_db_path
+from metrics import REGISTRY, CONTENT_TYPE
+
 app = Flask(__name__)
 CORS(app)  # Permettre les requêtes cross-origin depuis la webapp
 
-def load_pending_payments():
-    """Charge les paiements en attente depuis le fichier"""
-    try:
-        if os.path.exists('../pending_payments.json'):
-            with open('../pending_payments.json', 'r') as f:
-                return json.load(f)
-        return {}
-    except Exception as e:
-        print(f"❌ Erreur chargement paiements: {e}")
-        return {}
+# Base SQLite partagée avec le bot (migre pending_payments.json au premier lancement): même
+# réglage que le bot, $PAYBOT_PAYMENTS_DB ou 'payments_db' dans ../config.json
+payment_store = PaymentStore(payments_db_path('..'), legacy_json_path='../pending_payments.json')
 
-def save_pending_payments(payments):
-    """Sauvegarde les paiements dans le fichier"""
-    try:
-        with open('../pending_payments.json', 'w') as f:
-            json.dump(payments, f, indent=2, default=str)
-        return True
-    except Exception as e:
-        print(f"❌ Erreur sauvegarde paiements: {e}")
-        return False
+# Métriques exposées sur /metrics (format texte Prometheus)
+REQUEST_SECONDS = REGISTRY.histogram('paybot_api_request_seconds', 'Durée des requêtes HTTP',
+                                     ('route', 'method', 'status'))
+REGISTRY.gauge('paybot_api_payments', 'Paiements dans la base active, par statut',
+               ('status',)).set_function(lambda: {(status,): count for status, count in
+                                                  payment_store.stats()['hot_by_status'].items()})
+
+@app.before_request
+def start_timer():
+    g.started_at = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    route = request.url_rule.rule if request.url_rule else 'inconnue'
+    REQUEST_SECONDS.observe(time.perf_counter() - g.started_at, route=route, method=request.method,
+                            status=response.status_code)
+    return response
+
+# Écouteur HTTP du bot, prévenu dès qu'un événement de paiement est enregistré
+BOT_EVENTS_URL = os.environ.get('PAYBOT_EVENTS_URL', 'http://127.0.0.1:5001/payment-events')
+
+def notify_bot(payment_id):
+    """
+    Signale au bot le paiement modifié: il vérifie sa transaction on-chain tout de suite
+    (best effort: s'il est injoignable, le prochain bloc s'en charge)
+    """
+    body = json.dumps({'payment_id': payment_id}).encode()
+
+    def ping():
+        try:
+            urllib.request.urlopen(urllib.request.Request(BOT_EVENTS_URL, data=body, method='POST',
+                                                          headers={'Content-Type': 'application/json'}),
+                                   timeout=2).close()
+        except Exception as e:
+            print(f"⚠️ Bot injoignable ({e}), l'événement sera traité au prochain passage")
+    threading.Thread(target=ping, daemon=True).start()
 
 @app.route('/api/payment/<payment_id>', methods=['GET'])
 def get_payment(payment_id):
     """Récupère les détails d'un paiement"""
-    payments = load_pending_payments()
-    
-    if payment_id not in payments:
+    payment_data = payment_store.get(payment_id)
+
+    if payment_data is None:
         return jsonify({'error': 'Paiement non trouvé'}), 404
-    
-    payment_data = payments[payment_id]
+
     print(f"✅ Paiement récupéré: {payment_id}")
     return jsonify(payment_data)
 
 @app.route('/api/payment/<payment_id>/confirm', methods=['POST'])
 def confirm_payment(payment_id):
     """Confirme un paiement"""
-    payments = load_pending_payments()
-    
-    if payment_id not in payments:
-        return jsonify({'error': 'Paiement non trouvé'}), 404
-    
-    # Mettre à jour le statut
-    payments[payment_id]['status'] = 'completed'
-    payments[payment_id]['confirmed_at'] = datetime.now().isoformat()
-    
-    # Ajouter les données de confirmation si fournies
-    confirmation_data = request.get_json()
-    if confirmation_data:
-        payments[payment_id].update(confirmation_data)
-    
-    # Sauvegarder
-    if save_pending_payments(payments):
-        print(f"✅ Paiement confirmé: {payment_id}")
-        return jsonify({'success': True, 'payment': payments[payment_id]})
-    else:
+    # Données de confirmation: seuls le hash de transaction et quelques informations sur le
+    # wallet sont pris en compte (montant, wallets et token ne sont pas modifiables)
+    confirmation_data = request.get_json(silent=True)
+    if not isinstance(confirmation_data, dict):
+        confirmation_data = {}
+
+    # Transition atomique: le bot vérifie la transaction on-chain avant de passer le
+    # paiement en completed
+    try:
+        payment, updated = payment_store.confirm(payment_id, confirmation_data)
+    except ValueError as e:
+        return jsonify({'error': f'Confirmation invalide: {e}'}), 400
+    except Exception as e:
+        print(f"❌ Erreur sauvegarde paiement: {e}")
         return jsonify({'error': 'Erreur sauvegarde'}), 500
 
+    if payment is None:
+        return jsonify({'error': 'Paiement non trouvé'}), 404
+
+    if not updated:
+        return jsonify({'error': f"Paiement déjà {payment['status']}", 'payment': payment}), 409
+
+    print(f"✅ Paiement confirmé: {payment_id}")
+    notify_bot(payment_id)  # Le bot prend le relais (vérification on-chain)
+    return jsonify({'success': True, 'payment': payment})
+
+MAX_PAGE_SIZE = 500
+
 @app.route('/api/payments', methods=['GET'])
 def list_payments():
-    """Liste tous les paiements"""
-    payments = load_pending_payments()
-    return jsonify(payments)
+    """
+    Liste les paiements, page par page (du plus ancien au plus récent).
+    Filtres: status, sender_id, recipient_id, guild_id, since, until (ISO 8601).
+    Pagination: limit (max 500) et cursor (valeur next_cursor de la page précédente).
+    format=ndjson exporte tous les paiements filtrés en flux, une ligne JSON par paiement.
+    """
+    filters = {key: request.args[key] for key in
+               ('status', 'sender_id', 'recipient_id', 'guild_id', 'since', 'until') if request.args.get(key)}
+
+    if request.args.get('format') == 'ndjson':
+        # Export en flux: seule une page est en mémoire à la fois
+        def generate():
+            for payment in payment_store.iter_payments(**filters):
+                yield json.dumps(payment, default=str) + '\n'
+        return Response(generate(), mimetype='application/x-ndjson')
+
+    try:
+        limit = min(max(int(request.args.get('limit', 100)), 1), MAX_PAGE_SIZE)
+        payments, next_cursor = payment_store.query(cursor=request.args.get('cursor'), limit=limit, **filters)
+    except ValueError as e:
+        return jsonify({'error': f'Paramètre invalide: {e}'}), 400
+
+    return jsonify({'payments': payments, 'next_cursor': next_cursor})
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Endpoint de santé pour vérifier que l'API fonctionne"""
-    return jsonify({'status': 'OK', 'timestamp': datetime.now().isoformat()})
+    return jsonify({'status': 'OK', 'timestamp': datetime.now().isoformat(),
+                    'payments': payment_store.stats()})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Métriques de l'API au format texte Prometheus"""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
 
 if __name__ == '__main__':
     print("🚀 Démarrage du serveur API de paiement...")
@@ -81,6 +142,7 @@ if __name__ == '__main__':
     print("🔍 Endpoints disponibles:")
     print("  - GET /api/payment/<id>")
     print("  - POST /api/payment/<id>/confirm")
-    print("  - GET /api/payments")
+    print("  - GET /api/payments?status=&sender_id=&limit=&cursor=&format=ndjson")
     print("  - GET /health")
+    print("  - GET /metrics")
     app.run(debug=True, port=5000, host='0.0.0.0')
@@ -0,0 +1,215 @@
+"""
+Version ASGI de l'API de paiement (mêmes routes que payment-api.py), pour la production.
+
+    python payment_asgi.py            # uvicorn, PAYBOT_API_WORKERS processus (défaut: nombre de CPU)
+
+L'accès à la base SQLite se fait dans un pool de threads pour ne pas bloquer la boucle
+d'événements; chaque worker a son propre pool de connexions (WAL, accès concurrents sûrs).
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+import aiohttp
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+# Le module de stockage est partagé avec le bot (racine du projet)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from payment_store import PaymentStore, payments_db_path
+from metrics import REGISTRY, CONTENT_TYPE
+
+# Base SQLite partagée avec le bot (migre pending_payments.json au premier lancement): même
+# réglage que le bot, $PAYBOT_PAYMENTS_DB ou 'payments_db' dans ../config.json
+payment_store = PaymentStore(payments_db_path('..'), legacy_json_path='../pending_payments.json')
+
+# Écouteur HTTP du bot, prévenu dès qu'un événement de paiement est enregistré
+BOT_EVENTS_URL = os.environ.get('PAYBOT_EVENTS_URL', 'http://127.0.0.1:5001/payment-events')
+
+MAX_PAGE_SIZE = 500
+
+REQUEST_SECONDS = REGISTRY.histogram('paybot_api_request_seconds', 'Durée des requêtes HTTP',
+                                     ('route', 'method', 'status'))
+REGISTRY.gauge('paybot_api_payments', 'Paiements dans la base active, par statut',
+               ('status',)).set_function(lambda: {(status,): count for status, count in
+                                                  payment_store.stats()['hot_by_status'].items()})
+
+# Session HTTP vers le bot (keep-alive) et pings en cours, gérés par le cycle de vie de l'app
+bot_session = None
+pending_pings = set()
+
+
+def notify_bot(payment_id):
+    """
+    Signale au bot le paiement modifié: il vérifie sa transaction on-chain tout de suite
+    (best effort: s'il est injoignable, le prochain bloc s'en charge)
+    """
+    async def ping():
+        try:
+            async with bot_session.post(BOT_EVENTS_URL, json={'payment_id': payment_id}) as response:
+                await response.read()
+        except Exception as e:
+            print(f"⚠️ Bot injoignable ({e}), l'événement sera traité au prochain passage")
+
+    task = asyncio.create_task(ping())
+    pending_pings.add(task)
+    task.add_done_callback(pending_pings.discard)
+
+
+async def get_payment(request):
+    """Récupère les détails d'un paiement"""
+    payment_id = request.path_params['payment_id']
+    payment_data = await run_in_threadpool(payment_store.get, payment_id)
+
+    if payment_data is None:
+        return JSONResponse({'error': 'Paiement non trouvé'}, status_code=404)
+
+    return JSONResponse(payment_data)
+
+
+async def confirm_payment(request):
+    """Confirme un paiement"""
+    payment_id = request.path_params['payment_id']
+    # Données de confirmation: seuls le hash de transaction et quelques informations sur le
+    # wallet sont pris en compte (montant, wallets et token ne sont pas modifiables)
+    try:
+        confirmation_data = await request.json()
+    except ValueError:
+        confirmation_data = None
+    if not isinstance(confirmation_data, dict):
+        confirmation_data = {}
+
+    try:
+        payment, updated = await run_in_threadpool(payment_store.confirm, payment_id, confirmation_data)
+    except ValueError as e:
+        return JSONResponse({'error': f'Confirmation invalide: {e}'}, status_code=400)
+    except Exception as e:
+        print(f"❌ Erreur sauvegarde paiement: {e}")
+        return JSONResponse({'error': 'Erreur sauvegarde'}, status_code=500)
+
+    if payment is None:
+        return JSONResponse({'error': 'Paiement non trouvé'}, status_code=404)
+
+    if not updated:
+        return JSONResponse({'error': f"Paiement déjà {payment['status']}", 'payment': payment}, status_code=409)
+
+    print(f"✅ Paiement confirmé: {payment_id}")
+    notify_bot(payment_id)  # Le bot prend le relais (vérification on-chain)
+    return JSONResponse({'success': True, 'payment': payment})
+
+
+async def list_payments(request):
+    """
+    Liste les paiements, page par page (mêmes paramètres que payment-api.py).
+    format=ndjson exporte tous les paiements filtrés en flux, une ligne JSON par paiement.
+    """
+    filters = {key: request.query_params[key] for key in
+               ('status', 'sender_id', 'recipient_id', 'guild_id', 'since', 'until')
+               if request.query_params.get(key)}
+
+    if request.query_params.get('format') == 'ndjson':
+        # Export en flux: une page lue à la fois dans le pool de threads
+        async def generate():
+            cursor = None
+            while True:
+                payments, cursor = await run_in_threadpool(payment_store.query, cursor=cursor,
+                                                           limit=MAX_PAGE_SIZE, **filters)
+                for payment in payments:
+                    yield json.dumps(payment, default=str) + '\n'
+                if cursor is None:
+                    return
+        return StreamingResponse(generate(), media_type='application/x-ndjson')
+
+    try:
+        limit = min(max(int(request.query_params.get('limit', 100)), 1), MAX_PAGE_SIZE)
+        payments, next_cursor = await run_in_threadpool(payment_store.query, cursor=request.query_params.get('cursor'),
+                                                        limit=limit, **filters)
+    except ValueError as e:
+        return JSONResponse({'error': f'Paramètre invalide: {e}'}, status_code=400)
+
+    return JSONResponse({'payments': payments, 'next_cursor': next_cursor})
+
+
+async def health_check(request):
+    """Endpoint de santé pour vérifier que l'API fonctionne"""
+    stats = await run_in_threadpool(payment_store.stats)
+    return JSONResponse({'status': 'OK', 'timestamp': datetime.now().isoformat(), 'payments': stats})
+
+
+async def metrics(request):
+    """Métriques de l'API au format texte Prometheus"""
+    text = await run_in_threadpool(REGISTRY.render)
+    return Response(text, media_type=CONTENT_TYPE)
+
+
+class RequestTimer:
+    """Middleware ASGI: durée de chaque requête HTTP par route, méthode et statut"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        status = {'code': 500}
+
+        async def send_with_status(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get('route')
+            REQUEST_SECONDS.observe(time.perf_counter() - started, route=route.path if route else 'inconnue',
+                                    method=scope['method'], status=status['code'])
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global bot_session
+    bot_session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=2))
+    yield
+    # Arrêt propre: les requêtes en cours sont terminées par le serveur, puis on attend les pings
+    if pending_pings:
+        await asyncio.wait(pending_pings, timeout=2)
+    await bot_session.close()
+    payment_store.close()
+
+
+app = Starlette(
+    routes=[
+        Route('/api/payment/{payment_id}', get_payment, methods=['GET']),
+        Route('/api/payment/{payment_id}/confirm', confirm_payment, methods=['POST']),
+        Route('/api/payments', list_payments, methods=['GET']),
+        Route('/health', health_check, methods=['GET']),
+        Route('/metrics', metrics, methods=['GET']),
+    ],
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*']),  # Webapp
+        Middleware(RequestTimer),
+    ],
+    lifespan=lifespan,
+)
+
+if __name__ == '__main__':
+    import uvicorn
+
+    workers = int(os.environ.get('PAYBOT_API_WORKERS', os.cpu_count() or 1))
+    port = int(os.environ.get('PAYBOT_API_PORT', 5000))
+    print(f"🚀 Démarrage du serveur API de paiement (ASGI, {workers} worker(s))...")
+    print(f"📡 API disponible sur http://localhost:{port}")
+    # Plusieurs workers: uvicorn importe l'app par son nom dans chaque processus
+    uvicorn.run('payment_asgi:app', app_dir=os.path.dirname(os.path.abspath(__file__)), host='0.0.0.0',
+                port=port, workers=workers, timeout_keep_alive=30, timeout_graceful_shutdown=10, access_log=False)
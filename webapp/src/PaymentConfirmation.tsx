@@ -10,8 +10,10 @@ interface PaymentData {
   recipient_name: string;
   amount: number;
   currency: string;
-  network?: string; // Add network field
-  chain_id?: number; // Add chain_id field
+  network?: string; // Réseau choisi par le bot (clé de config, ex. "sepolia")
+  chain_id?: number; // Chain ID de ce réseau
+  testnet?: boolean; // Réseau de test (fonds sans valeur)
+  explorer?: string; // Explorateur de blocs du réseau
   sender_wallet: string;
   recipient_wallet: string;
   sender_chain: string;
@@ -21,6 +23,10 @@ interface PaymentData {
   guild_id: number;
   channel_id: number;
   transaction_hash?: string; // Add this property
+  amount_wei?: string; // Montant exact en wei (paiement en ETH)
+  token_address?: string; // Paiement en token ERC-20
+  token_amount?: string; // Montant en unités de base du token
+  transaction_data?: string; // Appel transfer(destinataire, montant) préparé par le bot
 }
 
 function PaymentConfirmation() {
@@ -81,20 +87,12 @@ function PaymentConfirmation() {
         "🔄 Exécution de la transaction via Privy intégration directe..."
       );
 
-      // Déterminer le chain ID correct basé sur le réseau du paiement
-      let targetChainId: number;
-      let networkName: string;
-
-      if (payment.network === "sepolia" || payment.chain_id === 11155111) {
-        targetChainId = 11155111; // Sepolia
-        networkName = "Sepolia Testnet";
-      } else if (payment.network === "ethereum" || payment.chain_id === 1) {
-        targetChainId = 1; // Ethereum Mainnet
-        networkName = "Ethereum Mainnet";
-      } else {
-        // Fallback sur le chain_id du paiement
-        targetChainId = payment.chain_id || 11155111;
-        networkName = payment.sender_chain || "Réseau inconnu";
+      // Réseau choisi par le bot à la création du paiement, jamais déduit du wallet
+      // (les paiements enregistrés avant le réseau étaient envoyés sur Sepolia)
+      const targetChainId = payment.network ? payment.chain_id : 11155111;
+      const networkName = getNetworkDisplayName();
+      if (!targetChainId) {
+        throw new Error(`Réseau du paiement inconnu (${payment.network})`);
       }
 
       console.log("🌐 Réseau cible:", {
@@ -124,13 +122,14 @@ function PaymentConfirmation() {
         type: senderWallet.walletClientType,
       });
 
-      // Calculer la valeur en Wei
-      const amountInWei = BigInt(
-        Math.floor(parseFloat(String(payment.amount)) * 1e18)
-      );
+      // Valeur en Wei: montant exact calculé par le bot (le calcul en flottant peut différer
+      // de quelques wei et faire échouer la vérification on-chain)
+      const amountInWei = payment.amount_wei
+        ? BigInt(payment.amount_wei)
+        : BigInt(Math.floor(parseFloat(String(payment.amount)) * 1e18));
 
       console.log("💰 Détails de la transaction:");
-      console.log("  Montant:", payment.amount, "ETH");
+      console.log("  Montant:", payment.amount, payment.currency);
       console.log("  Montant en Wei:", amountInWei.toString());
       console.log("  De:", payment.sender_wallet);
       console.log("  Vers:", payment.recipient_wallet);
@@ -139,12 +138,21 @@ function PaymentConfirmation() {
       console.log("📤 Envoi de la transaction via Privy sendTransaction...");
 
       // Privy handles network switching automatically based on the transaction
-      const txResult = await sendTransaction({
-        to: payment.recipient_wallet,
-        value: amountInWei.toString(),
-        // Let Privy handle the chain automatically, or include if supported
-        ...(targetChainId && { chainId: targetChainId }),
-      });
+      const txResult = await sendTransaction(
+        payment.token_address && payment.transaction_data
+          ? {
+              // Token ERC-20: appel transfer() sur le contrat, sans ETH
+              to: payment.token_address,
+              data: payment.transaction_data as `0x${string}`,
+              value: "0",
+              chainId: targetChainId,
+            }
+          : {
+              to: payment.recipient_wallet,
+              value: amountInWei.toString(),
+              chainId: targetChainId,
+            }
+      );
 
       // Extraire le hash de la transaction
       const txHash = typeof txResult === "string" ? txResult : txResult.hash;
@@ -229,54 +237,32 @@ function PaymentConfirmation() {
     }
   };
 
-  // Helper function to determine if it's a testnet
+  // Helper function to determine if it's a testnet (payments without a network are Sepolia ones)
   const isTestnet = () => {
     if (!payment) return false;
-
-    // Check multiple indicators for Sepolia testnet
-    return (
-      payment.network === "sepolia" ||
-      payment.chain_id === 11155111 ||
-      payment.sender_chain?.toLowerCase().includes("sepolia") ||
-      payment.sender_chain?.toLowerCase().includes("testnet")
-    );
+    return payment.network ? payment.testnet === true : true;
   };
 
   // Helper function to determine if it's mainnet
   const isMainnet = () => {
     if (!payment) return false;
-
-    // Only consider it mainnet if explicitly ethereum network with chain ID 1
-    return (
-      (payment.network === "ethereum" && payment.chain_id === 1) ||
-      payment.chain_id === 1 ||
-      (payment.sender_chain?.toLowerCase().includes("mainnet") &&
-        !payment.sender_chain?.toLowerCase().includes("sepolia"))
-    );
+    return !!payment.network && payment.testnet !== true;
   };
 
   // Helper function to get correct explorer URL
   const getExplorerUrl = () => {
-    if (isTestnet()) {
-      return "https://sepolia.etherscan.io";
-    } else if (isMainnet()) {
-      return "https://etherscan.io";
-    } else {
-      // Default to Sepolia for unknown networks
+    if (!payment?.network) {
       return "https://sepolia.etherscan.io";
     }
+    return payment.explorer || "";
   };
 
   // Helper function to get network display name
   const getNetworkDisplayName = () => {
-    if (isTestnet()) {
+    if (!payment?.network) {
       return "Sepolia Testnet";
-    } else if (isMainnet()) {
-      return "Ethereum Mainnet";
-    } else {
-      // Fallback to payment data or default
-      return payment?.sender_chain || payment?.network || "Réseau inconnu";
     }
+    return payment.sender_chain || payment.network;
   };
 
   // Add debug logging to understand what's happening
@@ -383,7 +369,7 @@ function PaymentConfirmation() {
           {/* Affichage d'un avertissement réseau basé sur les données réelles */}
           {isTestnet() && !isMainnet() && (
             <div className="testnet-warning">
-              <h3>🚨 SEPOLIA TEST NETWORK</h3>
+              <h3>🚨 TEST NETWORK</h3>
               <p>This transaction uses test ETH with no real value.</p>
               <p>
                 <strong>Network:</strong> {getNetworkDisplayName()}
@@ -410,9 +396,9 @@ function PaymentConfirmation() {
               }}
             >
               <h3 style={{ color: "#ef4444", margin: "0 0 10px 0" }}>
-                ⚠️ ETHEREUM MAINNET
+                ⚠️ MAINNET
               </h3>
-              <p>This transaction will use real ETH with real value!</p>
+              <p>This transaction will use real funds with real value!</p>
               <p>
                 <strong>Network:</strong> {getNetworkDisplayName()}
               </p>
@@ -545,15 +531,15 @@ function PaymentConfirmation() {
             </p>
             {isTestnet() && !isMainnet() && (
               <p>
-                🚨 <strong>Testnet:</strong> This transaction will use the
-                Sepolia Testnet network (Chain ID:{" "}
+                🚨 <strong>Testnet:</strong> This transaction will use the{" "}
+                {getNetworkDisplayName()} network (Chain ID:{" "}
                 {payment.chain_id || 11155111}) with test ETH of no value.
               </p>
             )}
             {isMainnet() && !isTestnet() && (
               <p style={{ color: "#ef4444", fontWeight: "bold" }}>
-                💰 <strong>Mainnet:</strong> This transaction will use real ETH
-                on the main Ethereum network (Chain ID: {payment.chain_id || 1}
+                💰 <strong>Mainnet:</strong> This transaction will use real funds
+                on {getNetworkDisplayName()} (Chain ID: {payment.chain_id}
                 ). Make sure you have sufficient funds!
               </p>
             )}